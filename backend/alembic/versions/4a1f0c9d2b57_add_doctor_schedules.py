@@ -0,0 +1,44 @@
+"""Add doctor schedules and appointment slot index
+
+Revision ID: 4a1f0c9d2b57
+Revises: e6c73b26eb81
+Create Date: 2026-10-19 11:12:40.918204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4a1f0c9d2b57'
+down_revision: Union[str, Sequence[str], None] = 'e6c73b26eb81'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('doctor_schedules',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('doctor_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('weekday', sa.Integer(), nullable=False),
+    sa.Column('start_time', sa.Time(), nullable=False),
+    sa.Column('end_time', sa.Time(), nullable=False),
+    sa.Column('slot_minutes', sa.Integer(), nullable=False),
+    sa.Column('clinic_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.ForeignKeyConstraint(['clinic_id'], ['clinics.id'], ),
+    sa.ForeignKeyConstraint(['doctor_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_doctor_schedules_doctor_weekday', 'doctor_schedules', ['doctor_id', 'weekday'], unique=False)
+    op.create_index('ix_appointments_clinic_doctor_time', 'appointments', ['clinic_id', 'doctor_id', 'appointment_time'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_appointments_clinic_doctor_time', table_name='appointments')
+    op.drop_index('ix_doctor_schedules_doctor_weekday', table_name='doctor_schedules')
+    op.drop_table('doctor_schedules')
@@ -0,0 +1,28 @@
+"""Add appointment clinic/status/time index
+
+Revision ID: 9d3e5b7a1c20
+Revises: 4a1f0c9d2b57
+Create Date: 2026-10-19 11:41:05.377912
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d3e5b7a1c20'
+down_revision: Union[str, Sequence[str], None] = '4a1f0c9d2b57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_appointments_clinic_status_time', 'appointments', ['clinic_id', 'status', 'appointment_time'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_appointments_clinic_status_time', table_name='appointments')
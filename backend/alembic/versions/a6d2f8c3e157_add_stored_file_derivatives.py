@@ -0,0 +1,39 @@
+"""Add stored file derivative columns
+
+Revision ID: a6d2f8c3e157
+Revises: f3c8a1d7b924
+Create Date: 2026-10-19 15:40:12.508341
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a6d2f8c3e157'
+down_revision: Union[str, Sequence[str], None] = 'f3c8a1d7b924'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('stored_files', sa.Column('source_file_id', postgresql.UUID(as_uuid=True), nullable=True))
+    op.add_column('stored_files', sa.Column('variant', sa.String(length=32), nullable=True))
+    op.add_column('stored_files', sa.Column('width', sa.Integer(), nullable=True))
+    op.add_column('stored_files', sa.Column('height', sa.Integer(), nullable=True))
+    op.create_foreign_key('fk_stored_files_source_file_id', 'stored_files', 'stored_files', ['source_file_id'], ['id'])
+    op.create_index('ix_stored_files_source_variant', 'stored_files', ['source_file_id', 'variant'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_stored_files_source_variant', table_name='stored_files')
+    op.drop_constraint('fk_stored_files_source_file_id', 'stored_files', type_='foreignkey')
+    op.drop_column('stored_files', 'height')
+    op.drop_column('stored_files', 'width')
+    op.drop_column('stored_files', 'variant')
+    op.drop_column('stored_files', 'source_file_id')
@@ -0,0 +1,30 @@
+"""Add prescription queue indexes
+
+Revision ID: a9c3e7f1b258
+Revises: e5a7c9d1f284
+Create Date: 2026-10-19 18:41:07.215934
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a9c3e7f1b258'
+down_revision: Union[str, Sequence[str], None] = 'e5a7c9d1f284'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_prescriptions_clinic_status_created_at', 'prescriptions', ['clinic_id', 'status', 'created_at'], unique=False)
+    op.create_index(op.f('ix_prescription_items_prescription_id'), 'prescription_items', ['prescription_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_prescription_items_prescription_id'), table_name='prescription_items')
+    op.drop_index('ix_prescriptions_clinic_status_created_at', table_name='prescriptions')
@@ -0,0 +1,28 @@
+"""Add medications clinic/name index
+
+Revision ID: b3e9c5a2d748
+Revises: a6d2f8c3e157
+Create Date: 2026-10-19 16:12:55.046219
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3e9c5a2d748'
+down_revision: Union[str, Sequence[str], None] = 'a6d2f8c3e157'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_medications_clinic_name', 'medications', ['clinic_id', 'name'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_medications_clinic_name', table_name='medications')
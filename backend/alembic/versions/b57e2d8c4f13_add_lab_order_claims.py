@@ -0,0 +1,37 @@
+"""Add lab order worklist claims
+
+Revision ID: b57e2d8c4f13
+Revises: 9d3e5b7a1c20
+Create Date: 2026-10-19 12:05:52.610834
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b57e2d8c4f13'
+down_revision: Union[str, Sequence[str], None] = '9d3e5b7a1c20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('lab_orders', sa.Column('claimed_by_user_id', postgresql.UUID(as_uuid=True), nullable=True))
+    op.add_column('lab_orders', sa.Column('claimed_at', sa.TIMESTAMP(timezone=True), nullable=True))
+    op.add_column('lab_orders', sa.Column('claim_expires_at', sa.TIMESTAMP(timezone=True), nullable=True))
+    op.create_foreign_key('lab_orders_claimed_by_user_id_fkey', 'lab_orders', 'users', ['claimed_by_user_id'], ['id'])
+    op.create_index('ix_lab_orders_clinic_status', 'lab_orders', ['clinic_id', 'status'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_lab_orders_clinic_status', table_name='lab_orders')
+    op.drop_constraint('lab_orders_claimed_by_user_id_fkey', 'lab_orders', type_='foreignkey')
+    op.drop_column('lab_orders', 'claim_expires_at')
+    op.drop_column('lab_orders', 'claimed_at')
+    op.drop_column('lab_orders', 'claimed_by_user_id')
@@ -0,0 +1,66 @@
+"""Add code set versioning and ICD-10 hierarchy
+
+Revision ID: b7d4f2a9c361
+Revises: a9c3e7f1b258
+Create Date: 2026-10-19 19:26:53.804117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d4f2a9c361'
+down_revision: Union[str, Sequence[str], None] = 'a9c3e7f1b258'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('code_set_releases',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('code_set', sa.String(), nullable=False),
+    sa.Column('version', sa.Text(), nullable=False),
+    sa.Column('source_file', sa.Text(), nullable=True),
+    sa.Column('sha256', sa.String(length=64), nullable=False),
+    sa.Column('total_rows', sa.Integer(), nullable=False),
+    sa.Column('inserted', sa.Integer(), nullable=False),
+    sa.Column('updated', sa.Integer(), nullable=False),
+    sa.Column('deactivated', sa.Integer(), nullable=False),
+    sa.Column('loaded_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('code_set', 'version', name='uq_code_set_releases_code_set_version')
+    )
+    op.add_column('icd10_codes', sa.Column('kind', sa.String(), nullable=True))
+    op.add_column('icd10_codes', sa.Column('parent_code', sa.Text(), nullable=True))
+    op.add_column('icd10_codes', sa.Column('chapter', sa.Text(), nullable=True))
+    op.add_column('icd10_codes', sa.Column('block', sa.Text(), nullable=True))
+    op.add_column('icd10_codes', sa.Column('inclusions', postgresql.JSONB(astext_type=sa.Text()), nullable=True))
+    op.add_column('icd10_codes', sa.Column('exclusions', postgresql.JSONB(astext_type=sa.Text()), nullable=True))
+    op.add_column('icd10_codes', sa.Column('is_active', sa.Boolean(), server_default=sa.text('true'), nullable=False))
+    op.add_column('icd10_codes', sa.Column('version', sa.Text(), nullable=True))
+    op.add_column('icd10_codes', sa.Column('updated_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=True))
+    op.add_column('cpt_codes', sa.Column('is_active', sa.Boolean(), server_default=sa.text('true'), nullable=False))
+    op.add_column('cpt_codes', sa.Column('version', sa.Text(), nullable=True))
+    op.add_column('cpt_codes', sa.Column('updated_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('cpt_codes', 'updated_at')
+    op.drop_column('cpt_codes', 'version')
+    op.drop_column('cpt_codes', 'is_active')
+    op.drop_column('icd10_codes', 'updated_at')
+    op.drop_column('icd10_codes', 'version')
+    op.drop_column('icd10_codes', 'is_active')
+    op.drop_column('icd10_codes', 'exclusions')
+    op.drop_column('icd10_codes', 'inclusions')
+    op.drop_column('icd10_codes', 'block')
+    op.drop_column('icd10_codes', 'chapter')
+    op.drop_column('icd10_codes', 'parent_code')
+    op.drop_column('icd10_codes', 'kind')
+    op.drop_table('code_set_releases')
@@ -0,0 +1,32 @@
+"""Make patient MRN unique per clinic
+
+Revision ID: c4e8a2f6b913
+Revises: b7d4f2a9c361
+Create Date: 2026-10-19 21:04:12.318502
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4e8a2f6b913'
+down_revision: Union[str, Sequence[str], None] = 'b7d4f2a9c361'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.drop_index(op.f('ix_patients_mrn'), table_name='patients')
+    op.create_index(op.f('ix_patients_mrn'), 'patients', ['mrn'], unique=False)
+    op.create_unique_constraint('uq_patients_clinic_mrn', 'patients', ['clinic_id', 'mrn'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('uq_patients_clinic_mrn', 'patients', type_='unique')
+    op.drop_index(op.f('ix_patients_mrn'), table_name='patients')
+    op.create_index(op.f('ix_patients_mrn'), 'patients', ['mrn'], unique=True)
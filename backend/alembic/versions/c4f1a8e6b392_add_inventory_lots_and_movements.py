@@ -0,0 +1,91 @@
+"""Add inventory lots, movements and snapshots
+
+Revision ID: c4f1a8e6b392
+Revises: b3e9c5a2d748
+Create Date: 2026-10-19 16:48:31.772904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4f1a8e6b392'
+down_revision: Union[str, Sequence[str], None] = 'b3e9c5a2d748'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('medication_lots',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('medication_id', sa.Integer(), nullable=False),
+    sa.Column('lot_number', sa.String(), nullable=False),
+    sa.Column('expiry_date', sa.Date(), nullable=True),
+    sa.Column('quantity_on_hand', sa.Integer(), nullable=False),
+    sa.Column('clinic_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('created_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['clinic_id'], ['clinics.id'], ),
+    sa.ForeignKeyConstraint(['medication_id'], ['medications.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('medication_id', 'lot_number', name='uq_medication_lots_medication_lot')
+    )
+    op.create_index('ix_medication_lots_fefo', 'medication_lots', ['medication_id', 'expiry_date', 'id'], unique=False, postgresql_where=sa.text('quantity_on_hand > 0'))
+    op.create_table('inventory_movements',
+    sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('medication_id', sa.Integer(), nullable=False),
+    sa.Column('lot_id', sa.Integer(), nullable=False),
+    sa.Column('movement_type', sa.String(), nullable=False),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.Column('note', sa.Text(), nullable=True),
+    sa.Column('pharmacy_sale_id', postgresql.UUID(as_uuid=True), nullable=True),
+    sa.Column('created_by_user_id', postgresql.UUID(as_uuid=True), nullable=True),
+    sa.Column('clinic_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('occurred_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['clinic_id'], ['clinics.id'], ),
+    sa.ForeignKeyConstraint(['created_by_user_id'], ['users.id'], ),
+    sa.ForeignKeyConstraint(['lot_id'], ['medication_lots.id'], ),
+    sa.ForeignKeyConstraint(['medication_id'], ['medications.id'], ),
+    sa.ForeignKeyConstraint(['pharmacy_sale_id'], ['pharmacy_sales.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_inventory_movements_lot_occurred_at', 'inventory_movements', ['lot_id', 'occurred_at'], unique=False)
+    op.create_index('ix_inventory_movements_clinic_occurred_at', 'inventory_movements', ['clinic_id', 'occurred_at'], unique=False)
+    op.create_table('inventory_snapshots',
+    sa.Column('lot_id', sa.Integer(), nullable=False),
+    sa.Column('snapshot_date', sa.Date(), nullable=False),
+    sa.Column('medication_id', sa.Integer(), nullable=False),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.Column('clinic_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.ForeignKeyConstraint(['clinic_id'], ['clinics.id'], ),
+    sa.ForeignKeyConstraint(['lot_id'], ['medication_lots.id'], ),
+    sa.ForeignKeyConstraint(['medication_id'], ['medications.id'], ),
+    sa.PrimaryKeyConstraint('lot_id', 'snapshot_date')
+    )
+    op.create_index('ix_inventory_snapshots_clinic_date', 'inventory_snapshots', ['clinic_id', 'snapshot_date'], unique=False)
+
+    # Existing stock becomes each medication's UNLOTTED lot, with an opening movement
+    op.execute("""
+        INSERT INTO medication_lots (medication_id, lot_number, expiry_date, quantity_on_hand, clinic_id)
+        SELECT id, 'UNLOTTED', NULL, stock_quantity, clinic_id FROM medications WHERE stock_quantity <> 0
+    """)
+    op.execute("""
+        INSERT INTO inventory_movements (id, medication_id, lot_id, movement_type, quantity, note, clinic_id)
+        SELECT gen_random_uuid(), medication_id, id, 'Adjustment', quantity_on_hand, 'Opening balance', clinic_id
+        FROM medication_lots
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_inventory_snapshots_clinic_date', table_name='inventory_snapshots')
+    op.drop_table('inventory_snapshots')
+    op.drop_index('ix_inventory_movements_clinic_occurred_at', table_name='inventory_movements')
+    op.drop_index('ix_inventory_movements_lot_occurred_at', table_name='inventory_movements')
+    op.drop_table('inventory_movements')
+    op.drop_index('ix_medication_lots_fefo', table_name='medication_lots', postgresql_where=sa.text('quantity_on_hand > 0'))
+    op.drop_table('medication_lots')
@@ -0,0 +1,42 @@
+"""Add stored files
+
+Revision ID: c81f4a6e9d35
+Revises: b57e2d8c4f13
+Create Date: 2026-10-19 13:02:44.158371
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c81f4a6e9d35'
+down_revision: Union[str, Sequence[str], None] = 'b57e2d8c4f13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('stored_files',
+    sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('sha256', sa.String(length=64), nullable=False),
+    sa.Column('size_bytes', sa.BigInteger(), nullable=False),
+    sa.Column('content_type', sa.String(), nullable=False),
+    sa.Column('original_filename', sa.Text(), nullable=True),
+    sa.Column('uploaded_by_user_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('clinic_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('created_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['clinic_id'], ['clinics.id'], ),
+    sa.ForeignKeyConstraint(['uploaded_by_user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('clinic_id', 'sha256', name='uq_stored_files_clinic_sha256')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('stored_files')
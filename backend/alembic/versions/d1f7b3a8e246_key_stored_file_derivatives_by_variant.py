@@ -0,0 +1,34 @@
+"""Key stored file derivatives by source and variant
+
+Revision ID: d1f7b3a8e246
+Revises: c4e8a2f6b913
+Create Date: 2026-10-19 21:31:47.902614
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd1f7b3a8e246'
+down_revision: Union[str, Sequence[str], None] = 'c4e8a2f6b913'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.drop_constraint('uq_stored_files_clinic_sha256', 'stored_files', type_='unique')
+    op.create_index('uq_stored_files_clinic_sha256', 'stored_files', ['clinic_id', 'sha256'], unique=True, postgresql_where=sa.text('source_file_id IS NULL'))
+    op.drop_index('ix_stored_files_source_variant', table_name='stored_files')
+    op.create_index('uq_stored_files_source_variant', 'stored_files', ['source_file_id', 'variant'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('uq_stored_files_source_variant', table_name='stored_files')
+    op.create_index('ix_stored_files_source_variant', 'stored_files', ['source_file_id', 'variant'], unique=False)
+    op.drop_index('uq_stored_files_clinic_sha256', table_name='stored_files', postgresql_where=sa.text('source_file_id IS NULL'))
+    op.create_unique_constraint('uq_stored_files_clinic_sha256', 'stored_files', ['clinic_id', 'sha256'])
@@ -0,0 +1,54 @@
+"""Add lab turnaround-time histograms and indexes
+
+Revision ID: d4a9e3f1b682
+Revises: c81f4a6e9d35
+Create Date: 2026-10-19 13:48:09.502716
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4a9e3f1b682'
+down_revision: Union[str, Sequence[str], None] = 'c81f4a6e9d35'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('lab_tat_daily_buckets',
+    sa.Column('clinic_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('lab_test_id', sa.Integer(), nullable=False),
+    sa.Column('priority', sa.String(), nullable=False),
+    sa.Column('stage', sa.String(), nullable=False),
+    sa.Column('bucket', sa.Integer(), nullable=False),
+    sa.Column('sample_count', sa.Integer(), nullable=False),
+    sa.Column('total_seconds', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['clinic_id'], ['clinics.id'], ),
+    sa.ForeignKeyConstraint(['lab_test_id'], ['lab_tests.id'], ),
+    sa.PrimaryKeyConstraint('clinic_id', 'day', 'lab_test_id', 'priority', 'stage', 'bucket')
+    )
+    op.create_table('lab_tat_refresh_state',
+    sa.Column('clinic_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('last_refreshed_at', sa.TIMESTAMP(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['clinic_id'], ['clinics.id'], ),
+    sa.PrimaryKeyConstraint('clinic_id')
+    )
+    op.create_index('ix_lab_orders_clinic_created_at', 'lab_orders', ['clinic_id', 'created_at'], unique=False)
+    op.create_index(op.f('ix_lab_samples_lab_order_id'), 'lab_samples', ['lab_order_id'], unique=False)
+    op.create_index(op.f('ix_order_results_lab_order_id'), 'order_results', ['lab_order_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_order_results_lab_order_id'), table_name='order_results')
+    op.drop_index(op.f('ix_lab_samples_lab_order_id'), table_name='lab_samples')
+    op.drop_index('ix_lab_orders_clinic_created_at', table_name='lab_orders')
+    op.drop_table('lab_tat_refresh_state')
+    op.drop_table('lab_tat_daily_buckets')
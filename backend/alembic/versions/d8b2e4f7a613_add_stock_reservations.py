@@ -0,0 +1,51 @@
+"""Add stock reservations and medications.reserved_quantity
+
+Revision ID: d8b2e4f7a613
+Revises: c4f1a8e6b392
+Create Date: 2026-10-19 17:25:08.193457
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd8b2e4f7a613'
+down_revision: Union[str, Sequence[str], None] = 'c4f1a8e6b392'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('medications', sa.Column('reserved_quantity', sa.Integer(), server_default='0', nullable=False))
+    op.create_table('stock_reservations',
+    sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('medication_id', sa.Integer(), nullable=False),
+    sa.Column('prescription_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('prescription_item_id', sa.Integer(), nullable=False),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('expires_at', sa.TIMESTAMP(timezone=True), nullable=False),
+    sa.Column('resolved_at', sa.TIMESTAMP(timezone=True), nullable=True),
+    sa.Column('clinic_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('created_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['clinic_id'], ['clinics.id'], ),
+    sa.ForeignKeyConstraint(['medication_id'], ['medications.id'], ),
+    sa.ForeignKeyConstraint(['prescription_id'], ['prescriptions.id'], ),
+    sa.ForeignKeyConstraint(['prescription_item_id'], ['prescription_items.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_stock_reservations_prescription_item_id'), 'stock_reservations', ['prescription_item_id'], unique=False)
+    op.create_index('ix_stock_reservations_active_expires_at', 'stock_reservations', ['expires_at'], unique=False, postgresql_where=sa.text("status = 'Active'"))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_stock_reservations_active_expires_at', table_name='stock_reservations', postgresql_where=sa.text("status = 'Active'"))
+    op.drop_index(op.f('ix_stock_reservations_prescription_item_id'), table_name='stock_reservations')
+    op.drop_table('stock_reservations')
+    op.drop_column('medications', 'reserved_quantity')
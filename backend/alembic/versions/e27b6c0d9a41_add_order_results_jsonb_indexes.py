@@ -0,0 +1,30 @@
+"""Add order_results patient and result_data indexes
+
+Revision ID: e27b6c0d9a41
+Revises: d4a9e3f1b682
+Create Date: 2026-10-19 14:31:27.840113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e27b6c0d9a41'
+down_revision: Union[str, Sequence[str], None] = 'd4a9e3f1b682'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_order_results_patient_reported_at', 'order_results', ['patient_id', 'reported_at'], unique=False)
+    op.create_index('ix_order_results_result_data_gin', 'order_results', ['result_data'], unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_order_results_result_data_gin', table_name='order_results', postgresql_using='gin')
+    op.drop_index('ix_order_results_patient_reported_at', table_name='order_results')
@@ -0,0 +1,44 @@
+"""Add medication consumption stats and reorder lead time
+
+Revision ID: e5a7c9d1f284
+Revises: d8b2e4f7a613
+Create Date: 2026-10-19 17:58:44.620381
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5a7c9d1f284'
+down_revision: Union[str, Sequence[str], None] = 'd8b2e4f7a613'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('medications', sa.Column('reorder_lead_time_days', sa.Integer(), nullable=True))
+    op.create_table('medication_consumption_stats',
+    sa.Column('medication_id', sa.Integer(), nullable=False),
+    sa.Column('clinic_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('ewma_daily', sa.Float(), nullable=False),
+    sa.Column('first_day', sa.Date(), nullable=False),
+    sa.Column('last_day', sa.Date(), nullable=False),
+    sa.Column('day_quantity', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['clinic_id'], ['clinics.id'], ),
+    sa.ForeignKeyConstraint(['medication_id'], ['medications.id'], ),
+    sa.PrimaryKeyConstraint('medication_id')
+    )
+    op.create_index(op.f('ix_medication_consumption_stats_clinic_id'), 'medication_consumption_stats', ['clinic_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_medication_consumption_stats_clinic_id'), table_name='medication_consumption_stats')
+    op.drop_table('medication_consumption_stats')
+    op.drop_column('medications', 'reorder_lead_time_days')
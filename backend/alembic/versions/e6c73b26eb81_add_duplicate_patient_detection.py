@@ -0,0 +1,66 @@
+"""Add duplicate patient detection tables
+
+Revision ID: e6c73b26eb81
+Revises: e738a9d29d16
+Create Date: 2026-10-19 10:03:17.264530
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e6c73b26eb81'
+down_revision: Union[str, Sequence[str], None] = 'e738a9d29d16'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('patient_match_keys',
+    sa.Column('patient_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('key', sa.Text(), nullable=False),
+    sa.Column('clinic_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.ForeignKeyConstraint(['clinic_id'], ['clinics.id'], ),
+    sa.ForeignKeyConstraint(['patient_id'], ['patients.id'], ),
+    sa.PrimaryKeyConstraint('patient_id', 'key')
+    )
+    op.create_index('ix_patient_match_keys_clinic_key', 'patient_match_keys', ['clinic_id', 'key'], unique=False)
+    op.create_table('patient_duplicate_candidates',
+    sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('patient_id_a', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('patient_id_b', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('score', sa.Numeric(precision=5, scale=4), nullable=False),
+    sa.Column('matched_keys', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('clinic_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('created_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('updated_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['clinic_id'], ['clinics.id'], ),
+    sa.ForeignKeyConstraint(['patient_id_a'], ['patients.id'], ),
+    sa.ForeignKeyConstraint(['patient_id_b'], ['patients.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('patient_id_a', 'patient_id_b', name='uq_patient_duplicate_pair')
+    )
+    op.create_index('ix_patient_duplicate_candidates_clinic_status', 'patient_duplicate_candidates', ['clinic_id', 'status'], unique=False)
+    op.create_table('duplicate_scan_state',
+    sa.Column('clinic_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('last_scanned_at', sa.TIMESTAMP(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['clinic_id'], ['clinics.id'], ),
+    sa.PrimaryKeyConstraint('clinic_id')
+    )
+    op.create_index('ix_patients_clinic_updated_at', 'patients', ['clinic_id', 'updated_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_patients_clinic_updated_at', table_name='patients')
+    op.drop_table('duplicate_scan_state')
+    op.drop_index('ix_patient_duplicate_candidates_clinic_status', table_name='patient_duplicate_candidates')
+    op.drop_table('patient_duplicate_candidates')
+    op.drop_index('ix_patient_match_keys_clinic_key', table_name='patient_match_keys')
+    op.drop_table('patient_match_keys')
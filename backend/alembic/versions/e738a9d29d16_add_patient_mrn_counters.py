@@ -0,0 +1,34 @@
+"""Add patient MRN counters
+
+Revision ID: e738a9d29d16
+Revises: ceec024a8a2f
+Create Date: 2026-10-19 09:12:41.508113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e738a9d29d16'
+down_revision: Union[str, Sequence[str], None] = 'ceec024a8a2f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('patient_mrn_counters',
+    sa.Column('clinic_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('last_value', sa.BigInteger(), nullable=False),
+    sa.ForeignKeyConstraint(['clinic_id'], ['clinics.id'], ),
+    sa.PrimaryKeyConstraint('clinic_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('patient_mrn_counters')
@@ -0,0 +1,34 @@
+"""Add lab TAT dirty-day indexes
+
+Revision ID: e9b5c1d7a430
+Revises: d1f7b3a8e246
+Create Date: 2026-10-19 21:52:08.447193
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e9b5c1d7a430'
+down_revision: Union[str, Sequence[str], None] = 'd1f7b3a8e246'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_lab_orders_clinic_updated_at', 'lab_orders', ['clinic_id', 'updated_at'], unique=False)
+    op.create_index('ix_lab_samples_clinic_collection_time', 'lab_samples', ['clinic_id', 'collection_time'], unique=False)
+    op.create_index('ix_lab_samples_clinic_received_at', 'lab_samples', ['clinic_id', 'received_at'], unique=False)
+    op.create_index('ix_order_results_clinic_validated_at', 'order_results', ['clinic_id', 'validated_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_order_results_clinic_validated_at', table_name='order_results')
+    op.drop_index('ix_lab_samples_clinic_received_at', table_name='lab_samples')
+    op.drop_index('ix_lab_samples_clinic_collection_time', table_name='lab_samples')
+    op.drop_index('ix_lab_orders_clinic_updated_at', table_name='lab_orders')
@@ -0,0 +1,28 @@
+"""Add order_results clinic/reported_at index
+
+Revision ID: f3c8a1d7b924
+Revises: e27b6c0d9a41
+Create Date: 2026-10-19 15:02:48.317560
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3c8a1d7b924'
+down_revision: Union[str, Sequence[str], None] = 'e27b6c0d9a41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_order_results_clinic_reported_at', 'order_results', ['clinic_id', 'reported_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_order_results_clinic_reported_at', table_name='order_results')
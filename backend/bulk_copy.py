@@ -0,0 +1,34 @@
+# backend/bulk_copy.py
+
+import csv
+import io
+from typing import Iterable, Sequence
+
+from sqlalchemy.orm import Session
+
+NULL_MARKER = '\\N'
+
+
+def copy_rows(db: Session, table_name: str, columns: Sequence[str], rows: Iterable[Sequence]) -> int:
+    """
+    Streams rows into a table with PostgreSQL COPY over the session's own
+    connection, so the load takes part in the caller's transaction.
+    None values are written as NULL. Returns the number of rows copied.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    count = 0
+    for row in rows:
+        writer.writerow([NULL_MARKER if value is None else value for value in row])
+        count += 1
+    if not count:
+        return 0
+    buffer.seek(0)
+
+    raw_connection = db.connection().connection
+    with raw_connection.cursor() as cursor:
+        cursor.copy_expert(
+            f"COPY {table_name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '{NULL_MARKER}')",
+            buffer
+        )
+    return count
@@ -0,0 +1,136 @@
+# backend/coding_service.py
+
+import threading
+import time
+import uuid
+from typing import Dict, List, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from . import models, icd10_index
+
+_CPT_FINGERPRINT_SQL = """
+    SELECT count(*) FILTER (WHERE is_active), coalesce(max(id), 0), max(updated_at)
+    FROM cpt_codes
+"""
+
+_cpt_codes: Dict[str, Tuple[int, str]] = {}
+_cpt_fingerprint = None
+_cpt_checked_at = 0.0
+_cpt_lock = threading.Lock()
+
+
+def _cpt_key(code: str) -> str:
+    return code.strip().upper()
+
+def get_cpt_codes(db: Session) -> Dict[str, Tuple[int, str]]:
+    """
+    Active CPT codes as {CODE: (id, code)}, held in process and reloaded
+    when cpt_codes changes (checked like the ICD-10 index, at most every
+    icd10_index.REFRESH_SECONDS).
+    """
+    global _cpt_codes, _cpt_fingerprint, _cpt_checked_at
+    if _cpt_fingerprint is not None and time.monotonic() - _cpt_checked_at < icd10_index.REFRESH_SECONDS:
+        return _cpt_codes
+    with _cpt_lock:
+        if _cpt_fingerprint is None or time.monotonic() - _cpt_checked_at >= icd10_index.REFRESH_SECONDS:
+            fingerprint = tuple(db.execute(text(_CPT_FINGERPRINT_SQL)).one())
+            if fingerprint != _cpt_fingerprint:
+                rows = db.execute(text("SELECT id, code FROM cpt_codes WHERE is_active"))
+                _cpt_codes = {_cpt_key(code): (code_id, code) for code_id, code in rows}
+                _cpt_fingerprint = fingerprint
+            _cpt_checked_at = time.monotonic()
+    return _cpt_codes
+
+
+def _validate_icd10(db: Session, codes: List[str]) -> List[dict]:
+    index = icd10_index.get_index(db)
+    return [{"code": code, **index.lookup(code)} for code in codes]
+
+def _validate_cpt(db: Session, codes: List[str]) -> List[dict]:
+    cpt_codes = get_cpt_codes(db)
+    results = []
+    for code in codes:
+        match = cpt_codes.get(_cpt_key(code))
+        if match:
+            results.append({"code": code, "status": "valid", "id": match[0], "canonical_code": match[1]})
+        else:
+            results.append({"code": code, "status": "unknown"})
+    return results
+
+def validate_codes(db: Session, icd10: List[str], cpt: List[str]) -> dict:
+    """
+    Validates a batch of ICD-10 and CPT codes against the in-process code
+    sets: no per-code queries. Results keep the submitted order; each has
+    the code's id, its canonical spelling and (ICD-10) its three-character
+    category for rollups.
+    """
+    return {"icd10": _validate_icd10(db, icd10), "cpt": _validate_cpt(db, cpt)}
+
+
+def attach_codes_to_appointment(db: Session, appointment_id: str, clinic_id: str, doctor_id: str,
+                                diagnoses: List[str], procedures: List[str]) -> dict:
+    """
+    Attaches several diagnoses (ICD-10) and procedures (CPT) to an
+    appointment in one transaction with one multi-row insert each. All codes
+    must be valid; codes already on the appointment (or repeated in the
+    request) are skipped, so the call can be retried safely. Returns None
+    when the appointment is not in the clinic.
+    """
+    # Locks the appointment so concurrent attaches cannot both add the same code
+    appointment = (
+        db.query(models.Appointment)
+        .filter(models.Appointment.id == appointment_id, models.Appointment.clinic_id == clinic_id)
+        .with_for_update()
+        .first()
+    )
+    if not appointment:
+        return None
+
+    icd10_results = _validate_icd10(db, diagnoses)
+    cpt_results = _validate_cpt(db, procedures)
+    invalid = [f"{result['code']} ({result['status']})" for result in icd10_results + cpt_results if result["status"] != "valid"]
+    if invalid:
+        raise ValueError(f"Invalid codes: {', '.join(invalid)}")
+
+    existing_diagnoses = {
+        code_id for code_id, in db.query(models.AppointmentDiagnosis.icd10_code_id)
+        .filter(models.AppointmentDiagnosis.appointment_id == appointment.id)
+    }
+    existing_procedures = {
+        code_id for code_id, in db.query(models.AppointmentProcedure.cpt_code_id)
+        .filter(models.AppointmentProcedure.appointment_id == appointment.id)
+    }
+
+    def new_rows(results, existing, code_column):
+        rows, attached, already_attached = [], [], []
+        for result in results:
+            if result["id"] in existing:
+                already_attached.append(result["canonical_code"])
+                continue
+            existing.add(result["id"])
+            row_id = uuid.uuid4()
+            rows.append({
+                "id": row_id, "appointment_id": appointment_id, "patient_id": patient_id,
+                code_column: result["id"], "doctor_id": doctor_id, "clinic_id": clinic_id
+            })
+            attached.append({"id": row_id, "code_id": result["id"], "code": result["canonical_code"]})
+        return rows, attached, already_attached
+
+    appointment_id, patient_id = appointment.id, appointment.patient_id
+    diagnosis_rows, diagnoses_attached, skipped_diagnoses = new_rows(icd10_results, existing_diagnoses, "icd10_code_id")
+    procedure_rows, procedures_attached, skipped_procedures = new_rows(cpt_results, existing_procedures, "cpt_code_id")
+    if diagnosis_rows:
+        db.execute(pg_insert(models.AppointmentDiagnosis).values(diagnosis_rows))
+    if procedure_rows:
+        db.execute(pg_insert(models.AppointmentProcedure).values(procedure_rows))
+    db.commit()
+
+    return {
+        "appointment_id": appointment_id,
+        "diagnoses": diagnoses_attached,
+        "procedures": procedures_attached,
+        "already_attached": skipped_diagnoses + skipped_procedures
+    }
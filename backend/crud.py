@@ -1,13 +1,15 @@
 # backend/crud.py
 
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import or_, func, case
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy import and_, or_, func, case, select, update, values, column, Integer
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from typing import List
 import uuid
 from datetime import date, timedelta, datetime
 from decimal import Decimal
 
-from . import models, schemas, security
+from . import models, schemas, security, reference_ranges, inventory_service, reservation_service, reorder_service, icd10_index
+from .scheduling_service import CLINIC_TIMEZONE, MAX_SERIES_APPOINTMENTS, ensure_slots_available, expand_recurrence
 
 # --- User & Clinic CRUD ---
 def get_user_by_email(db: Session, email: str):
@@ -92,11 +94,32 @@ def get_clinics(db: Session, skip: int = 0, limit: int = 100):
     return db.query(models.Clinic).offset(skip).limit(limit).all()
 
 # --- Patient CRUD ---
+def allocate_mrn_block(db: Session, clinic_id: str, size: int = 1) -> int:
+    """
+    Reserves `size` consecutive MRN numbers for a clinic and returns the first one.
+    The counter row is seeded from the existing patient count the first time
+    a clinic allocates, and the upsert is atomic under concurrent allocations.
+    """
+    seed = (
+        select(func.count(models.Patient.id))
+        .where(models.Patient.clinic_id == clinic_id)
+        .scalar_subquery()
+    )
+    stmt = pg_insert(models.PatientMRNCounter).values(clinic_id=clinic_id, last_value=seed + size)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[models.PatientMRNCounter.clinic_id],
+        set_={"last_value": models.PatientMRNCounter.last_value + size}
+    ).returning(models.PatientMRNCounter.last_value)
+    last_value = db.execute(stmt).scalar_one()
+    return last_value - size + 1
+
+def format_mrn(number: int) -> str:
+    return f"P-{number:05d}"
+
 def create_patient(db: Session, patient: schemas.PatientCreate, clinic_id: str):
     """Creates a new patient and generates a unique MRN."""
-    patient_count = db.query(models.Patient).filter(models.Patient.clinic_id == clinic_id).count()
-    new_mrn = f"P-{patient_count + 1:05d}"
-    
+    new_mrn = format_mrn(allocate_mrn_block(db, clinic_id=clinic_id))
+
     db_patient = models.Patient(
         **patient.dict(), 
         clinic_id=clinic_id,
@@ -151,12 +174,15 @@ def get_patient_prescriptions(db: Session, patient_id: str, clinic_id: str):
         models.Prescription.clinic_id == clinic_id
     ).order_by(models.Prescription.created_at.desc()).all()
 
-def get_patient_results(db: Session, patient_id: str, clinic_id: str):
-    """Fetches all lab/radiology results for a patient."""
-    return db.query(models.OrderResult).filter(
+def get_patient_results(db: Session, patient_id: str, clinic_id: str, skip: int = 0, limit: int = 100):
+    """Fetches a patient's lab/radiology results, newest first, one page at a time."""
+    return db.query(models.OrderResult).options(
+        joinedload(models.OrderResult.reported_by).joinedload(models.User.role),
+        joinedload(models.OrderResult.reported_by).joinedload(models.User.staff_member)
+    ).filter(
         models.OrderResult.patient_id == patient_id,
         models.OrderResult.clinic_id == clinic_id
-    ).order_by(models.OrderResult.reported_at.desc()).all()
+    ).order_by(models.OrderResult.reported_at.desc()).offset(skip).limit(limit).all()
 
 # --- Service & Invoice CRUD ---
 def create_service(db: Session, service: schemas.ServiceCreate, clinic_id: str):
@@ -436,19 +462,52 @@ def create_appointment(
     db.refresh(db_appointment)
     return db_appointment
 
-def get_appointments_by_doctor(db: Session, clinic_id: str, doctor_id: str, skip: int = 0, limit: int = 100):
+def _appointment_response_options():
+    """Loads everything `schemas.Appointment` serializes in a fixed number of queries."""
+    return (
+        joinedload(models.Appointment.patient),
+        joinedload(models.Appointment.doctor).joinedload(models.User.role),
+        joinedload(models.Appointment.doctor).joinedload(models.User.staff_member).joinedload(models.Staff.user_account)
+    )
+
+def _filter_appointment_window(query, day: date | None = None, start: datetime | None = None, end: datetime | None = None, upcoming: bool = False):
+    """
+    Restricts an appointment query to a time window. `day` is a clinic-local
+    calendar day; `start`/`end` form a half-open range; `upcoming` keeps
+    appointments from now on. Filters combine when several are given.
+    """
+    if day is not None:
+        day_start = datetime.combine(day, datetime.min.time(), CLINIC_TIMEZONE)
+        query = query.filter(
+            models.Appointment.appointment_time >= day_start,
+            models.Appointment.appointment_time < day_start + timedelta(days=1)
+        )
+    if start is not None:
+        query = query.filter(models.Appointment.appointment_time >= start)
+    if end is not None:
+        query = query.filter(models.Appointment.appointment_time < end)
+    if upcoming:
+        query = query.filter(models.Appointment.appointment_time >= func.now())
+    return query
+
+def get_appointments_by_doctor(db: Session, clinic_id: str, doctor_id: str, skip: int = 0, limit: int = 100,
+                               day: date | None = None, start: datetime | None = None, end: datetime | None = None, upcoming: bool = False):
     """
     Fetches a list of appointments for a doctor, but ONLY if the associated
-    invoice has been marked as 'Paid'.
+    invoice has been marked as 'Paid'. Optionally limited to a time window.
     """
-    return (
+    query = (
         db.query(models.Appointment)
         .join(models.Invoice, models.Appointment.invoice_id == models.Invoice.id)
+        .options(*_appointment_response_options())
         .filter(
             models.Appointment.clinic_id == clinic_id,
             models.Appointment.doctor_id == doctor_id,
             models.Invoice.status == 'Paid' # The critical business rule
         )
+    )
+    return (
+        _filter_appointment_window(query, day=day, start=start, end=end, upcoming=upcoming)
         .order_by(models.Appointment.appointment_time.asc())
         .offset(skip)
         .limit(limit)
@@ -458,8 +517,13 @@ def get_appointments_by_doctor(db: Session, clinic_id: str, doctor_id: str, skip
 # --- Lab & Radiology Test Definition CRUD ---
 def create_lab_test(db: Session, lab_test: schemas.LabTestCreate, clinic_id: str):
     """Creates a new lab test AND a corresponding billable service."""
+    # Numeric reference ranges must parse so results can be flagged; qualitative
+    # text ("Negative") is stored as-is and its results are left unflagged
+    reference_ranges.validate_range(lab_test.reference_range_normal)
+    reference_ranges.validate_range(lab_test.reference_range_critical)
+
     # 1. Create the clinical test definition
-    db_lab_test = models.LabTest(**lab_test.dict(), clinic_id=clinic_id)
+    db_lab_test = models.LabTest(**lab_test.dict(exclude_none=True), clinic_id=clinic_id)
     db.add(db_lab_test)
     db.commit()
     db.refresh(db_lab_test)
@@ -477,6 +541,7 @@ def create_lab_test(db: Session, lab_test: schemas.LabTestCreate, clinic_id: str
     )
     db.add(db_service)
     db.commit()
+    reference_ranges.invalidate_clinic_references(clinic_id)
 
     return db_lab_test
 
@@ -518,6 +583,72 @@ def get_lab_report_details(db: Session, order_id: str, clinic_id: str):
     # For now, we'll just return the result.
     return db.query(models.OrderResult).join(models.LabOrder).filter(models.LabOrder.id == order_id).first()
 
+# Custom worklist sort order: STAT first, then Urgent, then Normal
+LAB_PRIORITY_RANK = case(
+    (models.LabOrder.priority == 'STAT', 1),
+    (models.LabOrder.priority == 'Urgent', 2),
+    (models.LabOrder.priority == 'Normal', 3),
+    else_=4
+)
+
+ACTIVE_LAB_STATUSES = ('Pending', 'SampleCollected', 'InProgress', 'ResultEntered')
+DASHBOARD_WORKLIST_LIMIT = 500
+
+
+class LabOrderClaimedError(ValueError):
+    """Raised when a technician acts on a lab order another technician has claimed."""
+
+
+def _claimed_by_other(user_id):
+    """SQL condition: the order is leased to someone other than `user_id` and the lease is still running."""
+    return and_(
+        models.LabOrder.claimed_by_user_id.isnot(None),
+        models.LabOrder.claimed_by_user_id != user_id,
+        models.LabOrder.claim_expires_at > func.now()
+    )
+
+def get_lab_worklist(db: Session, clinic_id: str, statuses=('Pending',), department: str | None = None,
+                     priority: str | None = None, skip: int = 0, limit: int = 100, user_id: str | None = None) -> List[dict]:
+    """
+    Worklist read model: selects only the columns the worklist displays in a
+    single joined query (no ORM entities, no per-row lazy loads) and shapes
+    them into compact rows with small nested `patient` and `lab_test` objects.
+    With `user_id`, orders another technician currently holds are left out.
+    """
+    query = (
+        db.query(
+            models.LabOrder.id, models.LabOrder.status, models.LabOrder.priority,
+            models.LabOrder.specimen_id, models.LabOrder.created_at, models.LabOrder.claimed_by_user_id,
+            models.Patient.id.label("patient_id"), models.Patient.mrn,
+            models.Patient.first_name, models.Patient.last_name,
+            models.LabTest.id.label("lab_test_id"), models.LabTest.name.label("lab_test_name"),
+            models.LabTest.department, models.LabTest.specimen_type
+        )
+        .join(models.Patient, models.LabOrder.patient_id == models.Patient.id)
+        .join(models.LabTest, models.LabOrder.lab_test_id == models.LabTest.id)
+        .filter(
+            models.LabOrder.clinic_id == clinic_id,
+            models.LabOrder.status.in_(statuses)
+        )
+    )
+    if department:
+        query = query.filter(models.LabTest.department == department)
+    if priority:
+        query = query.filter(models.LabOrder.priority == priority)
+    if user_id:
+        query = query.filter(~_claimed_by_other(user_id))
+    rows = query.order_by(LAB_PRIORITY_RANK, models.LabOrder.created_at.asc()).offset(skip).limit(limit).all()
+    return [
+        {
+            "id": row.id, "status": row.status, "priority": row.priority,
+            "specimen_id": row.specimen_id, "created_at": row.created_at,
+            "claimed_by_user_id": row.claimed_by_user_id,
+            "patient": {"id": row.patient_id, "mrn": row.mrn, "first_name": row.first_name, "last_name": row.last_name},
+            "lab_test": {"id": row.lab_test_id, "name": row.lab_test_name, "department": row.department, "specimen_type": row.specimen_type}
+        }
+        for row in rows
+    ]
+
 def get_lab_dashboard_data(db: Session, clinic_id: str):
     """
     Calculates and returns all key metrics for the new Laboratory Dashboard,
@@ -536,30 +667,11 @@ def get_lab_dashboard_data(db: Session, clinic_id: str):
         func.date(models.LabOrder.updated_at) == today # Assuming status update changes updated_at
     ).count()
 
-    # 2. Get the full worklist and group it by department
-    worklist_items = db.query(models.LabOrder).options(
-        joinedload(models.LabOrder.patient),
-        joinedload(models.LabOrder.lab_test)
-    ).filter(
-        models.LabOrder.clinic_id == clinic_id,
-        models.LabOrder.status.in_(['Pending', 'SampleCollected', 'InProgress', 'ResultEntered'])
-    ).order_by(
-        # NEW: Use a CASE statement for custom sorting in PostgreSQL
-        case(
-            (models.LabOrder.priority == 'STAT', 1),
-            (models.LabOrder.priority == 'Urgent', 2),
-            (models.LabOrder.priority == 'Normal', 3),
-            else_=4
-        ),
-        models.LabOrder.created_at.asc()
-    ).all()
-    
+    # 2. Get the active worklist (compact projection) and group it by department
     worklist_by_department = {}
-    for order in worklist_items:
-        department = order.lab_test.department if order.lab_test else 'Uncategorized'
-        if department not in worklist_by_department:
-            worklist_by_department[department] = []
-        worklist_by_department[department].append(order)
+    for item in get_lab_worklist(db, clinic_id=clinic_id, statuses=ACTIVE_LAB_STATUSES, limit=DASHBOARD_WORKLIST_LIMIT):
+        department = item["lab_test"]["department"] or 'Uncategorized'
+        worklist_by_department.setdefault(department, []).append(item)
 
     return {
         "kpi_cards": {
@@ -662,7 +774,16 @@ def link_orders_to_invoice(db: Session, link_data: schemas.OrdersLinkToInvoice,
 
 
 # 3. Lab Tech Collects Sample
+def ensure_lab_order_not_claimed_by_other(db: Session, order_id, clinic_id: str, user_id: str):
+    """Locks the order and raises LabOrderClaimedError while another technician holds it."""
+    held = db.query(_claimed_by_other(user_id)).filter(
+        models.LabOrder.id == order_id, models.LabOrder.clinic_id == clinic_id
+    ).with_for_update(of=models.LabOrder).scalar()
+    if held:
+        raise LabOrderClaimedError("This lab order is claimed by another technician.")
+
 def collect_lab_sample(db: Session, sample_data: schemas.LabSampleCreate, clinic_id: str, user_id: str):
+    ensure_lab_order_not_claimed_by_other(db, sample_data.lab_order_id, clinic_id=clinic_id, user_id=user_id)
     db_sample = models.LabSample(
         **sample_data.dict(), clinic_id=clinic_id, collected_by_user_id=user_id
     )
@@ -671,15 +792,168 @@ def collect_lab_sample(db: Session, sample_data: schemas.LabSampleCreate, clinic
     db.refresh(db_sample)
     return db_sample
 
+# Allowed source statuses for each target status of a lab order
+LAB_STATUS_TRANSITIONS = {
+    'SampleCollected': ('Pending',),
+    'InProgress': ('SampleCollected',),
+    'ResultEntered': ('SampleCollected', 'InProgress'),
+    'Completed': ('ResultEntered',),
+    'SampleRejected': ('Pending', 'SampleCollected', 'InProgress'),
+}
+
+def _batch_result(items: List[dict]) -> dict:
+    succeeded = sum(1 for item in items if item["ok"])
+    return {"succeeded": succeeded, "failed": len(items) - succeeded, "items": items}
+
+def collect_lab_samples_batch(db: Session, samples: List[schemas.LabSampleCreate], clinic_id: str, user_id: str) -> dict:
+    """
+    Records a whole collection round at once. Orders and barcodes are
+    validated set-wise, samples are written with one multi-row insert and the
+    collected orders move Pending -> SampleCollected in one UPDATE. Items that
+    fail are reported individually; the rest are still recorded. Orders
+    another technician has claimed are refused.
+    """
+    errors = {}
+    seen_orders, seen_barcodes = set(), set()
+    for sample in samples:
+        if sample.lab_order_id in seen_orders:
+            errors[sample.lab_order_id] = "Order appears more than once in this batch."
+        elif sample.sample_barcode in seen_barcodes:
+            errors[sample.lab_order_id] = f"Barcode {sample.sample_barcode} appears more than once in this batch."
+        seen_orders.add(sample.lab_order_id)
+        seen_barcodes.add(sample.sample_barcode)
+
+    # Lock the orders so their status cannot change underneath us
+    locked_orders = (
+        db.query(models.LabOrder.id, models.LabOrder.status, _claimed_by_other(user_id))
+        .filter(models.LabOrder.clinic_id == clinic_id, models.LabOrder.id.in_(seen_orders))
+        .with_for_update()
+        .all()
+    )
+    order_status = {order_id: status for order_id, status, _ in locked_orders}
+    held_by_others = {order_id for order_id, _, held in locked_orders if held}
+    used_barcodes = {
+        barcode for barcode, in
+        db.query(models.LabSample.sample_barcode).filter(models.LabSample.sample_barcode.in_(seen_barcodes))
+    }
+    for sample in samples:
+        if sample.lab_order_id in errors:
+            continue
+        status = order_status.get(sample.lab_order_id)
+        if status is None:
+            errors[sample.lab_order_id] = "Lab order not found."
+        elif sample.lab_order_id in held_by_others:
+            errors[sample.lab_order_id] = "Lab order is claimed by another technician."
+        elif status not in LAB_STATUS_TRANSITIONS['SampleCollected']:
+            errors[sample.lab_order_id] = f"Cannot collect a sample for an order in status '{status}'."
+        elif sample.sample_barcode in used_barcodes:
+            errors[sample.lab_order_id] = f"Barcode {sample.sample_barcode} is already in use."
+
+    valid = [sample for sample in samples if sample.lab_order_id not in errors]
+    if valid:
+        inserted = set(db.execute(
+            pg_insert(models.LabSample)
+            .values([
+                {
+                    "id": uuid.uuid4(), "lab_order_id": sample.lab_order_id, "sample_barcode": sample.sample_barcode,
+                    "collected_by_user_id": user_id, "clinic_id": clinic_id
+                }
+                for sample in valid
+            ])
+            .on_conflict_do_nothing(index_elements=[models.LabSample.sample_barcode])
+            .returning(models.LabSample.lab_order_id)
+        ).scalars().all())
+        for sample in valid:
+            if sample.lab_order_id not in inserted:
+                errors[sample.lab_order_id] = f"Barcode {sample.sample_barcode} is already in use."
+        if inserted:
+            db.query(models.LabOrder).filter(models.LabOrder.id.in_(inserted)).update({
+                "status": 'SampleCollected',
+                "specimen_id": case(
+                    {sample.lab_order_id: sample.sample_barcode for sample in valid if sample.lab_order_id in inserted},
+                    value=models.LabOrder.id
+                )
+            }, synchronize_session=False)
+    db.commit()
+
+    return _batch_result([
+        {
+            "lab_order_id": sample.lab_order_id, "sample_barcode": sample.sample_barcode,
+            "ok": sample.lab_order_id not in errors, "detail": errors.get(sample.lab_order_id)
+        }
+        for sample in samples
+    ])
+
+def transition_lab_orders(db: Session, order_ids: List[uuid.UUID], to_status: str, clinic_id: str, user_id: str,
+                          rejection_reason: str | None = None) -> dict:
+    """
+    Moves many lab orders to `to_status` with a single guarded UPDATE; only
+    orders currently in an allowed source status, and not claimed by another
+    technician, change. The rest are reported with the reason.
+    """
+    if to_status not in LAB_STATUS_TRANSITIONS:
+        raise ValueError(f"Unsupported target status '{to_status}'.")
+    if to_status == 'SampleRejected' and not rejection_reason:
+        raise ValueError("A rejection reason is required when rejecting samples.")
+    values = {"status": to_status}
+    if rejection_reason:
+        values["rejection_reason"] = rejection_reason
+
+    order_ids = list(dict.fromkeys(order_ids))
+    updated = set(db.execute(
+        update(models.LabOrder)
+        .where(
+            models.LabOrder.clinic_id == clinic_id,
+            models.LabOrder.id.in_(order_ids),
+            models.LabOrder.status.in_(LAB_STATUS_TRANSITIONS[to_status]),
+            ~_claimed_by_other(user_id)
+        )
+        .values(**values)
+        .returning(models.LabOrder.id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all())
+    not_updated = (
+        db.query(models.LabOrder.id, models.LabOrder.status, _claimed_by_other(user_id))
+        .filter(models.LabOrder.clinic_id == clinic_id, models.LabOrder.id.in_(set(order_ids) - updated))
+        .all()
+    ) if len(updated) < len(order_ids) else []
+    current_status = {order_id: status for order_id, status, _ in not_updated}
+    held_by_others = {order_id for order_id, _, held in not_updated if held}
+    db.commit()
+
+    items = []
+    for order_id in order_ids:
+        if order_id in updated:
+            items.append({"lab_order_id": order_id, "ok": True})
+        elif order_id in held_by_others:
+            items.append({"lab_order_id": order_id, "ok": False, "detail": "Lab order is claimed by another technician."})
+        elif order_id in current_status:
+            items.append({"lab_order_id": order_id, "ok": False, "detail": f"Cannot move from '{current_status[order_id]}' to '{to_status}'."})
+        else:
+            items.append({"lab_order_id": order_id, "ok": False, "detail": "Lab order not found."})
+    return _batch_result(items)
+
 # 4. Lab/Radiology Tech Uploads Results
 def create_order_result(db: Session, result_data: schemas.OrderResultCreate, clinic_id: str, user_id: str):
+    """Records a lab or radiology result; raises LabOrderClaimedError for a lab order another technician holds."""
+    if result_data.lab_order_id:
+        ensure_lab_order_not_claimed_by_other(db, result_data.lab_order_id, clinic_id=clinic_id, user_id=user_id)
     db_result = models.OrderResult(
         **result_data.dict(), clinic_id=clinic_id, reported_by_user_id=user_id
     )
     db.add(db_result)
     if result_data.lab_order_id:
-        order = db.query(models.LabOrder).filter(models.LabOrder.id == result_data.lab_order_id).first()
-        if order: order.status = 'Completed'
+        order = db.query(models.LabOrder).options(joinedload(models.LabOrder.lab_test)).filter(models.LabOrder.id == result_data.lab_order_id).first()
+        if order:
+            order.status = 'Completed'
+            if db_result.result_data:
+                # Flag against the test's reference ranges on the server
+                annotated = dict(db_result.result_data)
+                reference_ranges.annotate_results(
+                    reference_ranges.get_clinic_references(db, clinic_id),
+                    [(order.lab_test_id, order.lab_test.name if order.lab_test else None, annotated)]
+                )
+                db_result.result_data = annotated
     elif result_data.radiology_order_id:
         order = db.query(models.RadiologyOrder).filter(models.RadiologyOrder.id == result_data.radiology_order_id).first()
         if order: order.status = 'Reported'
@@ -754,6 +1028,78 @@ def get_pending_lab_orders(db: Session, clinic_id: str):
         models.LabOrder.clinic_id == clinic_id, models.LabOrder.status == 'Pending'
     ).all()
 
+# Orders a technician can still work on at the bench
+CLAIMABLE_LAB_STATUSES = ('Pending', 'SampleCollected', 'InProgress')
+
+def claim_lab_orders(db: Session, clinic_id: str, user_id: str, count: int = 10, department: str | None = None,
+                     priority: str | None = None, lease_minutes: int = 30):
+    """
+    Atomically assigns up to `count` unclaimed (or lease-expired) orders to a
+    technician, highest priority and oldest first. Rows another transaction
+    is claiming right now are skipped rather than waited on, so parallel
+    benches never receive the same order.
+    """
+    candidates = (
+        select(models.LabOrder.id)
+        .join(models.LabTest, models.LabOrder.lab_test_id == models.LabTest.id)
+        .where(
+            models.LabOrder.clinic_id == clinic_id,
+            models.LabOrder.status.in_(CLAIMABLE_LAB_STATUSES),
+            or_(
+                models.LabOrder.claimed_by_user_id.is_(None),
+                models.LabOrder.claim_expires_at < func.now()
+            )
+        )
+        .order_by(LAB_PRIORITY_RANK, models.LabOrder.created_at.asc())
+        .limit(count)
+        .with_for_update(of=models.LabOrder, skip_locked=True)
+    )
+    if department:
+        candidates = candidates.where(models.LabTest.department == department)
+    if priority:
+        candidates = candidates.where(models.LabOrder.priority == priority)
+
+    claimed_ids = db.execute(
+        update(models.LabOrder)
+        .where(models.LabOrder.id.in_(candidates.scalar_subquery()))
+        .values(
+            claimed_by_user_id=user_id,
+            claimed_at=func.now(),
+            claim_expires_at=func.now() + timedelta(minutes=lease_minutes)
+        )
+        .returning(models.LabOrder.id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+    db.commit()
+    return get_claimed_lab_orders(db, clinic_id=clinic_id, user_id=user_id, order_ids=claimed_ids)
+
+def release_lab_orders(db: Session, clinic_id: str, user_id: str, order_ids: List[uuid.UUID]) -> int:
+    """Hands the technician's claimed orders back to the shared worklist."""
+    released = db.query(models.LabOrder).filter(
+        models.LabOrder.clinic_id == clinic_id,
+        models.LabOrder.id.in_(order_ids),
+        models.LabOrder.claimed_by_user_id == user_id
+    ).update({"claimed_by_user_id": None, "claimed_at": None, "claim_expires_at": None}, synchronize_session=False)
+    db.commit()
+    return released
+
+def get_claimed_lab_orders(db: Session, clinic_id: str, user_id: str, order_ids: List[uuid.UUID] | None = None):
+    """Orders currently leased to a technician, in worklist order."""
+    query = db.query(models.LabOrder).options(
+        joinedload(models.LabOrder.patient),
+        joinedload(models.LabOrder.lab_test),
+        joinedload(models.LabOrder.doctor).joinedload(models.User.role),
+        joinedload(models.LabOrder.doctor).joinedload(models.User.staff_member)
+    ).filter(
+        models.LabOrder.clinic_id == clinic_id,
+        models.LabOrder.claimed_by_user_id == user_id,
+        models.LabOrder.claim_expires_at >= func.now(),
+        models.LabOrder.status.in_(CLAIMABLE_LAB_STATUSES)
+    )
+    if order_ids is not None:
+        query = query.filter(models.LabOrder.id.in_(order_ids))
+    return query.order_by(LAB_PRIORITY_RANK, models.LabOrder.created_at.asc()).all()
+
 def get_pending_radiology_orders(db: Session, clinic_id: str):
     """
     Fetches the worklist of all 'Pending' radiology orders for the clinic,
@@ -840,15 +1186,22 @@ def create_medication_administration_record(
     db.refresh(db_med_admin)
     return db_med_admin
 
-def get_scheduled_appointments(db: Session, clinic_id: str):
-    """Fetches a list of all 'Scheduled' appointments for the clinic (the nurse's queue)."""
-    return (
+def get_scheduled_appointments(db: Session, clinic_id: str, day: date | None = None, start: datetime | None = None,
+                               end: datetime | None = None, upcoming: bool = False, skip: int = 0, limit: int = 200):
+    """Fetches 'Scheduled' appointments for the clinic (the nurse's queue), optionally within a time window."""
+    query = (
         db.query(models.Appointment)
+        .options(*_appointment_response_options())
         .filter(
             models.Appointment.clinic_id == clinic_id,
             models.Appointment.status == 'Scheduled'
         )
+    )
+    return (
+        _filter_appointment_window(query, day=day, start=start, end=end, upcoming=upcoming)
         .order_by(models.Appointment.appointment_time.asc())
+        .offset(skip)
+        .limit(limit)
         .all()
     )
 
@@ -1066,22 +1419,51 @@ def get_accounting_dashboard_data(db: Session, clinic_id: str):
 # --- Pharmacy CRUD Operations ---
 
 def create_medication(db: Session, medication: schemas.MedicationCreate, clinic_id: str):
-    """Adds a new medication to the clinic's formulary/inventory."""
+    """Adds a new medication to the clinic's formulary/inventory; opening stock goes to its UNLOTTED lot."""
     db_medication = models.Medication(**medication.dict(), clinic_id=clinic_id)
     db.add(db_medication)
+    db.flush()
+    if db_medication.stock_quantity:
+        lot_ids = inventory_service.ensure_lots(db, clinic_id, [(db_medication.id, inventory_service.UNLOTTED, None)])
+        inventory_service.post_movements(db, clinic_id, [{
+            "medication_id": db_medication.id, "lot_id": lot_ids[(db_medication.id, inventory_service.UNLOTTED)],
+            "movement_type": "Receipt", "quantity": db_medication.stock_quantity, "note": "Opening stock"
+        }], update_totals=False)
     db.commit()
     db.refresh(db_medication)
     return db_medication
 
-def get_proposed_prescriptions(db: Session, clinic_id: str):
-    """Fetches a list of all 'Proposed' prescriptions for the clinic (the pharmacist's queue)."""
-    return (
+def get_proposed_prescriptions(db: Session, clinic_id: str, patient_id: str | None = None, doctor_id: str | None = None,
+                               skip: int = 0, limit: int = 100):
+    """
+    Fetches a page of 'Proposed' prescriptions for the clinic (the pharmacist's
+    queue), oldest first. Everything `schemas.Prescription` serializes is
+    eager-loaded: the patient and doctor (role, staff record) are joined into
+    the page query and the items with their medications come from one
+    selectin query, so a page costs two statements however long it is.
+    """
+    query = (
         db.query(models.Prescription)
+        .options(
+            joinedload(models.Prescription.patient),
+            joinedload(models.Prescription.doctor).joinedload(models.User.role),
+            joinedload(models.Prescription.doctor).joinedload(models.User.staff_member)
+            .joinedload(models.Staff.user_account).joinedload(models.User.role),
+            selectinload(models.Prescription.items).joinedload(models.PrescriptionItem.medication)
+        )
         .filter(
             models.Prescription.clinic_id == clinic_id,
             models.Prescription.status == 'Proposed'
         )
-        .order_by(models.Prescription.created_at.asc())
+    )
+    if patient_id:
+        query = query.filter(models.Prescription.patient_id == patient_id)
+    if doctor_id:
+        query = query.filter(models.Prescription.doctor_id == doctor_id)
+    return (
+        query.order_by(models.Prescription.created_at.asc(), models.Prescription.id.asc())
+        .offset(skip)
+        .limit(limit)
         .all()
     )
 
@@ -1091,7 +1473,8 @@ def get_medications_by_clinic(db: Session, clinic_id: str):
 
 def create_prescription(db: Session, prescription_data: schemas.PrescriptionCreate, clinic_id: str, doctor_id: str):
     """
-    Creates a new, detailed prescription, including linking diagnoses and procedures.
+    Creates a new, detailed prescription, including linking diagnoses and
+    procedures, and reserves stock for its items where available.
     """
     db_prescription = models.Prescription(
         patient_id=prescription_data.patient_id,
@@ -1100,12 +1483,16 @@ def create_prescription(db: Session, prescription_data: schemas.PrescriptionCrea
         status='Proposed'
     )
     db.add(db_prescription)
-    db.commit()
-    db.refresh(db_prescription)
+    db.flush()
 
-    # Add prescription items
-    for item_data in prescription_data.items:
-        db.add(models.PrescriptionItem(**item_data.dict(), prescription_id=db_prescription.id, clinic_id=clinic_id))
+    # Add prescription items and hold their stock until the pharmacy dispenses them
+    items = [
+        models.PrescriptionItem(**item_data.dict(), prescription_id=db_prescription.id, clinic_id=clinic_id)
+        for item_data in prescription_data.items
+    ]
+    db.add_all(items)
+    db.flush()
+    reservation_service.reserve_for_prescription(db, clinic_id, db_prescription.id, items)
 
     # Link diagnoses to the appointment
     for code_id in prescription_data.diagnoses:
@@ -1130,66 +1517,168 @@ def create_prescription(db: Session, prescription_data: schemas.PrescriptionCrea
     db.commit()
     return db_prescription
 
+PHARMACY_LEDGER_ACCOUNTS = ('Accounts Receivable', 'Service Revenue', 'Cash', 'Pharmacy Revenue')
+
 def process_pharmacy_sale(db: Session, sale_data: schemas.PharmacySaleCreate, clinic_id: str, pharmacist_id: str):
-    # ... (code for calculation and validation remains the same)
-    total_amount = 0
-    invoice_items_to_create = []
-    for item_to_dispense in sale_data.items_to_dispense:
-        prescription_item = db.query(models.PrescriptionItem).options(joinedload(models.PrescriptionItem.medication)).filter(
-            models.PrescriptionItem.id == item_to_dispense.prescription_item_id
-        ).first()
-        if not prescription_item or prescription_item.prescription.patient_id != sale_data.patient_id:
-            raise ValueError(f"Prescription item {item_to_dispense.prescription_item_id} not found for this patient.")
-        medication = prescription_item.medication
-        if medication.stock_quantity < item_to_dispense.quantity_to_dispense:
-            raise ValueError(f"Not enough stock for {medication.name}. Available: {medication.stock_quantity}")
-        price_for_item = medication.unit_price * item_to_dispense.quantity_to_dispense
-        total_amount += price_for_item
-        pharmacy_service = db.query(models.Service).filter(models.Service.name == medication.name).first()
-        if not pharmacy_service:
-             pharmacy_service = create_service(db, schemas.ServiceCreate(name=medication.name, price=medication.unit_price, category="Pharmacy"), clinic_id)
-        invoice_items_to_create.append(schemas.InvoiceItemCreate(service_id=pharmacy_service.id, quantity=item_to_dispense.quantity_to_dispense))
-
-    invoice_data = schemas.InvoiceCreate(patient_id=sale_data.patient_id, items=invoice_items_to_create)
-    db_invoice = create_invoice(db, invoice_data=invoice_data, clinic_id=clinic_id, user_id=pharmacist_id)
-    db_sale = models.PharmacySale(
-        patient_id=sale_data.patient_id, invoice_id=db_invoice.id,
-        pharmacist_id=pharmacist_id, total_amount=total_amount, clinic_id=clinic_id
+    """
+    Dispenses prescription items and bills them in one transaction with a
+    fixed number of statements, whatever the number of items. The items'
+    stock reservations are converted and stock is taken with a single guarded
+    UPDATE, so a sale can never take units held for another prescription or
+    taken by a concurrent sale. Stock is drawn from lots first-expiry-first-out.
+    Raises ValueError (nothing is written) when an item does not belong to
+    the prescription or stock is short.
+    """
+    requested = {item.prescription_item_id: item.quantity_to_dispense for item in sale_data.items_to_dispense}
+    if not requested:
+        raise ValueError("At least one item must be dispensed.")
+    if len(requested) != len(sale_data.items_to_dispense):
+        raise ValueError("Each prescription item may only be listed once.")
+    if any(quantity <= 0 for quantity in requested.values()):
+        raise ValueError("Quantities to dispense must be positive.")
+
+    # 1. Items and their medications, scoped to this patient's prescription
+    prescription_items = (
+        db.query(models.PrescriptionItem)
+        .join(models.Prescription, models.PrescriptionItem.prescription_id == models.Prescription.id)
+        .options(joinedload(models.PrescriptionItem.medication))
+        .filter(
+            models.PrescriptionItem.id.in_(requested),
+            models.PrescriptionItem.clinic_id == clinic_id,
+            models.Prescription.id == sale_data.prescription_id,
+            models.Prescription.patient_id == sale_data.patient_id
+        )
+        .all()
     )
-    db.add(db_sale)
-    db.flush()
-    for item_to_dispense in sale_data.items_to_dispense:
-        db_dispensation = models.Dispensation(
-            pharmacy_sale_id=db_sale.id,
-            prescription_item_id=item_to_dispense.prescription_item_id,
-            quantity_dispensed=item_to_dispense.quantity_to_dispense,
-            clinic_id=clinic_id
+    missing = sorted(set(requested) - {item.id for item in prescription_items})
+    if missing:
+        raise ValueError(f"Prescription items {missing} not found on this prescription for this patient.")
+
+    medications = {item.medication_id: item.medication for item in prescription_items}
+    quantity_by_medication = {}
+    for item in prescription_items:
+        quantity_by_medication[item.medication_id] = quantity_by_medication.get(item.medication_id, 0) + requested[item.id]
+
+    # 2. Convert this prescription's reservations, then take stock with one guarded
+    #    UPDATE ... FROM (VALUES ...) against what is not held for other prescriptions
+    held = reservation_service.convert_for_items(db, clinic_id, requested)
+    wanted = values(
+        column("medication_id", Integer), column("quantity", Integer), column("held", Integer), name="wanted"
+    ).data([(medication_id, quantity, held.get(medication_id, 0)) for medication_id, quantity in quantity_by_medication.items()])
+    taken = set(db.execute(
+        update(models.Medication)
+        .where(
+            models.Medication.id == wanted.c.medication_id,
+            models.Medication.clinic_id == clinic_id,
+            models.Medication.stock_quantity - models.Medication.reserved_quantity + wanted.c.held >= wanted.c.quantity
         )
-        db.add(db_dispensation)
-        prescription_item = db.query(models.PrescriptionItem).filter(models.PrescriptionItem.id == item_to_dispense.prescription_item_id).first()
-        prescription_item.medication.stock_quantity -= item_to_dispense.quantity_to_dispense
-    prescription = db.query(models.Prescription).filter(models.Prescription.id == sale_data.prescription_id).first()
-    if prescription:
-        prescription.status = 'Dispensed'
-    
-    # ... (ledger entry code remains the same)
-    cash_account = db.query(models.Account).filter(models.Account.name == 'Cash', models.Account.clinic_id == clinic_id).first()
-    revenue_account = db.query(models.Account).filter(models.Account.name == 'Pharmacy Revenue', models.Account.clinic_id == clinic_id).first()
-    if cash_account and revenue_account:
-        create_ledger_entry(
-            db,
-            schemas.LedgerEntryCreate(
-                description=f"Pharmacy sale for invoice {db_invoice.id}",
-                debit_account_id=cash_account.id,
-                credit_account_id=revenue_account.id,
-                amount=total_amount
-            ),
-            clinic_id=clinic_id,
-            user_id=pharmacist_id
+        .values(
+            stock_quantity=models.Medication.stock_quantity - wanted.c.quantity,
+            reserved_quantity=models.Medication.reserved_quantity - wanted.c.held
         )
+        .returning(models.Medication.id)
+        .execution_options(synchronize_session=False)
+    ).scalars())
+    short = [medications[medication_id] for medication_id in quantity_by_medication if medication_id not in taken]
+    if short:
+        raise ValueError("Not enough stock for " + ", ".join(
+            f"{medication.name} (available: {medication.available_quantity + held.get(medication.id, 0)}, requested: {quantity_by_medication[medication.id]})"
+            for medication in short
+        ))
+    reorder_service.record_consumption(db, clinic_id, quantity_by_medication)
+    # Pick lots earliest-expiry-first; expired lots cannot be dispensed
+    lot_picks, lot_shortages = inventory_service.allocate_fefo(db, clinic_id, quantity_by_medication)
+    if lot_shortages:
+        raise ValueError("Not enough unexpired stock for " + ", ".join(
+            f"{medications[medication_id].name} (available: {available}, requested: {quantity_by_medication[medication_id]})"
+            for medication_id, available in lot_shortages.items()
+        ))
+
+    # 3. One billable service per medication, created in one insert where missing
+    names = {medication.name for medication in medications.values()}
+    services = dict(
+        db.query(models.Service.name, models.Service.id)
+        .filter(models.Service.clinic_id == clinic_id, models.Service.name.in_(names))
+        .all()
+    )
+    new_services = [medication for medication in medications.values() if medication.name not in services]
+    if new_services:
+        rows = db.execute(
+            pg_insert(models.Service).values([
+                {"name": medication.name, "price": medication.unit_price, "category": "Pharmacy", "clinic_id": clinic_id}
+                for medication in {medication.name: medication for medication in new_services}.values()
+            ]).returning(models.Service.name, models.Service.id)
+        ).all()
+        services.update(dict(rows))
+
+    total_amount = sum(
+        (medications[medication_id].unit_price * quantity for medication_id, quantity in quantity_by_medication.items()),
+        Decimal(0)
+    )
+    invoice_id, sale_id = uuid.uuid4(), uuid.uuid4()
+
+    # 4. Invoice, sale and dispensations
+    db.execute(pg_insert(models.Invoice).values(
+        id=invoice_id, patient_id=sale_data.patient_id, subtotal_amount=total_amount,
+        discount_amount=0, total_amount=total_amount, status='Unpaid',
+        clinic_id=clinic_id, created_by_user_id=pharmacist_id
+    ))
+    db.execute(pg_insert(models.InvoiceItem).values([
+        {
+            "invoice_id": invoice_id, "service_id": services[medications[medication_id].name], "quantity": quantity,
+            "price_at_time_of_invoice": medications[medication_id].unit_price, "clinic_id": clinic_id
+        }
+        for medication_id, quantity in quantity_by_medication.items()
+    ]))
+    db.execute(pg_insert(models.PharmacySale).values(
+        id=sale_id, patient_id=sale_data.patient_id, invoice_id=invoice_id,
+        pharmacist_id=pharmacist_id, total_amount=total_amount, clinic_id=clinic_id
+    ))
+    db.execute(pg_insert(models.Dispensation).values([
+        {"pharmacy_sale_id": sale_id, "prescription_item_id": item_id, "quantity_dispensed": quantity, "clinic_id": clinic_id}
+        for item_id, quantity in requested.items()
+    ]))
+    inventory_service.post_movements(db, clinic_id, [
+        {
+            "medication_id": medication_id, "lot_id": lot_id, "movement_type": "Dispensation", "quantity": -quantity,
+            "pharmacy_sale_id": sale_id, "created_by_user_id": pharmacist_id
+        }
+        for medication_id, lot_id, quantity in lot_picks
+    ], update_totals=False)
+    db.execute(
+        update(models.Prescription)
+        .where(models.Prescription.id == sale_data.prescription_id, models.Prescription.clinic_id == clinic_id)
+        .values(status='Dispensed')
+        .execution_options(synchronize_session=False)
+    )
+
+    # 5. Ledger: the invoice (receivable) and the cash sale, in one insert
+    accounts = dict(
+        db.query(models.Account.name, models.Account.id)
+        .filter(models.Account.clinic_id == clinic_id, models.Account.name.in_(PHARMACY_LEDGER_ACCOUNTS))
+        .all()
+    )
+    ledger_entries = []
+    if 'Accounts Receivable' in accounts and 'Service Revenue' in accounts:
+        ledger_entries.append({
+            "description": f"Invoice #{invoice_id} for patient {sale_data.patient_id}",
+            "debit_account_id": accounts['Accounts Receivable'], "credit_account_id": accounts['Service Revenue']
+        })
+    else:
+        print("WARNING: 'Accounts Receivable' or 'Service Revenue' not found in Chart of Accounts. Skipping ledger entry.")
+    if 'Cash' in accounts and 'Pharmacy Revenue' in accounts:
+        ledger_entries.append({
+            "description": f"Pharmacy sale for invoice {invoice_id}",
+            "debit_account_id": accounts['Cash'], "credit_account_id": accounts['Pharmacy Revenue']
+        })
+    if ledger_entries:
+        db.execute(pg_insert(models.LedgerEntry).values([
+            {**entry, "amount": total_amount, "invoice_id": invoice_id, "clinic_id": clinic_id, "created_by_user_id": pharmacist_id}
+            for entry in ledger_entries
+        ]))
 
     db.commit()
-    
+
     # Re-fetch the sale to load all relationships for the response
     sale_with_details = (
         db.query(models.PharmacySale)
@@ -1198,7 +1687,7 @@ def process_pharmacy_sale(db: Session, sale_data: schemas.PharmacySaleCreate, cl
             joinedload(models.PharmacySale.patient),
             joinedload(models.PharmacySale.pharmacist).joinedload(models.User.role)
         )
-        .filter(models.PharmacySale.id == db_sale.id).first()
+        .filter(models.PharmacySale.id == sale_id).first()
     )
     return sale_with_details
 
@@ -1211,21 +1700,13 @@ def get_patient_radiology_orders(db: Session, patient_id: str, clinic_id: str):
 
 # --- Medical Coding CRUD Operations ---
 
-def search_icd10_codes(db: Session, search_term: str):
+def search_icd10_codes(db: Session, search_term: str, limit: int = 20):
     """
-    Searches for ICD-10 codes by code or description.
-    This allows doctors to easily find the right diagnosis code.
+    Searches for ICD-10 codes by code prefix or description words, best
+    matches first, using the in-process index (see icd10_index) rather than
+    scanning the table on every keystroke.
     """
-    search_filter = f"%{search_term.lower()}%"
-    return (
-        db.query(models.ICD10Code)
-        .filter(
-            (models.ICD10Code.code.ilike(search_filter)) |
-            (models.ICD10Code.description.ilike(search_filter))
-        )
-        .limit(20) # Limit results for performance
-        .all()
-    )
+    return icd10_index.get_index(db).search(search_term, limit=limit)
 
 def add_diagnosis_to_appointment(
     db: Session, 
@@ -1252,6 +1733,7 @@ def search_cpt_codes(db: Session, search_term: str):
     return (
         db.query(models.CPTCode)
         .filter(
+            models.CPTCode.is_active,
             (models.CPTCode.code.ilike(search_filter)) |
             (models.CPTCode.description.ilike(search_filter))
         )
@@ -1652,15 +2134,38 @@ def get_receptionist_dashboard_data(db: Session, clinic_id: str):
         "recent_unpaid_invoices": recent_unpaid_invoices
     }
 
+def _post_consultation_receivables(db: Session, invoice_ids: List[uuid.UUID], patient_id, fee, clinic_id: str, user_id: str):
+    """One Accounts Receivable / Service Revenue entry per consultation invoice, in one insert."""
+    accounts = dict(
+        db.query(models.Account.name, models.Account.id)
+        .filter(models.Account.clinic_id == clinic_id, models.Account.name.in_(('Accounts Receivable', 'Service Revenue')))
+        .all()
+    )
+    if len(accounts) < 2:
+        print("WARNING: 'Accounts Receivable' or 'Service Revenue' not found in Chart of Accounts. Skipping ledger entry.")
+        return
+    db.execute(pg_insert(models.LedgerEntry).values([
+        {
+            "description": f"Invoice #{invoice_id} for patient {patient_id}",
+            "debit_account_id": accounts['Accounts Receivable'], "credit_account_id": accounts['Service Revenue'],
+            "amount": fee, "invoice_id": invoice_id, "clinic_id": clinic_id, "created_by_user_id": user_id
+        }
+        for invoice_id in invoice_ids
+    ]))
+
 def book_appointment_with_invoice(db: Session, patient_id: str, doctor_id: str, appointment_time: datetime, clinic_id: str, user_id: str):
     """
-    Creates an invoice for a doctor's consultation and a linked appointment
-    with 'AwaitingPayment' status in a single transaction.
+    Creates an invoice for a doctor's consultation (with its receivable
+    ledger entry) and a linked appointment with 'AwaitingPayment' status in a
+    single transaction. Raises SlotUnavailableError if the doctor is not free
+    at `appointment_time`.
     """
     doctor = db.query(models.User).options(joinedload(models.User.staff_member)).filter(models.User.id == doctor_id).first()
     if not doctor or not doctor.staff_member or doctor.staff_member.consultation_fee is None:
         raise ValueError("Selected doctor does not have a valid consultation fee set.")
     fee = doctor.staff_member.consultation_fee
+    # Holds a per-doctor lock until the caller commits
+    ensure_slots_available(db, doctor_id=doctor_id, clinic_id=clinic_id, appointment_times=[appointment_time])
 
     consultation_service = db.query(models.Service).filter(models.Service.clinic_id == clinic_id, models.Service.name == "Doctor Consultation").first()
     if not consultation_service:
@@ -1684,6 +2189,7 @@ def book_appointment_with_invoice(db: Session, patient_id: str, doctor_id: str,
         invoice_id=db_invoice.id, service_id=consultation_service.id,
         quantity=1, price_at_time_of_invoice=fee, clinic_id=clinic_id
     ))
+    _post_consultation_receivables(db, [db_invoice.id], patient_id=patient_id, fee=fee, clinic_id=clinic_id, user_id=user_id)
     
     db_appointment = models.Appointment(
         patient_id=patient_id, doctor_id=doctor_id,
@@ -1694,6 +2200,83 @@ def book_appointment_with_invoice(db: Session, patient_id: str, doctor_id: str,
     db.add(db_appointment)
     return db_appointment
 
+def book_appointment_series(db: Session, series: schemas.AppointmentSeriesCreate, clinic_id: str, user_id: str):
+    """
+    Books a series of consultations (explicit times or a weekly recurrence)
+    all-or-nothing: the fee and consultation service are resolved once, every
+    time is conflict-checked together under the per-doctor lock, and the
+    invoices, invoice items, appointments and their receivable ledger
+    entries (one per invoice, as for a single booking) are written with one
+    multi-row insert each, then committed once. Raises SlotUnavailableError
+    if any time is taken.
+    """
+    if (series.appointment_times is None) == (series.recurrence is None):
+        raise ValueError("Provide either appointment_times or a recurrence, not both.")
+    if series.recurrence is not None:
+        appointment_times = expand_recurrence(series.recurrence)
+    else:
+        appointment_times = sorted(set(series.appointment_times))
+    if not appointment_times:
+        raise ValueError("The series contains no appointments.")
+    if len(appointment_times) > MAX_SERIES_APPOINTMENTS:
+        raise ValueError(f"A series can contain at most {MAX_SERIES_APPOINTMENTS} appointments.")
+
+    patient_exists = db.query(models.Patient.id).filter(
+        models.Patient.id == series.patient_id, models.Patient.clinic_id == clinic_id
+    ).first()
+    if not patient_exists:
+        raise ValueError("Patient not found in this clinic.")
+    doctor = db.query(models.User).options(joinedload(models.User.staff_member)).filter(
+        models.User.id == series.doctor_id, models.User.clinic_id == clinic_id
+    ).first()
+    if not doctor or not doctor.staff_member or doctor.staff_member.consultation_fee is None:
+        raise ValueError("Selected doctor does not have a valid consultation fee set.")
+    fee = doctor.staff_member.consultation_fee
+    # Holds a per-doctor lock until the caller commits
+    ensure_slots_available(db, doctor_id=str(series.doctor_id), clinic_id=clinic_id, appointment_times=appointment_times)
+
+    consultation_service = db.query(models.Service).filter(models.Service.clinic_id == clinic_id, models.Service.name == "Doctor Consultation").first()
+    if not consultation_service:
+        consultation_service = models.Service(name="Doctor Consultation", price=0, category="Consultation", clinic_id=clinic_id)
+        db.add(consultation_service)
+        db.flush()
+
+    invoice_ids = [uuid.uuid4() for _ in appointment_times]
+    appointment_ids = [uuid.uuid4() for _ in appointment_times]
+    db.execute(pg_insert(models.Invoice).values([
+        {
+            "id": invoice_id, "patient_id": series.patient_id, "subtotal_amount": fee, "discount_amount": 0,
+            "total_amount": fee, "status": 'Unpaid', "clinic_id": clinic_id, "created_by_user_id": user_id
+        }
+        for invoice_id in invoice_ids
+    ]))
+    db.execute(pg_insert(models.InvoiceItem).values([
+        {
+            "invoice_id": invoice_id, "service_id": consultation_service.id, "quantity": 1,
+            "price_at_time_of_invoice": fee, "clinic_id": clinic_id
+        }
+        for invoice_id in invoice_ids
+    ]))
+    db.execute(pg_insert(models.Appointment).values([
+        {
+            "id": appointment_id, "patient_id": series.patient_id, "doctor_id": series.doctor_id,
+            "appointment_time": appointment_time, "invoice_id": invoice_id, "clinic_id": clinic_id,
+            "created_by_user_id": user_id, "status": 'AwaitingPayment'
+        }
+        for appointment_id, invoice_id, appointment_time in zip(appointment_ids, invoice_ids, appointment_times)
+    ]))
+
+    _post_consultation_receivables(db, invoice_ids, patient_id=series.patient_id, fee=fee, clinic_id=clinic_id, user_id=user_id)
+    db.commit()
+
+    return (
+        db.query(models.Appointment)
+        .options(*_appointment_response_options())
+        .filter(models.Appointment.id.in_(appointment_ids))
+        .order_by(models.Appointment.appointment_time.asc())
+        .all()
+    )
+
 def update_staff_member(db: Session, staff_id: str, clinic_id: str, staff_data: schemas.StaffUpdate):
     """Updates a staff member's details, ensuring they belong to the correct clinic."""
     db_staff = db.query(models.Staff).filter(
@@ -0,0 +1,249 @@
+# backend/duplicate_patient_service.py
+
+import re
+import unicodedata
+import zlib
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+import numpy as np
+from sqlalchemy import func, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session, joinedload
+
+from . import models
+from .database import SessionLocal
+
+SCORE_THRESHOLD = 0.75
+# Blocks larger than this (e.g., a shared clinic phone number) carry no signal
+# and would reintroduce quadratic comparisons, so they are skipped.
+MAX_BLOCK_SIZE = 200
+# Re-scan a small window before the watermark to pick up rows whose
+# transactions committed after the previous scan started.
+WATERMARK_OVERLAP = timedelta(minutes=5)
+BIGRAM_DIMENSIONS = 512
+CHUNK_SIZE = 5000
+
+NAME_WEIGHT = 0.6
+DOB_WEIGHT = 0.25
+PHONE_WEIGHT = 0.15
+
+_SOUNDEX_CODES = {
+    **dict.fromkeys("BFPV", "1"), **dict.fromkeys("CGJKQSXZ", "2"),
+    **dict.fromkeys("DT", "3"), "L": "4", **dict.fromkeys("MN", "5"), "R": "6",
+}
+
+
+def normalize_name(value: str | None) -> str:
+    value = unicodedata.normalize("NFKD", value or "")
+    value = "".join(ch for ch in value if not unicodedata.combining(ch))
+    return re.sub(r"[^a-z ]+", "", value.lower()).strip()
+
+def soundex(value: str | None) -> str:
+    """American Soundex of the first word of a name, e.g. 'Robert' -> 'R163'."""
+    letters = normalize_name(value).replace(" ", "").upper()
+    if not letters:
+        return ""
+    encoded = letters[0]
+    previous = _SOUNDEX_CODES.get(letters[0], "")
+    for ch in letters[1:]:
+        code = _SOUNDEX_CODES.get(ch, "")
+        if code and code != previous:
+            encoded += code
+        if ch not in "HW":
+            previous = code
+    return (encoded + "000")[:4]
+
+def phone_suffix(value: str | None) -> str | None:
+    digits = re.sub(r"\D", "", value or "")
+    return digits[-7:] if len(digits) >= 7 else None
+
+def blocking_keys(first_name: str, last_name: str, date_of_birth, contact_number: str | None) -> List[str]:
+    """Keys that two records must share before they are compared at all."""
+    keys = []
+    if date_of_birth:
+        for name in (last_name, first_name):
+            code = soundex(name)
+            if code:
+                keys.append(f"dob:{date_of_birth.isoformat()}:{code}")
+    suffix = phone_suffix(contact_number)
+    if suffix:
+        keys.append(f"tel:{suffix}")
+    return sorted(set(keys))
+
+def _bigram_vectors(names: List[str]) -> np.ndarray:
+    """L2-normalised hashed character-bigram vectors, one row per name."""
+    vectors = np.zeros((len(names), BIGRAM_DIMENSIONS), dtype=np.float32)
+    for row, name in enumerate(names):
+        padded = f" {name} "
+        for i in range(len(padded) - 1):
+            vectors[row, zlib.crc32(padded[i:i + 2].encode()) % BIGRAM_DIMENSIONS] += 1.0
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+
+def run_incremental_scan(db: Session, clinic_id: str, threshold: float = SCORE_THRESHOLD) -> dict:
+    """
+    Refreshes blocking keys for patients created or updated since the last scan
+    and scores them against every patient sharing a block. Pairs at or above
+    the threshold are upserted into `patient_duplicate_candidates`; reviewed
+    pairs keep their status.
+    """
+    # Only one scan per clinic at a time; a concurrent trigger simply skips.
+    got_lock = db.execute(
+        text("SELECT pg_try_advisory_xact_lock(hashtext(:lock_key))"),
+        {"lock_key": f"patient-dedupe:{clinic_id}"}
+    ).scalar()
+    if not got_lock:
+        return {"status": "skipped", "changed_patients": 0, "candidate_pairs": 0}
+
+    scan_started_at = db.execute(select(func.now())).scalar()
+    state = db.query(models.DuplicateScanState).filter(models.DuplicateScanState.clinic_id == clinic_id).first()
+    since = (state.last_scanned_at - WATERMARK_OVERLAP) if state else datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+    # 1. Recompute blocking keys for the changed patients only
+    changed = db.query(
+        models.Patient.id, models.Patient.first_name, models.Patient.last_name,
+        models.Patient.date_of_birth, models.Patient.contact_number
+    ).filter(
+        models.Patient.clinic_id == clinic_id,
+        models.Patient.updated_at > since
+    ).all()
+
+    candidate_pairs = 0
+    for start in range(0, len(changed), CHUNK_SIZE):
+        chunk = changed[start:start + CHUNK_SIZE]
+        changed_ids = [row.id for row in chunk]
+        db.query(models.PatientMatchKey).filter(
+            models.PatientMatchKey.patient_id.in_(changed_ids)
+        ).delete(synchronize_session=False)
+        key_rows = [
+            {"patient_id": row.id, "key": key, "clinic_id": clinic_id}
+            for row in chunk
+            for key in blocking_keys(row.first_name, row.last_name, row.date_of_birth, row.contact_number)
+        ]
+        if key_rows:
+            db.execute(pg_insert(models.PatientMatchKey).values(key_rows).on_conflict_do_nothing())
+            candidate_pairs += _score_blocks(db, clinic_id, changed_ids, threshold)
+
+    # 2. Advance the watermark
+    stmt = pg_insert(models.DuplicateScanState).values(clinic_id=clinic_id, last_scanned_at=scan_started_at)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[models.DuplicateScanState.clinic_id],
+        set_={"last_scanned_at": scan_started_at}
+    ))
+    db.commit()
+    return {"status": "completed", "changed_patients": len(changed), "candidate_pairs": candidate_pairs}
+
+def _score_blocks(db: Session, clinic_id: str, changed_ids: list, threshold: float) -> int:
+    # Candidate pairs: changed patients joined to everyone sharing a (small) block.
+    # Only the changed patients' blocks are sized (primary key, then the
+    # (clinic_id, key) index), never every block of the clinic.
+    pair_rows = db.execute(text("""
+        WITH changed_keys AS (
+            SELECT DISTINCT key FROM patient_match_keys
+            WHERE patient_id = ANY(CAST(:changed_ids AS uuid[]))
+        ),
+        small_blocks AS (
+            SELECT pmk.key FROM patient_match_keys pmk
+            JOIN changed_keys ck ON ck.key = pmk.key
+            WHERE pmk.clinic_id = :clinic_id
+            GROUP BY pmk.key HAVING count(*) <= :max_block
+        )
+        SELECT LEAST(k1.patient_id, k2.patient_id) AS a, GREATEST(k1.patient_id, k2.patient_id) AS b,
+               array_agg(DISTINCT k1.key) AS matched_keys
+        FROM patient_match_keys k1
+        JOIN small_blocks sb ON sb.key = k1.key
+        JOIN patient_match_keys k2
+          ON k2.clinic_id = k1.clinic_id AND k2.key = k1.key AND k2.patient_id <> k1.patient_id
+        WHERE k1.clinic_id = :clinic_id AND k1.patient_id = ANY(CAST(:changed_ids AS uuid[]))
+        GROUP BY 1, 2
+    """), {"clinic_id": clinic_id, "max_block": MAX_BLOCK_SIZE, "changed_ids": [str(pid) for pid in changed_ids]}).all()
+    if not pair_rows:
+        return 0
+
+    # Load every patient involved in any pair with one query
+    involved = {str(row.a) for row in pair_rows} | {str(row.b) for row in pair_rows}
+    patients = db.query(
+        models.Patient.id, models.Patient.first_name, models.Patient.last_name,
+        models.Patient.date_of_birth, models.Patient.contact_number
+    ).filter(models.Patient.id.in_(involved)).all()
+    index = {str(p.id): i for i, p in enumerate(patients)}
+
+    names = _bigram_vectors([normalize_name(f"{p.first_name} {p.last_name}") for p in patients])
+    dobs = np.array([p.date_of_birth.toordinal() if p.date_of_birth else -1 for p in patients])
+    phones = np.array([phone_suffix(p.contact_number) or "" for p in patients], dtype=object)
+
+    keys_by_pair = {
+        (index[str(row.a)], index[str(row.b)]): sorted(row.matched_keys)
+        for row in pair_rows if str(row.a) in index and str(row.b) in index
+    }
+    if not keys_by_pair:
+        return 0
+    left, right = np.array(list(keys_by_pair)).T
+
+    # Vectorised scoring of all candidate pairs at once
+    name_similarity = np.einsum("ij,ij->i", names[left], names[right])
+    same_dob = (dobs[left] == dobs[right]) & (dobs[left] >= 0)
+    same_phone = (phones[left] == phones[right]) & (phones[left] != "")
+    scores = NAME_WEIGHT * name_similarity + DOB_WEIGHT * same_dob + PHONE_WEIGHT * same_phone
+    candidates = [
+        {
+            "patient_id_a": patients[a].id, "patient_id_b": patients[b].id,
+            "score": round(float(score), 4), "matched_keys": keys_by_pair[(a, b)],
+            "clinic_id": clinic_id, "status": "Open"
+        }
+        for a, b, score in zip(left.tolist(), right.tolist(), scores.tolist())
+        if score >= threshold
+    ]
+    if candidates:
+        stmt = pg_insert(models.PatientDuplicateCandidate).values(candidates)
+        db.execute(stmt.on_conflict_do_update(
+            constraint="uq_patient_duplicate_pair",
+            set_={"score": stmt.excluded.score, "matched_keys": stmt.excluded.matched_keys, "updated_at": func.now()}
+        ))
+    return len(candidates)
+
+
+def scan_clinic_in_background(clinic_id: str):
+    """Entry point for FastAPI BackgroundTasks; uses its own session."""
+    db = SessionLocal()
+    try:
+        run_incremental_scan(db, clinic_id=str(clinic_id))
+    except Exception as e:
+        db.rollback()
+        print(f"WARNING: duplicate patient scan failed for clinic {clinic_id}: {e}")
+    finally:
+        db.close()
+
+def get_duplicate_candidates(db: Session, clinic_id: str, status: str = "Open", skip: int = 0, limit: int = 50):
+    return (
+        db.query(models.PatientDuplicateCandidate)
+        .options(
+            joinedload(models.PatientDuplicateCandidate.patient_a),
+            joinedload(models.PatientDuplicateCandidate.patient_b)
+        )
+        .filter(
+            models.PatientDuplicateCandidate.clinic_id == clinic_id,
+            models.PatientDuplicateCandidate.status == status
+        )
+        .order_by(models.PatientDuplicateCandidate.score.desc(), models.PatientDuplicateCandidate.created_at.asc())
+        .offset(skip)
+        .limit(limit)
+        .all()
+    )
+
+
+# --- How to use this script (e.g., from a nightly cron job) ---
+if __name__ == "__main__":
+    session = SessionLocal()
+    try:
+        clinic_ids = [clinic_id for clinic_id, in session.query(models.Clinic.id).filter(models.Clinic.status == 'Active')]
+    finally:
+        session.close()
+    for active_clinic_id in clinic_ids:
+        db = SessionLocal()
+        try:
+            print(f"Clinic {active_clinic_id}: {run_incremental_scan(db, clinic_id=str(active_clinic_id))}")
+        finally:
+            db.close()
@@ -0,0 +1,155 @@
+# backend/file_storage.py
+
+import hashlib
+import os
+from abc import ABC, abstractmethod
+import tempfile
+from functools import lru_cache
+from typing import IO, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from . import models
+
+# Load environment variables from the .env file
+load_dotenv()
+
+CHUNK_SIZE = 1024 * 1024
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(50 * 1024 * 1024)))
+
+
+class FileStorage(ABC):
+    """
+    Content-addressed blob store. Blobs are named by the SHA-256 of their
+    bytes, so identical uploads are stored once. Backends implement `save`
+    and `path_for`; tenancy and metadata live in the `stored_files` table.
+    """
+
+    @abstractmethod
+    def save(self, stream: IO[bytes], max_bytes: int = MAX_UPLOAD_BYTES) -> Tuple[str, int]:
+        """Stores the stream's content and returns (sha256 hex digest, size in bytes)."""
+
+    @abstractmethod
+    def path_for(self, sha256: str) -> str:
+        """Local filesystem path of a blob, for streaming reads."""
+
+    def exists(self, sha256: str) -> bool:
+        return os.path.exists(self.path_for(sha256))
+
+
+class LocalFileStorage(FileStorage):
+    """Stores blobs under `root/ab/cd/<sha256>` on the local (or mounted) filesystem."""
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        self.tmp_dir = os.path.join(self.root, "tmp")
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+    def path_for(self, sha256: str) -> str:
+        return os.path.join(self.root, sha256[:2], sha256[2:4], sha256)
+
+    def save(self, stream: IO[bytes], max_bytes: int = MAX_UPLOAD_BYTES) -> Tuple[str, int]:
+        # Hash while copying chunk by chunk into a temp file on the same
+        # filesystem, then rename into place; nothing is held in memory.
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir)
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                while True:
+                    chunk = stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise ValueError(f"File exceeds the maximum upload size of {max_bytes // (1024 * 1024)} MB.")
+                    digest.update(chunk)
+                    tmp.write(chunk)
+                tmp.flush()
+                os.fsync(tmp.fileno())
+            sha256 = digest.hexdigest()
+            final_path = self.path_for(sha256)
+            if os.path.exists(final_path):
+                os.unlink(tmp_path)  # Same content already stored
+            else:
+                os.makedirs(os.path.dirname(final_path), exist_ok=True)
+                os.replace(tmp_path, final_path)
+            return sha256, size
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+
+STORAGE_BACKENDS = {
+    "local": lambda: LocalFileStorage(os.getenv("FILE_STORAGE_ROOT", "storage")),
+}
+
+@lru_cache(maxsize=1)
+def get_storage() -> FileStorage:
+    backend = os.getenv("FILE_STORAGE_BACKEND", "local")
+    if backend not in STORAGE_BACKENDS:
+        raise ValueError(f"Unknown FILE_STORAGE_BACKEND '{backend}'.")
+    return STORAGE_BACKENDS[backend]()
+
+
+def store_file(db: Session, stream: IO[bytes], filename: str | None, content_type: str | None, clinic_id: str, user_id: str) -> models.StoredFile:
+    """
+    Saves an upload and records it for the clinic. Uploading the same bytes
+    twice within a clinic returns the existing record.
+    """
+    sha256, size = get_storage().save(stream)
+    stmt = pg_insert(models.StoredFile).values(
+        clinic_id=clinic_id, sha256=sha256, size_bytes=size,
+        content_type=content_type or "application/octet-stream",
+        original_filename=filename, uploaded_by_user_id=user_id
+    ).on_conflict_do_nothing(
+        index_elements=["clinic_id", "sha256"], index_where=models.StoredFile.source_file_id.is_(None)
+    )
+    db.execute(stmt)
+    db.flush()
+    return get_stored_file_by_sha256(db, clinic_id=clinic_id, sha256=sha256)
+
+def get_stored_file_by_sha256(db: Session, clinic_id: str, sha256: str):
+    return db.query(models.StoredFile).filter(
+        models.StoredFile.clinic_id == clinic_id,
+        models.StoredFile.sha256 == sha256,
+        models.StoredFile.source_file_id.is_(None)
+    ).first()
+
+def get_stored_file(db: Session, file_id: str, clinic_id: str):
+    """Tenant-scoped lookup: files of other clinics are indistinguishable from missing ones."""
+    return db.query(models.StoredFile).filter(
+        models.StoredFile.id == file_id,
+        models.StoredFile.clinic_id == clinic_id
+    ).first()
+
+def record_derivative(db: Session, source: models.StoredFile, variant: str, sha256: str, size_bytes: int,
+                      content_type: str, width: int | None = None, height: int | None = None):
+    """
+    Records an already-saved blob as a derivative (e.g. thumbnail) of `source`.
+    Derivatives are keyed by (source, variant), so several variants can point
+    at the same blob and re-rendering a variant replaces its record.
+    """
+    stmt = pg_insert(models.StoredFile).values(
+        clinic_id=source.clinic_id, sha256=sha256, size_bytes=size_bytes, content_type=content_type,
+        original_filename=source.original_filename, uploaded_by_user_id=source.uploaded_by_user_id,
+        source_file_id=source.id, variant=variant, width=width, height=height
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["source_file_id", "variant"],
+        set_={column: stmt.excluded[column] for column in ("sha256", "size_bytes", "content_type", "width", "height")}
+    )
+    db.execute(stmt)
+
+def get_derivative(db: Session, file_id: str, clinic_id: str, variant: str):
+    return db.query(models.StoredFile).filter(
+        models.StoredFile.source_file_id == file_id,
+        models.StoredFile.clinic_id == clinic_id,
+        models.StoredFile.variant == variant
+    ).first()
+
+def file_url(stored_file: models.StoredFile) -> str:
+    return f"/api/files/{stored_file.id}"
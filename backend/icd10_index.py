@@ -0,0 +1,422 @@
+# backend/icd10_index.py
+
+import argparse
+import bisect
+import csv
+import hashlib
+import json
+import mmap
+import os
+import re
+import statistics
+import tempfile
+import threading
+import time
+import unicodedata
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from .database import SessionLocal
+
+# Load environment variables from the .env file
+load_dotenv()
+
+# One file per code-set fingerprint; every worker on the host maps the same pages
+INDEX_DIR = os.getenv("ICD10_INDEX_DIR", os.path.join(tempfile.gettempdir(), "icd10-index"))
+# How often a worker checks whether icd10_codes changed (one aggregate query)
+REFRESH_SECONDS = int(os.getenv("ICD10_INDEX_REFRESH_SECONDS", "300"))
+DEFAULT_LIMIT = 20
+
+MAGIC = b"ICD10IX1"
+ALIGNMENT = 64
+CODE_PATTERN = re.compile(r"^[A-Za-z][0-9][0-9A-Za-z]?(\.[0-9A-Za-z]*)?$|^[A-Za-z][0-9]{0,2}$|^[A-Za-z][0-9]{2}-")
+# Codes a diagnosis can carry: letter, two digits, optional subdivision. Chapters ('I', 'XIV')
+# and blocks ('A00-A09') only group them.
+ASSIGNABLE_PATTERN = re.compile(r"^[A-Z][0-9]{2}(\.[0-9A-Z]+)?$")
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+# Ignored in queries that have other words, since nearly every description contains them
+STOP_WORDS = {"and", "by", "due", "for", "in", "of", "on", "or", "the", "to", "with", "without"}
+# Words shorter than this are never matched fuzzily
+MIN_FUZZY_LENGTH = 4
+
+# The code-set loader bumps updated_at on every insert, change and deactivation
+_FINGERPRINT_SQL = """
+    SELECT count(*) FILTER (WHERE is_active), coalesce(max(id), 0), max(updated_at)
+    FROM icd10_codes
+"""
+
+
+def _fold(value: str) -> str:
+    """Lower-cases and strips accents so 'Ménière' matches 'meniere'."""
+    return unicodedata.normalize("NFKD", value).encode("ascii", "ignore").decode("ascii").lower()
+
+def tokenize(value: str) -> List[str]:
+    return TOKEN_PATTERN.findall(_fold(value))
+
+def code_key(code: str) -> bytes:
+    """Sort/lookup key for codes: upper case without the dot, so 'e11.9' finds 'E11.9'."""
+    return code.strip().upper().replace(".", "").encode("ascii", "ignore")
+
+def _deletes(token: str) -> List[str]:
+    return [token[:i] + token[i + 1:] for i in range(len(token))]
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "little")
+
+def _edit_distance(a: str, b: str, limit: int) -> int:
+    """Optimal string alignment distance (a transposition counts as one edit), capped at limit + 1."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2, previous = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+def _blob(values: Iterable[bytes]) -> Tuple[np.ndarray, bytes]:
+    values = list(values)
+    offsets = np.zeros(len(values) + 1, dtype=np.uint32)
+    np.cumsum([len(value) for value in values], out=offsets[1:])
+    return offsets, b"".join(values)
+
+def build_index_file(rows: Iterable[Tuple[int, str, str]], path: str, fingerprint: str) -> str:
+    """
+    Writes the index for (id, code, description) rows to `path` atomically.
+    Entries are stored in code-key order, so a code prefix is a contiguous
+    range; description words form a sorted dictionary whose postings are
+    stored in dictionary order, so a word prefix is one contiguous slice of
+    postings. Every section is a flat array at an aligned offset.
+    """
+    entries = sorted(
+        ((int(code_id), code.strip(), description.strip()) for code_id, code, description in rows),
+        key=lambda entry: code_key(entry[1])
+    )
+    postings_by_token: Dict[str, List[int]] = {}
+    first_tokens = []
+    for position, (_, _, description) in enumerate(entries):
+        tokens = tokenize(description)
+        first_tokens.append(tokens[0] if tokens else "")
+        for token in dict.fromkeys(tokens):
+            postings_by_token.setdefault(token, []).append(position)
+    dictionary = sorted(postings_by_token)
+    token_ids = {token: token_id for token_id, token in enumerate(dictionary)}
+
+    # Symmetric-delete table for typo tolerance: hash of each word and of its one-letter deletions
+    delete_pairs = sorted({
+        (_hash(variant), token_ids[token])
+        for token in dictionary if len(token) >= MIN_FUZZY_LENGTH
+        for variant in [token, *_deletes(token)]
+    })
+
+    code_offsets, code_blob = _blob(code_key(code) for _, code, _ in entries)
+    label_offsets, label_blob = _blob(code.encode() for _, code, _ in entries)
+    description_offsets, description_blob = _blob(description.encode() for _, _, description in entries)
+    token_offsets, token_blob = _blob(token.encode() for token in dictionary)
+    posting_offsets = np.zeros(len(dictionary) + 1, dtype=np.uint32)
+    np.cumsum([len(postings_by_token[token]) for token in dictionary], out=posting_offsets[1:])
+    sections = {
+        "ids": np.array([code_id for code_id, _, _ in entries], dtype=np.int32),
+        # Blocks and chapters rank after codes that can be assigned
+        "kind": np.array([0 if ASSIGNABLE_PATTERN.match(code.upper()) else 1 for _, code, _ in entries], dtype=np.uint8),
+        "first_token": np.array([token_ids.get(token, -1) for token in first_tokens], dtype=np.int32),
+        "code_offsets": code_offsets, "code_blob": np.frombuffer(code_blob, dtype=np.uint8),
+        "label_offsets": label_offsets, "label_blob": np.frombuffer(label_blob, dtype=np.uint8),
+        "description_offsets": description_offsets, "description_blob": np.frombuffer(description_blob, dtype=np.uint8),
+        "token_offsets": token_offsets, "token_blob": np.frombuffer(token_blob, dtype=np.uint8),
+        "posting_offsets": posting_offsets,
+        "postings": np.array([position for token in dictionary for position in postings_by_token[token]], dtype=np.int32),
+        "delete_hashes": np.array([pair[0] for pair in delete_pairs], dtype=np.uint64),
+        "delete_tokens": np.array([pair[1] for pair in delete_pairs], dtype=np.int32),
+    }
+
+    layout, offset = {}, 0
+    for name, array in sections.items():
+        layout[name] = [array.dtype.str, offset, len(array)]
+        offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+    header = json.dumps({"fingerprint": fingerprint, "count": len(entries), "sections": layout}).encode()
+    data_start = -(-(len(MAGIC) + 4 + len(header)) // ALIGNMENT) * ALIGNMENT
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    with os.fdopen(fd, "wb") as out:
+        out.write(MAGIC + len(header).to_bytes(4, "little") + header)
+        for name, array in sections.items():
+            out.seek(data_start + layout[name][1])
+            out.write(array.tobytes())
+        out.truncate(data_start + offset)
+    # Workers racing to build the same file all write identical bytes
+    os.replace(temp_path, path)
+    return path
+
+
+class _BlobSequence:
+    """Read-only sequence view of a (offsets, blob) pair, for bisect."""
+
+    def __init__(self, offsets: np.ndarray, blob: memoryview):
+        self.offsets = offsets
+        self.blob = blob
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> bytes:
+        return bytes(self.blob[self.offsets[i]:self.offsets[i + 1]])
+
+    def prefix_range(self, prefix: bytes) -> Tuple[int, int]:
+        return bisect.bisect_left(self, prefix), bisect.bisect_left(self, prefix + b"\xff")
+
+
+class ICD10Index:
+    """
+    Immutable, memory-mapped ICD-10 search index. All arrays are views of
+    one read-only mapping, so the OS shares a single copy between workers.
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as index_file:
+            self._mmap = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        buffer = memoryview(self._mmap)
+        if bytes(buffer[:len(MAGIC)]) != MAGIC:
+            raise ValueError(f"{path} is not an ICD-10 index file")
+        header_length = int.from_bytes(buffer[len(MAGIC):len(MAGIC) + 4], "little")
+        header = json.loads(bytes(buffer[len(MAGIC) + 4:len(MAGIC) + 4 + header_length]))
+        data_start = -(-(len(MAGIC) + 4 + header_length) // ALIGNMENT) * ALIGNMENT
+        self.path = path
+        self.fingerprint = header["fingerprint"]
+        arrays = {
+            name: np.frombuffer(self._mmap, dtype=np.dtype(dtype), count=count, offset=data_start + offset)
+            for name, (dtype, offset, count) in header["sections"].items()
+        }
+        self._ids = arrays["ids"]
+        self._kind = arrays["kind"]
+        self._first_token = arrays["first_token"]
+        self._posting_offsets = arrays["posting_offsets"]
+        self._postings = arrays["postings"]
+        self._delete_hashes = arrays["delete_hashes"]
+        self._delete_tokens = arrays["delete_tokens"]
+        self._description_lengths = np.diff(arrays["description_offsets"]).astype(np.int64)
+        self._code_lengths = np.diff(arrays["code_offsets"]).astype(np.int64)
+        self._codes = _BlobSequence(arrays["code_offsets"], buffer[data_start + header["sections"]["code_blob"][1]:])
+        self._labels = _BlobSequence(arrays["label_offsets"], buffer[data_start + header["sections"]["label_blob"][1]:])
+        self._descriptions = _BlobSequence(arrays["description_offsets"], buffer[data_start + header["sections"]["description_blob"][1]:])
+        self._tokens = _BlobSequence(arrays["token_offsets"], buffer[data_start + header["sections"]["token_blob"][1]:])
+
+    def __len__(self):
+        return len(self._ids)
+
+    def _row(self, position: int) -> dict:
+        return {
+            "id": int(self._ids[position]),
+            "code": self._labels[position].decode(),
+            "description": self._descriptions[position].decode()
+        }
+
+    def _top(self, positions: np.ndarray, sort_key: np.ndarray, limit: int) -> List[dict]:
+        if len(positions) > limit:
+            keep = np.argpartition(sort_key, limit - 1)[:limit]
+            positions, sort_key = positions[keep], sort_key[keep]
+        return [self._row(position) for position in positions[np.argsort(sort_key, kind="stable")]]
+
+    def search_codes(self, term: str, limit: int = DEFAULT_LIMIT) -> List[dict]:
+        """
+        Codes starting with `term` (dot optional), the exact code and then the
+        shortest first. A code that is not listed (e.g. a subdivision this code
+        set leaves to modifiers) falls back to its nearest listed parent.
+        """
+        key = code_key(term)
+        start, stop = self._codes.prefix_range(key)
+        while start == stop and len(key) > 3:
+            key = key[:-1]
+            start, stop = self._codes.prefix_range(key)
+        positions = np.arange(start, stop, dtype=np.int64)
+        # Entries are already in code order, so position breaks ties alphabetically
+        return self._top(positions, self._code_lengths[start:stop] << 32 | positions, limit)
+
+    def lookup(self, term: str) -> dict:
+        """
+        Exact code lookup for validation: the listed code (dot optional) with
+        a status of valid, incomplete (it has subdivisions, so a claim needs a
+        more specific code), not_assignable (a block or chapter) or unknown.
+        """
+        key = code_key(term)
+        position = bisect.bisect_left(self._codes, key)
+        if position == len(self) or self._codes[position] != key:
+            return {"status": "unknown"}
+        status = "not_assignable" if self._kind[position] else "valid"
+        following = position + 1
+        # Blocks that start with this code (e.g. 'K35-K38' after 'K35') are not subdivisions
+        while status == "valid" and following < len(self) and self._codes[following].startswith(key):
+            if not self._kind[following]:
+                status = "incomplete"
+            following += 1
+        return {
+            "status": status, "id": int(self._ids[position]), "canonical_code": self._labels[position].decode(),
+            "category": key[:3].decode() if status != "not_assignable" else None
+        }
+
+    def _token_range(self, token: str) -> Tuple[int, int]:
+        return self._tokens.prefix_range(token.encode())
+
+    def _fuzzy_tokens(self, token: str) -> List[int]:
+        """Dictionary words within one edit of `token` (two for words of eight letters or more)."""
+        if len(token) < MIN_FUZZY_LENGTH:
+            return []
+        hashes = np.array([_hash(variant) for variant in [token, *_deletes(token)]], dtype=np.uint64)
+        left = np.searchsorted(self._delete_hashes, hashes, side="left")
+        right = np.searchsorted(self._delete_hashes, hashes, side="right")
+        candidates = {int(token_id) for lo, hi in zip(left, right) for token_id in self._delete_tokens[lo:hi]}
+        limit = 1 if len(token) < 8 else 2
+        distances = {token_id: _edit_distance(token, self._tokens[token_id].decode(), limit) for token_id in candidates}
+        closest = min(distances.values(), default=limit + 1)
+        # Only the closest words: a one-letter slip should not pull in everything two edits away
+        return [token_id for token_id, distance in distances.items() if distance == closest <= limit]
+
+    def _postings_for(self, token: str) -> Tuple[np.ndarray, Tuple[int, int], bool]:
+        """Entries containing a word starting with `token`, falling back to words one typo away."""
+        start, stop = self._token_range(token)
+        if start < stop:
+            return np.unique(self._postings[self._posting_offsets[start]:self._posting_offsets[stop]]), (start, stop), False
+        fuzzy = self._fuzzy_tokens(token)
+        if not fuzzy:
+            return np.empty(0, dtype=np.int32), (0, 0), True
+        postings = np.concatenate([
+            self._postings[self._posting_offsets[token_id]:self._posting_offsets[token_id + 1]] for token_id in fuzzy
+        ])
+        return np.unique(postings), (min(fuzzy), max(fuzzy) + 1), True
+
+    def search_text(self, term: str, limit: int = DEFAULT_LIMIT) -> List[dict]:
+        """
+        Entries whose description has a word starting with every query word
+        (or, failing that, a word one typo away). Ranked: assignable codes
+        before blocks and chapters, descriptions that start with the first
+        query word, three-character categories before their subdivisions,
+        then shorter (more specific) descriptions.
+        """
+        tokens = list(dict.fromkeys(tokenize(term)))
+        if len(tokens) > 1:
+            tokens = [token for token in tokens if token not in STOP_WORDS] or tokens
+        if not tokens:
+            return []
+        matches = [self._postings_for(token) for token in tokens]
+        positions = matches[0][0]
+        for postings, _, _ in sorted(matches[1:], key=lambda match: len(match[0])):
+            if not len(positions):
+                break
+            positions = np.intersect1d(positions, postings, assume_unique=True)
+        if not len(positions):
+            return []
+        positions = positions.astype(np.int64)
+        first_start, first_stop = matches[0][1]
+        first_token = self._first_token[positions]
+        starts_with_first = (first_token >= first_start) & (first_token < first_stop)
+        sort_key = (
+            self._kind[positions].astype(np.int64) << 52
+            | (~starts_with_first).astype(np.int64) << 51
+            | (self._code_lengths[positions] > 3).astype(np.int64) << 50
+            | np.minimum(self._description_lengths[positions], 0xFFFF) << 32
+            | positions
+        )
+        return self._top(positions, sort_key, limit)
+
+    def search(self, term: str, limit: int = DEFAULT_LIMIT) -> List[dict]:
+        """Code-prefix lookup for code-like terms ('E11', 'e11.9'), description search otherwise."""
+        term = term.strip()
+        if not term:
+            return []
+        if CODE_PATTERN.match(term):
+            results = self.search_codes(term, limit)
+            if results:
+                return results
+        return self.search_text(term, limit)
+
+
+def index_path(fingerprint: str) -> str:
+    return os.path.join(INDEX_DIR, f"icd10-{hashlib.sha1(fingerprint.encode()).hexdigest()[:16]}.idx")
+
+def open_index(rows: Iterable[Tuple[int, str, str]], fingerprint: str) -> ICD10Index:
+    """Maps the index for `fingerprint`, building it first if no worker has yet."""
+    path = index_path(fingerprint)
+    if not os.path.exists(path):
+        build_index_file(rows, path, fingerprint)
+    return ICD10Index(path)
+
+
+_index: ICD10Index | None = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+def _fingerprint(db: Session) -> str:
+    return "-".join(str(value) for value in db.execute(text(_FINGERPRINT_SQL)).one())
+
+def get_index(db: Session) -> ICD10Index:
+    """
+    The process-wide index. Built (or mapped, if another worker already
+    built it) on first use and swapped for a new one when icd10_codes
+    changes, checked at most every REFRESH_SECONDS.
+    """
+    global _index, _checked_at
+    if _index is not None and time.monotonic() - _checked_at < REFRESH_SECONDS:
+        return _index
+    with _lock:
+        if _index is None or time.monotonic() - _checked_at >= REFRESH_SECONDS:
+            fingerprint = _fingerprint(db)
+            if _index is None or _index.fingerprint != fingerprint:
+                rows = db.execute(text("SELECT id, code, description FROM icd10_codes WHERE is_active")).yield_per(5000)
+                _index = open_index(rows, fingerprint)
+            _checked_at = time.monotonic()
+    return _index
+
+def warm_up():
+    """Startup hook: builds or maps the index before the first request needs it."""
+    db = SessionLocal()
+    try:
+        index = get_index(db)
+        print(f"ICD-10 index ready: {len(index)} codes ({index.path})")
+    except Exception as e:
+        print(f"WARNING: ICD-10 index not built at startup, will retry on first search: {e}")
+    finally:
+        db.close()
+
+
+# --- Benchmark: python -m backend.icd10_index --csv icd10_codes.csv ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the ICD-10 index from a code,description CSV and time queries.")
+    parser.add_argument("--csv", default="icd10_codes.csv")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    with open(args.csv, newline="", encoding="utf-8") as source:
+        csv_rows = [(row_id, row["code"], row["description"]) for row_id, row in enumerate(csv.DictReader(source), start=1)]
+    started = time.perf_counter()
+    bench_path = build_index_file(csv_rows, os.path.join(INDEX_DIR, "icd10-benchmark.idx"), fingerprint="benchmark")
+    print(f"Built {len(csv_rows)} codes in {1000 * (time.perf_counter() - started):.0f} ms, {os.path.getsize(bench_path) / 1024:.0f} KiB")
+    started = time.perf_counter()
+    bench_index = ICD10Index(bench_path)
+    print(f"Mapped in {1000 * (time.perf_counter() - started):.2f} ms")
+
+    queries = ["E11", "e11.9", "J4", "A", "diab", "diabetes mellitus", "type 2 diabetes", "diabtes",
+               "pneumonia", "pneumonai", "fracture femur", "hypertension", "asthma acute", "c", "heart failure"]
+    for query in queries:
+        timings = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            results = bench_index.search(query)
+            timings.append(time.perf_counter() - started)
+        timings.sort()
+        top = results[0] if results else None
+        print(
+            f"{query!r:22} p50 {1e6 * statistics.median(timings):7.1f} us  p99 {1e6 * timings[int(0.99 * len(timings))]:7.1f} us  "
+            f"{len(results):2} hits  {top['code'] + ' ' + top['description'][:50] if top else '-'}"
+        )
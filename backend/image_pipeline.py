@@ -0,0 +1,296 @@
+# backend/image_pipeline.py
+
+import argparse
+import io
+import mimetypes
+import multiprocessing
+import os
+import shutil
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Tuple
+
+from dotenv import load_dotenv
+from PIL import Image, ImageOps
+
+from . import models, file_storage
+from .database import SessionLocal
+
+# Load environment variables from the .env file
+load_dotenv()
+
+IMAGE_CONTENT_TYPES = {"image/jpeg", "image/png", "image/webp", "image/tiff", "image/bmp", "image/gif"}
+# Variant name -> longest side in pixels, largest first
+DERIVATIVES = (("preview", 1600), ("thumbnail", 256))
+# WEBP or JPEG for opaque images; images with transparency are always WebP
+DERIVATIVE_FORMAT = os.getenv("IMAGE_DERIVATIVE_FORMAT", "WEBP").upper()
+QUALITY = {"WEBP": 80, "JPEG": 85}
+CONTENT_TYPES = {"WEBP": "image/webp", "JPEG": "image/jpeg"}
+# A derivative that is not at least this much smaller than the source is not kept
+MIN_SAVING = 0.10
+# Size of the ingest CLI's process pool; API workers render uploads inline instead
+POOL_WORKERS = int(os.getenv("IMAGE_PIPELINE_WORKERS", "0")) or os.cpu_count() or 1
+# Files still being written to the ingest directory by another program
+IN_PROGRESS_SUFFIXES = (".part", ".partial", ".tmp", ".crdownload")
+# Refuse decompression bombs instead of just warning about them
+Image.MAX_IMAGE_PIXELS = int(os.getenv("IMAGE_MAX_PIXELS", str(20000 * 20000)))
+
+
+def _has_alpha(image: Image.Image) -> bool:
+    return image.mode in ("RGBA", "LA", "PA") or (image.mode == "P" and "transparency" in image.info)
+
+def _encode(image: Image.Image, image_format: str) -> bytes:
+    buffer = io.BytesIO()
+    options = {"quality": QUALITY[image_format]}
+    if image_format == "JPEG":
+        options.update(optimize=True, progressive=True)
+    else:
+        options["method"] = 4
+    image.save(buffer, format=image_format, **options)
+    return buffer.getvalue()
+
+def render_derivatives(source_path: str) -> dict:
+    """
+    Worker entry point (runs in the ingest process pool, or inline for an
+    upload). Decodes the source at the smallest scale that still covers the
+    largest derivative (JPEG draft mode lets libjpeg skip most of the work),
+    then downsizes step by step and saves each derivative to file storage.
+    A derivative is skipped when the source already fits and re-encoding
+    would not make it meaningfully smaller. A variant whose size equals the
+    previous one's (a small image fitting both) reuses that encoding.
+    """
+    started = time.perf_counter()
+    source_bytes = os.path.getsize(source_path)
+    derivatives, skipped = [], []
+    with Image.open(source_path) as image:  # Reads the header only
+        source_format = image.format
+        width, height = image.size
+        alpha = _has_alpha(image)
+        image_format = "WEBP" if alpha else DERIVATIVE_FORMAT
+        largest = DERIVATIVES[0][1]
+        if source_format == "JPEG":
+            image.draft("RGB", (largest, largest))
+        working = ImageOps.exif_transpose(image).convert("RGBA" if alpha else "RGB")
+
+    previous_size, previous = None, None
+    for variant, max_side in DERIVATIVES:
+        fits = max(working.size) <= max_side
+        if not fits:
+            working = working.copy()
+            working.thumbnail((max_side, max_side), Image.LANCZOS, reducing_gap=2.0)
+        if working.size == previous_size:
+            # Same pixels as the previous variant: same outcome, no second encode
+            if previous is None:
+                skipped.append({"variant": variant, "reason": "no_gain"})
+            else:
+                derivatives.append({**previous, "variant": variant})
+            continue
+        previous_size, previous = working.size, None
+        data = _encode(working, image_format)
+        if fits and len(data) > source_bytes * (1 - MIN_SAVING):
+            skipped.append({"variant": variant, "reason": "no_gain"})
+            continue
+        sha256, size = file_storage.get_storage().save(io.BytesIO(data))
+        previous = {
+            "variant": variant, "sha256": sha256, "size_bytes": size,
+            "content_type": CONTENT_TYPES[image_format], "width": working.width, "height": working.height
+        }
+        derivatives.append(previous)
+    return {
+        "source_path": source_path, "source_format": source_format, "width": width, "height": height,
+        "source_bytes": source_bytes, "derivatives": derivatives, "skipped": skipped,
+        "seconds": time.perf_counter() - started
+    }
+
+
+def create_executor(max_workers: int = POOL_WORKERS) -> ProcessPoolExecutor:
+    """
+    Process pool for the ingest CLI. Workers are spawned, not forked, so they
+    do not inherit the parent's threads, locks or database connections.
+    """
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+@dataclass
+class PipelineMetrics:
+    images: int = 0
+    failures: int = 0
+    bytes_in: int = 0
+    bytes_out: int = 0
+    derivatives: int = 0
+    skipped: int = 0
+    worker_seconds: float = 0.0
+    started: float = field(default_factory=time.perf_counter)
+
+    def add(self, rendered: dict):
+        self.images += 1
+        self.bytes_in += rendered["source_bytes"]
+        self.bytes_out += sum(d["size_bytes"] for d in rendered["derivatives"])
+        self.derivatives += len(rendered["derivatives"])
+        self.skipped += len(rendered["skipped"])
+        self.worker_seconds += rendered["seconds"]
+
+    def summary(self) -> dict:
+        elapsed = time.perf_counter() - self.started
+        return {
+            "images": self.images, "failures": self.failures, "derivatives": self.derivatives,
+            "skipped": self.skipped, "mb_in": round(self.bytes_in / 1e6, 2), "mb_out": round(self.bytes_out / 1e6, 2),
+            "elapsed_seconds": round(elapsed, 2),
+            "images_per_second": round(self.images / elapsed, 1) if elapsed else 0.0,
+            "mean_worker_ms": round(1000 * self.worker_seconds / self.images, 1) if self.images else 0.0
+        }
+
+
+def _record_derivatives(db, source: models.StoredFile, rendered: dict):
+    for derivative in rendered["derivatives"]:
+        file_storage.record_derivative(db, source=source, **derivative)
+
+def generate_derivatives(db, stored_files: Iterable[models.StoredFile], metrics: PipelineMetrics | None = None,
+                         executor: Executor | None = None) -> PipelineMetrics:
+    """
+    Renders derivatives of the given image files and records them; the caller
+    commits. With an executor the images are rendered in parallel, otherwise
+    one after another in the calling thread.
+    """
+    metrics = metrics or PipelineMetrics()
+    storage = file_storage.get_storage()
+    images = [stored for stored in stored_files if stored.content_type in IMAGE_CONTENT_TYPES]
+
+    def record(stored, render):
+        try:
+            rendered = render()
+        except Exception as e:
+            metrics.failures += 1
+            print(f"WARNING: could not render derivatives of file {stored.id}: {e}")
+            return
+        _record_derivatives(db, stored, rendered)
+        metrics.add(rendered)
+
+    if executor is None:
+        for stored in images:
+            record(stored, lambda: render_derivatives(storage.path_for(stored.sha256)))
+        return metrics
+    futures = {executor.submit(render_derivatives, storage.path_for(stored.sha256)): stored for stored in images}
+    for future in as_completed(futures):
+        record(futures[future], future.result)
+    return metrics
+
+def generate_derivatives_in_background(file_id: str, clinic_id: str):
+    """
+    Entry point for FastAPI BackgroundTasks; uses its own session. Renders
+    inline in the task's thread: API workers never start a process pool.
+    """
+    db = SessionLocal()
+    try:
+        stored = file_storage.get_stored_file(db, file_id=str(file_id), clinic_id=str(clinic_id))
+        if stored:
+            generate_derivatives(db, [stored])
+            db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"WARNING: image derivatives failed for file {file_id}: {e}")
+    finally:
+        db.close()
+
+
+def _ready_files(ingest_dir: str, last_seen: Dict[str, Tuple[int, int]]) -> List[str]:
+    """
+    Names of the files in `ingest_dir` that are completely written: their size
+    and mtime are unchanged since the previous scan, recorded in `last_seen`
+    (updated in place). Hidden files and in-progress names (`*.part`, ...)
+    are ignored, so copiers may also write under such a name and rename the
+    file into place when done.
+    """
+    current = {}
+    for name in os.listdir(ingest_dir):
+        path = os.path.join(ingest_dir, name)
+        if name.startswith(".") or name.endswith(IN_PROGRESS_SUFFIXES):
+            continue
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        if os.path.isfile(path):
+            current[name] = (stat.st_size, stat.st_mtime_ns)
+    ready = sorted(name for name, signature in current.items() if last_seen.get(name) == signature)
+    last_seen.clear()
+    last_seen.update(current)
+    return ready
+
+def ingest_directory(ingest_dir: str, clinic_id: str, user_id: str, last_seen: Dict[str, Tuple[int, int]],
+                     executor: Executor | None = None) -> PipelineMetrics:
+    """
+    Stores every completely written file in `ingest_dir` (see `_ready_files`;
+    a new file is picked up on the scan after it stops changing), renders
+    derivatives for the images and moves the sources into
+    `ingest_dir/processed` (or `failed`).
+    """
+    names = _ready_files(ingest_dir, last_seen)
+    metrics = PipelineMetrics()
+    if not names:
+        return metrics
+    for folder in ("processed", "failed"):
+        os.makedirs(os.path.join(ingest_dir, folder), exist_ok=True)
+
+    db = SessionLocal()
+    stored_files: List[models.StoredFile] = []
+    ingested: List[str] = []
+    try:
+        for name in names:
+            path = os.path.join(ingest_dir, name)
+            try:
+                with open(path, "rb") as stream:
+                    stored_files.append(file_storage.store_file(
+                        db, stream=stream, filename=name, content_type=_guess_content_type(path),
+                        clinic_id=clinic_id, user_id=user_id
+                    ))
+                ingested.append(name)
+            except ValueError as e:
+                metrics.failures += 1
+                print(f"WARNING: could not ingest {name}: {e}")
+                shutil.move(path, os.path.join(ingest_dir, "failed", name))
+        generate_derivatives(db, stored_files, metrics, executor=executor)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    # Only move sources once their records are committed, so a failed batch is retried
+    for name in ingested:
+        shutil.move(os.path.join(ingest_dir, name), os.path.join(ingest_dir, "processed", name))
+    return metrics
+
+def _guess_content_type(path: str) -> str:
+    try:
+        with Image.open(path) as image:
+            return Image.MIME.get(image.format, "application/octet-stream")
+    except (OSError, Image.DecompressionBombError):
+        return mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+
+# --- How to use this script: python -m backend.image_pipeline --ingest-dir /data/ingest --clinic-id <uuid> --user-id <uuid> ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Watch a directory and ingest radiology images and patient documents.")
+    parser.add_argument("--ingest-dir", required=True)
+    parser.add_argument("--clinic-id", required=True)
+    parser.add_argument("--user-id", required=True, help="Recorded as the uploader of ingested files")
+    parser.add_argument("--interval", type=float, default=5.0, help="Seconds between directory scans")
+    parser.add_argument("--once", action="store_true", help="Process the current contents and exit")
+    args = parser.parse_args()
+
+    last_seen: Dict[str, Tuple[int, int]] = {}
+    with create_executor() as executor:
+        if args.once:
+            # A file is only ingested once it is seen unchanged on two scans
+            _ready_files(args.ingest_dir, last_seen)
+            time.sleep(args.interval)
+        while True:
+            batch = ingest_directory(args.ingest_dir, clinic_id=args.clinic_id, user_id=args.user_id,
+                                     last_seen=last_seen, executor=executor)
+            if batch.images or batch.failures:
+                print(batch.summary())
+            if args.once:
+                break
+            time.sleep(args.interval)
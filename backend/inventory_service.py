@@ -0,0 +1,283 @@
+# backend/inventory_service.py
+
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy import Integer, column, select, text, update, values
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import SessionLocal
+from .scheduling_service import CLINIC_TIMEZONE
+
+UNLOTTED = "UNLOTTED"
+MOVEMENT_TYPES = ("Receipt", "Dispensation", "Adjustment", "Expiry")
+
+
+def ensure_lots(db: Session, clinic_id: str, lots: Iterable[Tuple[int, str, date | None]]) -> Dict[Tuple[int, str], int]:
+    """
+    Creates any missing (medication_id, lot_number) lots in one insert and
+    returns their IDs. An existing lot keeps its recorded expiry date.
+    """
+    lots = {(medication_id, lot_number): expiry_date for medication_id, lot_number, expiry_date in lots}
+    if not lots:
+        return {}
+    db.execute(pg_insert(models.MedicationLot).values([
+        {"medication_id": medication_id, "lot_number": lot_number, "expiry_date": expiry_date, "quantity_on_hand": 0, "clinic_id": clinic_id}
+        for (medication_id, lot_number), expiry_date in lots.items()
+    ]).on_conflict_do_nothing(constraint="uq_medication_lots_medication_lot"))
+    rows = db.query(models.MedicationLot.medication_id, models.MedicationLot.lot_number, models.MedicationLot.id).filter(
+        models.MedicationLot.clinic_id == clinic_id,
+        models.MedicationLot.medication_id.in_({medication_id for medication_id, _ in lots}),
+        models.MedicationLot.lot_number.in_({lot_number for _, lot_number in lots})
+    ).all()
+    return {(row.medication_id, row.lot_number): row.id for row in rows if (row.medication_id, row.lot_number) in lots}
+
+
+def _add_quantities(db: Session, model, key_column, quantity_column, clinic_id: str, deltas: Dict[int, int], guard: bool):
+    """UPDATE ... FROM (VALUES ...) adding a signed delta per row; returns the IDs updated."""
+    if not deltas:
+        return set()
+    delta_values = values(column("row_id", Integer), column("delta", Integer), name="deltas").data(list(deltas.items()))
+    stmt = update(model).where(key_column == delta_values.c.row_id, model.clinic_id == clinic_id)
+    if guard:
+        stmt = stmt.where(quantity_column + delta_values.c.delta >= 0)
+    return set(db.execute(
+        stmt.values({quantity_column: quantity_column + delta_values.c.delta})
+        .returning(key_column)
+        .execution_options(synchronize_session=False)
+    ).scalars())
+
+def post_movements(db: Session, clinic_id: str, movements: List[dict], update_totals: bool = True):
+    """
+    Appends movements to the ledger and applies them to the lots' on-hand
+    quantities (and, unless the caller has already done so, to the
+    medications' stock_quantity totals) with one statement each. Raises
+    ValueError if a lot would go negative. The caller commits.
+
+    Each movement is a dict with medication_id, lot_id, movement_type and a
+    signed quantity, plus optional note, pharmacy_sale_id and created_by_user_id.
+    """
+    movements = [movement for movement in movements if movement["quantity"]]
+    if not movements:
+        return
+    lot_deltas, medication_deltas = defaultdict(int), defaultdict(int)
+    for movement in movements:
+        if movement["movement_type"] not in MOVEMENT_TYPES:
+            raise ValueError(f"Unknown movement type '{movement['movement_type']}'.")
+        lot_deltas[movement["lot_id"]] += movement["quantity"]
+        medication_deltas[movement["medication_id"]] += movement["quantity"]
+
+    # Medications are always locked before lots, in the same order as dispensing
+    if update_totals:
+        _add_quantities(db, models.Medication, models.Medication.id, models.Medication.stock_quantity, clinic_id, medication_deltas, guard=False)
+    updated = _add_quantities(db, models.MedicationLot, models.MedicationLot.id, models.MedicationLot.quantity_on_hand, clinic_id, lot_deltas, guard=True)
+    if len(updated) != len(lot_deltas):
+        raise ValueError(f"Stock of lots {sorted(set(lot_deltas) - updated)} cannot go below zero.")
+    db.execute(pg_insert(models.InventoryMovement).values([
+        {"note": None, "pharmacy_sale_id": None, "created_by_user_id": None, **movement, "clinic_id": clinic_id}
+        for movement in movements
+    ]))
+
+
+def allocate_fefo(db: Session, clinic_id: str, quantity_by_medication: Dict[int, int], as_of: date | None = None,
+                  include_expired: bool = False) -> Tuple[List[Tuple[int, int, int]], Dict[int, int]]:
+    """
+    Picks lots first-expiry-first-out (undated stock last) for each requested
+    medication, locking them for the rest of the transaction. Returns the
+    (medication_id, lot_id, quantity) picks and, for medications that cannot
+    be covered, the quantity that was available.
+    """
+    as_of = as_of or datetime.now(CLINIC_TIMEZONE).date()
+    query = db.query(models.MedicationLot.id, models.MedicationLot.medication_id, models.MedicationLot.quantity_on_hand).filter(
+        models.MedicationLot.clinic_id == clinic_id,
+        models.MedicationLot.medication_id.in_(quantity_by_medication),
+        models.MedicationLot.quantity_on_hand > 0
+    )
+    if not include_expired:
+        query = query.filter((models.MedicationLot.expiry_date.is_(None)) | (models.MedicationLot.expiry_date >= as_of))
+    lots = query.order_by(
+        models.MedicationLot.medication_id, models.MedicationLot.expiry_date.asc().nulls_last(), models.MedicationLot.id
+    ).with_for_update().all()
+
+    remaining = dict(quantity_by_medication)
+    available = defaultdict(int)
+    picks = []
+    for lot in lots:
+        available[lot.medication_id] += lot.quantity_on_hand
+        take = min(remaining[lot.medication_id], lot.quantity_on_hand)
+        if take > 0:
+            picks.append((lot.medication_id, lot.id, take))
+            remaining[lot.medication_id] -= take
+    shortages = {medication_id: available[medication_id] for medication_id, left in remaining.items() if left > 0}
+    return picks, shortages
+
+
+def receive_stock(db: Session, clinic_id: str, user_id: str, receipts: List[dict]) -> int:
+    """Books deliveries: each receipt has medication_id, lot_number, expiry_date and quantity. The caller commits."""
+    if any(receipt["quantity"] <= 0 for receipt in receipts):
+        raise ValueError("Received quantities must be positive.")
+    medication_ids = {receipt["medication_id"] for receipt in receipts}
+    found = {medication_id for medication_id, in db.query(models.Medication.id).filter(
+        models.Medication.clinic_id == clinic_id, models.Medication.id.in_(medication_ids)
+    )}
+    if found != medication_ids:
+        raise ValueError(f"Medications {sorted(medication_ids - found)} not found in this clinic.")
+    lot_ids = ensure_lots(db, clinic_id, ((r["medication_id"], r["lot_number"], r.get("expiry_date")) for r in receipts))
+    post_movements(db, clinic_id, [
+        {
+            "medication_id": receipt["medication_id"], "lot_id": lot_ids[(receipt["medication_id"], receipt["lot_number"])],
+            "movement_type": "Receipt", "quantity": receipt["quantity"], "note": receipt.get("note"),
+            "created_by_user_id": user_id
+        }
+        for receipt in receipts
+    ])
+    return len(receipts)
+
+def adjust_lot(db: Session, clinic_id: str, user_id: str, lot_id: int, quantity: int, reason: str):
+    """Manual correction (count, breakage) of one lot by a signed quantity. The caller commits."""
+    lot = db.query(models.MedicationLot).filter(models.MedicationLot.id == lot_id, models.MedicationLot.clinic_id == clinic_id).first()
+    if not lot:
+        raise ValueError("Lot not found in this clinic.")
+    post_movements(db, clinic_id, [{
+        "medication_id": lot.medication_id, "lot_id": lot.id, "movement_type": "Adjustment",
+        "quantity": quantity, "note": reason, "created_by_user_id": user_id
+    }])
+
+def set_stock_levels(db: Session, clinic_id: str, targets: Dict[int, int], user_id: str | None, note: str):
+    """
+    Brings medications to the given total quantities (e.g. from a catalog
+    import or stock count): increases go to the UNLOTTED lot, decreases are
+    taken FEFO across all lots, expired ones included. The caller commits.
+    """
+    if not targets:
+        return
+    current = dict(
+        db.query(models.Medication.id, models.Medication.stock_quantity)
+        .filter(models.Medication.clinic_id == clinic_id, models.Medication.id.in_(targets))
+        .order_by(models.Medication.id)
+        .with_for_update()
+        .all()
+    )
+    deltas = {medication_id: targets[medication_id] - stock for medication_id, stock in current.items() if targets[medication_id] != stock}
+    increases = {medication_id: delta for medication_id, delta in deltas.items() if delta > 0}
+    decreases = {medication_id: -delta for medication_id, delta in deltas.items() if delta < 0}
+
+    movements = []
+    lot_ids = ensure_lots(db, clinic_id, ((medication_id, UNLOTTED, None) for medication_id in increases))
+    for medication_id, quantity in increases.items():
+        movements.append({"medication_id": medication_id, "lot_id": lot_ids[(medication_id, UNLOTTED)], "quantity": quantity})
+    if decreases:
+        picks, shortages = allocate_fefo(db, clinic_id, decreases, include_expired=True)
+        if shortages:
+            raise ValueError(f"Lot stock of medications {sorted(shortages)} does not match their totals.")
+        movements.extend({"medication_id": medication_id, "lot_id": lot_id, "quantity": -quantity} for medication_id, lot_id, quantity in picks)
+    post_movements(db, clinic_id, [
+        {**movement, "movement_type": "Adjustment", "note": note, "created_by_user_id": user_id} for movement in movements
+    ])
+
+def write_off_expired(db: Session, clinic_id: str, as_of: date | None = None) -> int:
+    """Moves the remaining stock of every lot that expired before `as_of` out with Expiry movements."""
+    as_of = as_of or datetime.now(CLINIC_TIMEZONE).date()
+    expired = (
+        models.MedicationLot.clinic_id == clinic_id,
+        models.MedicationLot.expiry_date < as_of,
+        models.MedicationLot.quantity_on_hand > 0
+    )
+    # Lock medications before lots, like dispensing does
+    db.query(models.Medication.id).filter(
+        models.Medication.id.in_(select(models.MedicationLot.medication_id).where(*expired))
+    ).order_by(models.Medication.id).with_for_update().all()
+    lots = db.query(models.MedicationLot).filter(*expired).with_for_update().all()
+    post_movements(db, clinic_id, [
+        {
+            "medication_id": lot.medication_id, "lot_id": lot.id, "movement_type": "Expiry",
+            "quantity": -lot.quantity_on_hand, "note": f"Expired {lot.expiry_date.isoformat()}"
+        }
+        for lot in lots
+    ])
+    return len(lots)
+
+
+def _day_end(day: date) -> datetime:
+    return datetime.combine(day + timedelta(days=1), datetime.min.time(), CLINIC_TIMEZONE)
+
+def take_snapshot(db: Session, clinic_id: str, snapshot_date: date) -> int:
+    """
+    Records every lot's quantity at the end of `snapshot_date` (on-hand now,
+    minus anything posted since that moment), so it can run at any time.
+    """
+    result = db.execute(text("""
+        INSERT INTO inventory_snapshots (lot_id, snapshot_date, medication_id, quantity, clinic_id)
+        SELECT l.id, :snapshot_date, l.medication_id,
+               l.quantity_on_hand - coalesce(later.quantity, 0), l.clinic_id
+        FROM medication_lots l
+        LEFT JOIN LATERAL (
+            SELECT sum(m.quantity) AS quantity FROM inventory_movements m
+            WHERE m.lot_id = l.id AND m.occurred_at >= :day_end
+        ) later ON true
+        WHERE l.clinic_id = :clinic_id
+        ON CONFLICT (lot_id, snapshot_date) DO UPDATE SET quantity = EXCLUDED.quantity
+    """), {"clinic_id": clinic_id, "snapshot_date": snapshot_date, "day_end": _day_end(snapshot_date)})
+    db.commit()
+    return result.rowcount
+
+
+def get_on_hand(db: Session, clinic_id: str, medication_id: int | None = None, include_empty: bool = False):
+    """Current stock per lot, in FEFO order."""
+    query = db.query(models.MedicationLot).join(models.Medication).filter(models.MedicationLot.clinic_id == clinic_id)
+    if medication_id is not None:
+        query = query.filter(models.MedicationLot.medication_id == medication_id)
+    if not include_empty:
+        query = query.filter(models.MedicationLot.quantity_on_hand > 0)
+    return query.order_by(
+        models.Medication.name, models.MedicationLot.expiry_date.asc().nulls_last(), models.MedicationLot.id
+    ).all()
+
+def get_stock_at(db: Session, clinic_id: str, as_of: date) -> List[dict]:
+    """
+    Stock per lot at the end of `as_of`: the latest snapshot on or before that
+    day plus the movements posted between the snapshot and the end of the day.
+    """
+    rows = db.execute(text("""
+        WITH base AS (
+            SELECT DISTINCT ON (s.lot_id) s.lot_id, s.snapshot_date, s.quantity
+            FROM inventory_snapshots s
+            WHERE s.clinic_id = :clinic_id AND s.snapshot_date <= :as_of
+            ORDER BY s.lot_id, s.snapshot_date DESC
+        )
+        SELECT l.id AS lot_id, l.medication_id, md.name AS medication_name, l.lot_number, l.expiry_date,
+               coalesce(b.quantity, 0) + coalesce(moved.quantity, 0) AS quantity
+        FROM medication_lots l
+        JOIN medications md ON md.id = l.medication_id
+        LEFT JOIN base b ON b.lot_id = l.id
+        LEFT JOIN LATERAL (
+            SELECT sum(m.quantity) AS quantity FROM inventory_movements m
+            WHERE m.lot_id = l.id AND m.occurred_at < :day_end
+              AND (b.snapshot_date IS NULL OR m.occurred_at >= CAST(b.snapshot_date + 1 AS timestamp) AT TIME ZONE :tz)
+        ) moved ON true
+        WHERE l.clinic_id = :clinic_id
+        ORDER BY md.name, l.expiry_date NULLS LAST, l.id
+    """), {"clinic_id": clinic_id, "as_of": as_of, "day_end": _day_end(as_of), "tz": CLINIC_TIMEZONE.key}).mappings().all()
+    return [dict(row) for row in rows if row["quantity"]]
+
+
+# --- How to use this script (e.g., from a nightly cron job shortly after midnight) ---
+if __name__ == "__main__":
+    today = datetime.now(CLINIC_TIMEZONE).date()
+    session = SessionLocal()
+    try:
+        clinic_ids = [clinic_id for clinic_id, in session.query(models.Clinic.id).filter(models.Clinic.status == 'Active')]
+    finally:
+        session.close()
+    for active_clinic_id in clinic_ids:
+        db = SessionLocal()
+        try:
+            written_off = write_off_expired(db, clinic_id=str(active_clinic_id), as_of=today)
+            db.commit()
+            snapshotted = take_snapshot(db, clinic_id=str(active_clinic_id), snapshot_date=today - timedelta(days=1))
+            print(f"Clinic {active_clinic_id}: {written_off} expired lots written off, {snapshotted} lots snapshotted")
+        finally:
+            db.close()
@@ -0,0 +1,240 @@
+# backend/lab_analytics_service.py
+
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from typing import List
+
+from sqlalchemy import func, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import SessionLocal
+from .scheduling_service import CLINIC_TIMEZONE
+
+STAGES = ("order_to_collection", "collection_to_result", "result_to_validation")
+PERCENTILES = (0.5, 0.9, 0.95)
+GROUP_COLUMNS = {"test": "e.lab_test_id", "department": "e.department", "priority": "e.priority"}
+
+# Histogram bucket lower edges; the last bucket is open-ended.
+BUCKET_EDGES_MINUTES = (0, 5, 10, 15, 30, 45, 60, 90, 120, 180, 240, 360, 480, 720, 1080, 1440, 2160, 2880, 4320, 10080)
+# Exact percentiles are computed on the fly for windows up to this size
+EXACT_MAX_DAYS = 31
+# Re-check a little before the watermark for transactions that committed late
+WATERMARK_OVERLAP = timedelta(minutes=10)
+
+# One row per lab order with the first collection, report and validation times
+_EVENTS_CTE = """
+    WITH events AS (
+        SELECT o.id, o.lab_test_id, t.name AS test_name, t.department, o.priority, o.created_at,
+               (o.created_at AT TIME ZONE :tz)::date AS day,
+               s.first_collected, r.first_reported, r.first_validated
+        FROM lab_orders o
+        JOIN lab_tests t ON t.id = o.lab_test_id
+        LEFT JOIN LATERAL (
+            SELECT min(collection_time) AS first_collected FROM lab_samples WHERE lab_order_id = o.id
+        ) s ON true
+        LEFT JOIN LATERAL (
+            SELECT min(reported_at) AS first_reported, min(validated_at) AS first_validated
+            FROM order_results WHERE lab_order_id = o.id
+        ) r ON true
+        WHERE o.clinic_id = :clinic_id AND {order_filter}
+    ),
+    stage_times AS (
+        SELECT e.*, st.stage, st.seconds
+        FROM events e
+        CROSS JOIN LATERAL (VALUES
+            ('order_to_collection', extract(epoch FROM e.first_collected - e.created_at)),
+            ('collection_to_result', extract(epoch FROM e.first_reported - e.first_collected)),
+            ('result_to_validation', extract(epoch FROM e.first_validated - e.first_reported))
+        ) AS st(stage, seconds)
+        WHERE st.seconds IS NOT NULL AND st.seconds >= 0
+    )
+"""
+
+
+def _window(start_date: date, end_date: date):
+    return (
+        datetime.combine(start_date, datetime.min.time(), CLINIC_TIMEZONE),
+        datetime.combine(end_date + timedelta(days=1), datetime.min.time(), CLINIC_TIMEZONE),
+    )
+
+def _minutes(seconds):
+    return round(seconds / 60.0, 1) if seconds is not None else None
+
+
+def get_exact_tat(db: Session, clinic_id: str, start_date: date, end_date: date, group_by: str = "test") -> List[dict]:
+    """Exact TAT percentiles (percentile_cont) for orders placed in the window."""
+    group_column = GROUP_COLUMNS[group_by]
+    range_start, range_end = _window(start_date, end_date)
+    sql = _EVENTS_CTE.format(order_filter="o.created_at >= :range_start AND o.created_at < :range_end") + f"""
+        SELECT {group_column} AS group_key, min(e.test_name) AS test_name, e.stage,
+               count(*) AS sample_count, avg(e.seconds) AS mean_seconds,
+               percentile_cont(CAST(:percentiles AS float8[])) WITHIN GROUP (ORDER BY e.seconds) AS percentile_seconds
+        FROM stage_times e
+        GROUP BY {group_column}, e.stage
+        ORDER BY 1, e.stage
+    """
+    rows = db.execute(text(sql), {
+        "clinic_id": clinic_id, "tz": CLINIC_TIMEZONE.key, "range_start": range_start,
+        "range_end": range_end, "percentiles": list(PERCENTILES)
+    }).all()
+    return [
+        {
+            "group": row.test_name if group_by == "test" else row.group_key,
+            "stage": row.stage, "count": row.sample_count,
+            "mean_minutes": _minutes(row.mean_seconds),
+            **{f"p{int(p * 100)}_minutes": _minutes(value) for p, value in zip(PERCENTILES, row.percentile_seconds)}
+        }
+        for row in rows
+    ]
+
+
+def refresh_daily_histograms(db: Session, clinic_id: str) -> dict:
+    """
+    Rebuilds the histogram rows of every day touched since the last refresh:
+    days with orders created/updated, samples collected or received, or
+    results reported or validated after the watermark. Untouched days are
+    left alone.
+    """
+    got_lock = db.execute(
+        text("SELECT pg_try_advisory_xact_lock(hashtext(:lock_key))"),
+        {"lock_key": f"lab-tat-refresh:{clinic_id}"}
+    ).scalar()
+    if not got_lock:
+        return {"status": "skipped", "days_refreshed": 0}
+
+    refresh_started_at = db.execute(select(func.now())).scalar()
+    state = db.query(models.LabTatRefreshState).filter(models.LabTatRefreshState.clinic_id == clinic_id).first()
+    since = (state.last_refreshed_at - WATERMARK_OVERLAP) if state else datetime(1970, 1, 1, tzinfo=timezone.utc)
+    params = {"clinic_id": clinic_id, "tz": CLINIC_TIMEZONE.key, "since": since}
+
+    # One index-backed range scan per timestamp, merged by UNION: an OR over
+    # several tables could only be answered by scanning the clinic's orders
+    dirty_days = db.execute(text("""
+        WITH touched AS (
+            SELECT id AS lab_order_id FROM lab_orders WHERE clinic_id = :clinic_id AND created_at > :since
+            UNION
+            SELECT id FROM lab_orders WHERE clinic_id = :clinic_id AND updated_at > :since
+            UNION
+            SELECT lab_order_id FROM lab_samples WHERE clinic_id = :clinic_id AND collection_time > :since
+            UNION
+            SELECT lab_order_id FROM lab_samples WHERE clinic_id = :clinic_id AND received_at > :since
+            UNION
+            SELECT lab_order_id FROM order_results WHERE clinic_id = :clinic_id AND reported_at > :since
+            UNION
+            SELECT lab_order_id FROM order_results WHERE clinic_id = :clinic_id AND validated_at > :since
+        )
+        SELECT DISTINCT (o.created_at AT TIME ZONE :tz)::date AS day
+        FROM touched t
+        JOIN lab_orders o ON o.id = t.lab_order_id
+        WHERE o.clinic_id = :clinic_id
+    """), params).scalars().all()
+
+    if dirty_days:
+        params["days"] = dirty_days
+        params["edges"] = [edge * 60.0 for edge in BUCKET_EDGES_MINUTES]
+        db.query(models.LabTatDailyBucket).filter(
+            models.LabTatDailyBucket.clinic_id == clinic_id,
+            models.LabTatDailyBucket.day.in_(dirty_days)
+        ).delete(synchronize_session=False)
+        # width_bucket returns 1..len(edges) because the first edge is 0
+        db.execute(text(_EVENTS_CTE.format(order_filter="(o.created_at AT TIME ZONE :tz)::date = ANY(CAST(:days AS date[]))") + """
+            INSERT INTO lab_tat_daily_buckets
+                (clinic_id, day, lab_test_id, priority, stage, bucket, sample_count, total_seconds)
+            SELECT :clinic_id, e.day, e.lab_test_id, e.priority, e.stage,
+                   width_bucket(e.seconds, CAST(:edges AS float8[])) - 1, count(*), sum(e.seconds)
+            FROM stage_times e
+            GROUP BY e.day, e.lab_test_id, e.priority, e.stage, 6
+        """), params)
+
+    stmt = pg_insert(models.LabTatRefreshState).values(clinic_id=clinic_id, last_refreshed_at=refresh_started_at)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[models.LabTatRefreshState.clinic_id],
+        set_={"last_refreshed_at": refresh_started_at}
+    ))
+    db.commit()
+    return {"status": "completed", "days_refreshed": len(dirty_days)}
+
+
+def _histogram_percentile(counts: List[int], fraction: float) -> float:
+    """Percentile in minutes, interpolating linearly inside the bucket that holds it."""
+    target = fraction * sum(counts)
+    cumulative = 0
+    for bucket, count in enumerate(counts):
+        if count and cumulative + count >= target:
+            low = BUCKET_EDGES_MINUTES[bucket]
+            if bucket + 1 == len(BUCKET_EDGES_MINUTES):
+                return float(low)  # Open-ended last bucket
+            high = BUCKET_EDGES_MINUTES[bucket + 1]
+            return round(low + (high - low) * (target - cumulative) / count, 1)
+        cumulative += count
+    return 0.0
+
+def get_histogram_tat(db: Session, clinic_id: str, start_date: date, end_date: date, group_by: str = "test") -> List[dict]:
+    """Approximate TAT percentiles from the daily histogram table; cheap over months or years."""
+    group_column = {
+        "test": models.LabTest.name,
+        "department": models.LabTest.department,
+        "priority": models.LabTatDailyBucket.priority,
+    }[group_by]
+    rows = (
+        db.query(
+            group_column.label("group_key"), models.LabTatDailyBucket.stage, models.LabTatDailyBucket.bucket,
+            func.sum(models.LabTatDailyBucket.sample_count).label("sample_count"),
+            func.sum(models.LabTatDailyBucket.total_seconds).label("total_seconds")
+        )
+        .join(models.LabTest, models.LabTatDailyBucket.lab_test_id == models.LabTest.id)
+        .filter(
+            models.LabTatDailyBucket.clinic_id == clinic_id,
+            models.LabTatDailyBucket.day >= start_date,
+            models.LabTatDailyBucket.day <= end_date
+        )
+        .group_by(group_column, models.LabTatDailyBucket.stage, models.LabTatDailyBucket.bucket)
+        .all()
+    )
+    histograms = defaultdict(lambda: {"counts": [0] * len(BUCKET_EDGES_MINUTES), "total_seconds": 0.0})
+    for row in rows:
+        histogram = histograms[(row.group_key, row.stage)]
+        histogram["counts"][row.bucket] += int(row.sample_count)
+        histogram["total_seconds"] += float(row.total_seconds)
+
+    results = []
+    for (group_key, stage), histogram in sorted(histograms.items(), key=lambda item: (str(item[0][0]), STAGES.index(item[0][1]))):
+        count = sum(histogram["counts"])
+        results.append({
+            "group": group_key, "stage": stage, "count": count,
+            "mean_minutes": _minutes(histogram["total_seconds"] / count),
+            **{f"p{int(p * 100)}_minutes": _histogram_percentile(histogram["counts"], p) for p in PERCENTILES}
+        })
+    return results
+
+def get_turnaround_times(db: Session, clinic_id: str, start_date: date, end_date: date, group_by: str = "test", source: str = "auto") -> dict:
+    if group_by not in GROUP_COLUMNS:
+        raise ValueError("group_by must be one of: test, department, priority.")
+    if end_date < start_date:
+        raise ValueError("end_date must not be before start_date.")
+    if source == "auto":
+        source = "exact" if (end_date - start_date).days < EXACT_MAX_DAYS else "histogram"
+    if source == "exact":
+        rows = get_exact_tat(db, clinic_id, start_date, end_date, group_by)
+    elif source == "histogram":
+        rows = get_histogram_tat(db, clinic_id, start_date, end_date, group_by)
+    else:
+        raise ValueError("source must be one of: auto, exact, histogram.")
+    return {"source": source, "group_by": group_by, "start_date": start_date, "end_date": end_date, "rows": rows}
+
+
+# --- How to use this script (e.g., from a nightly cron job) ---
+if __name__ == "__main__":
+    session = SessionLocal()
+    try:
+        clinic_ids = [clinic_id for clinic_id, in session.query(models.Clinic.id).filter(models.Clinic.status == 'Active')]
+    finally:
+        session.close()
+    for active_clinic_id in clinic_ids:
+        db = SessionLocal()
+        try:
+            print(f"Clinic {active_clinic_id}: {refresh_daily_histograms(db, clinic_id=str(active_clinic_id))}")
+        finally:
+            db.close()
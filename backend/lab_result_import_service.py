@@ -0,0 +1,255 @@
+# backend/lab_result_import_service.py
+
+import argparse
+import csv
+import io
+import time
+import uuid
+from collections import OrderedDict
+from typing import IO, Iterator, List
+
+from sqlalchemy import or_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from . import crud, models, reference_ranges
+from .database import SessionLocal
+
+# Number of distinct specimens matched per lookup query
+BATCH_SIZE = 1000
+# Cap on the per-item lists in the reconciliation report
+MAX_REPORTED_ITEMS = 500
+
+SPECIMEN_COLUMNS = ("specimen_id", "sample_barcode", "barcode", "specimen")
+ANALYTE_COLUMNS = ("analyte", "test_code", "parameter")
+
+
+def _parse_value(raw: str):
+    """
+    Numeric results become floats; qualitative ones ('Positive', '<0.1') and
+    anything else, including instrument errors such as 'NaN' or 'inf', stay
+    text. Uses the flagger's notion of a number, so import, flagging and the
+    trend/search SQL agree on which values are numeric.
+    """
+    number = reference_ranges.analyte_number(raw)
+    return raw if number is None else number
+
+def _first(record: dict, names) -> str | None:
+    for name in names:
+        if record.get(name):
+            return record[name]
+    return None
+
+def iter_csv_records(stream: IO[bytes]) -> Iterator[dict]:
+    """
+    One row per analyte: specimen_id (or sample_barcode), analyte, value and
+    optional unit, flag and test (the ordered test's name, to tell apart
+    several orders drawn into the same specimen).
+    """
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding="utf-8-sig", newline=""))
+    for line, row in enumerate(reader, start=2):
+        record = {key.strip().lower(): (value.strip() or None) for key, value in row.items() if key and isinstance(value, str)}
+        specimen, analyte, value = _first(record, SPECIMEN_COLUMNS), _first(record, ANALYTE_COLUMNS), record.get("value")
+        if not specimen or not analyte or value is None:
+            yield {"line": line, "error": "specimen_id, analyte and value are required."}
+            continue
+        yield {
+            "line": line, "specimen": specimen, "test": record.get("test"), "analyte": analyte,
+            "value": _parse_value(value), "unit": record.get("unit"), "flag": record.get("flag")
+        }
+
+def iter_astm_records(stream: IO[bytes]) -> Iterator[dict]:
+    """
+    Simplified ASTM E1394 layout: '|' separated fields, '^' components.
+    O records carry the specimen ID (field 3) and test (field 5); each R
+    record that follows carries ^^^analyte (field 3), value, unit and flag
+    (fields 4, 5 and 7). H, P, C and L records are skipped.
+    """
+    specimen, test = None, None
+    for line, text_line in enumerate(io.TextIOWrapper(stream, encoding="utf-8-sig", errors="replace"), start=1):
+        fields = text_line.strip().split("|")
+        record_type = fields[0][-1:].upper() if fields[0] else ""  # tolerate frame numbers, e.g. '1R'
+        if record_type == "O":
+            specimen = fields[2].split("^")[0].strip() if len(fields) > 2 else None
+            test = (fields[4].split("^")[-1].strip() or None) if len(fields) > 4 else None
+        elif record_type == "R":
+            if not specimen:
+                yield {"line": line, "error": "Result record without a preceding order record."}
+                continue
+            analyte = fields[2].split("^")[-1].strip() if len(fields) > 2 else ""
+            value = fields[3].strip() if len(fields) > 3 else ""
+            if not analyte or not value:
+                yield {"line": line, "error": "Result record without an analyte or value."}
+                continue
+            yield {
+                "line": line, "specimen": specimen, "test": test, "analyte": analyte,
+                "value": _parse_value(value),
+                "unit": (fields[4].strip() or None) if len(fields) > 4 else None,
+                "flag": (fields[6].strip() or None) if len(fields) > 6 else None
+            }
+        elif record_type == "L":
+            specimen, test = None, None
+
+
+def import_results(db: Session, stream: IO[bytes], file_format: str, clinic_id: str, user_id: str, batch_size: int = BATCH_SIZE) -> dict:
+    """
+    Streams an analyzer export and records one OrderResult per matched lab
+    order in a single transaction. Specimens are matched to orders on
+    LabOrder.specimen_id or LabSample.sample_barcode with one query per
+    batch; matched orders move to 'ResultEntered' with one guarded UPDATE.
+    Returns a reconciliation report of everything that was not recorded.
+    """
+    if file_format == "csv":
+        records = iter_csv_records(stream)
+    elif file_format == "astm":
+        records = iter_astm_records(stream)
+    else:
+        raise ValueError("Unsupported result format. Use 'csv' or 'astm'.")
+
+    started = time.perf_counter()
+    report = {
+        "total_records": 0, "specimens": 0, "results_created": 0,
+        "unmatched": [], "ambiguous": [], "not_ready": [], "invalid": []
+    }
+
+    references = reference_ranges.get_clinic_references(db, clinic_id)
+
+    def note(kind: str, item: dict):
+        if len(report[kind]) < MAX_REPORTED_ITEMS:
+            report[kind].append(item)
+
+    def flush(batch: "OrderedDict[str, List[dict]]"):
+        # 1. One lookup for every specimen in the batch
+        codes = list(batch)
+        candidates = (
+            db.query(
+                models.LabOrder.id, models.LabOrder.patient_id, models.LabOrder.status, models.LabOrder.lab_test_id,
+                models.LabOrder.specimen_id, models.LabSample.sample_barcode, models.LabTest.name
+            )
+            .join(models.LabTest, models.LabOrder.lab_test_id == models.LabTest.id)
+            .outerjoin(models.LabSample, models.LabSample.lab_order_id == models.LabOrder.id)
+            .filter(
+                models.LabOrder.clinic_id == clinic_id,
+                or_(models.LabOrder.specimen_id.in_(codes), models.LabSample.sample_barcode.in_(codes))
+            )
+            .all()
+        )
+        orders_by_code = {}
+        for row in candidates:
+            for code in {row.specimen_id, row.sample_barcode} & batch.keys():
+                orders_by_code.setdefault(code, {})[row.id] = row
+
+        # 2. Resolve each specimen (and optional test name) to exactly one order
+        results = {}
+        for code, rows in batch.items():
+            orders = list(orders_by_code.get(code, {}).values())
+            by_test = OrderedDict()
+            for row in rows:
+                by_test.setdefault(row["test"], []).append(row)
+            for test, test_rows in by_test.items():
+                matching = [o for o in orders if test is None or o.name.lower() == test.lower()] if len(orders) > 1 else orders
+                lines = [row["line"] for row in test_rows]
+                if not matching:
+                    note("unmatched", {"specimen_id": code, "test": test, "lines": lines})
+                elif len(matching) > 1:
+                    note("ambiguous", {"specimen_id": code, "test": test, "lines": lines, "order_ids": [str(o.id) for o in matching]})
+                elif matching[0].status not in crud.LAB_STATUS_TRANSITIONS['ResultEntered']:
+                    note("not_ready", {"specimen_id": code, "test": test, "lines": lines, "status": matching[0].status})
+                else:
+                    order = matching[0]
+                    entry = results.setdefault(order.id, {
+                        "patient_id": order.patient_id, "lab_test_id": order.lab_test_id, "test_name": order.name,
+                        "code": code, "test": test, "data": {}, "units": {}, "flags": {}, "lines": []
+                    })
+                    for row in test_rows:
+                        entry["data"][row["analyte"]] = row["value"]
+                        if row["unit"]:
+                            entry["units"][row["analyte"]] = row["unit"]
+                        if row["flag"]:
+                            entry["flags"][row["analyte"]] = row["flag"]
+                        entry["lines"].append(row["line"])
+        if not results:
+            return
+
+        # 3. Flip statuses set-wise first; only orders that actually moved get a result
+        moved = set(db.execute(
+            update(models.LabOrder)
+            .where(
+                models.LabOrder.id.in_(list(results)),
+                models.LabOrder.status.in_(crud.LAB_STATUS_TRANSITIONS['ResultEntered'])
+            )
+            .values(status='ResultEntered')
+            .returning(models.LabOrder.id)
+            .execution_options(synchronize_session=False)
+        ).scalars().all())
+        for order_id, entry in results.items():
+            if order_id not in moved:
+                note("not_ready", {"specimen_id": entry["code"], "test": entry["test"], "lines": entry["lines"], "status": "changed during import"})
+
+        # 4. Flag the whole batch against reference ranges, then one multi-row insert
+        result_rows, flag_items = [], []
+        for order_id in moved:
+            entry = results[order_id]
+            result_data = dict(entry["data"])
+            if entry["units"]:
+                result_data["units"] = entry["units"]
+            if entry["flags"]:
+                result_data["analyzer_flags"] = entry["flags"]
+            flag_items.append((entry["lab_test_id"], entry["test_name"], result_data))
+            result_rows.append({
+                "id": uuid.uuid4(), "patient_id": entry["patient_id"], "lab_order_id": order_id,
+                "result_data": result_data, "report_notes": f"Imported from analyzer file (specimen {entry['code']}).",
+                "reported_by_user_id": user_id, "clinic_id": clinic_id
+            })
+        if result_rows:
+            reference_ranges.annotate_results(references, flag_items)
+            db.execute(pg_insert(models.OrderResult).values(result_rows))
+        report["results_created"] += len(result_rows)
+
+    batch: "OrderedDict[str, List[dict]]" = OrderedDict()
+    for record in records:
+        report["total_records"] += 1
+        if "error" in record:
+            note("invalid", {"line": record["line"], "error": record["error"]})
+            continue
+        code = record["specimen"]
+        # Flush on a specimen boundary so one specimen's rows stay together
+        if code not in batch and len(batch) >= batch_size:
+            report["specimens"] += len(batch)
+            flush(batch)
+            batch = OrderedDict()
+        batch.setdefault(code, []).append(record)
+    if batch:
+        report["specimens"] += len(batch)
+        flush(batch)
+
+    db.commit()
+
+    elapsed = time.perf_counter() - started
+    report["elapsed_seconds"] = round(elapsed, 3)
+    report["records_per_second"] = round(report["total_records"] / elapsed, 1) if elapsed > 0 else 0.0
+    return report
+
+
+# --- How to use this script (e.g., from the analyzer's export folder) ---
+# python -m backend.lab_result_import_service run42.csv --clinic-id <uuid> --user-id <uuid>
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import an analyzer result export (CSV or ASTM).")
+    parser.add_argument("path")
+    parser.add_argument("--clinic-id", required=True)
+    parser.add_argument("--user-id", required=True, help="User recorded as the reporter of the results.")
+    parser.add_argument("--format", choices=("csv", "astm"), help="Defaults to the file extension (.csv, otherwise ASTM).")
+    args = parser.parse_args()
+
+    file_format = args.format or ("csv" if args.path.lower().endswith(".csv") else "astm")
+    db = SessionLocal()
+    try:
+        with open(args.path, "rb") as export:
+            result = import_results(db, stream=export, file_format=file_format, clinic_id=args.clinic_id, user_id=args.user_id)
+    finally:
+        db.close()
+    print(
+        f"{result['total_records']} records, {result['specimens']} specimens -> {result['results_created']} results "
+        f"({result['records_per_second']} records/s); unmatched={len(result['unmatched'])}, "
+        f"ambiguous={len(result['ambiguous'])}, not_ready={len(result['not_ready'])}, invalid={len(result['invalid'])}"
+    )
@@ -0,0 +1,172 @@
+# backend/lab_result_search_service.py
+
+import argparse
+import base64
+import csv
+import io
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Iterator
+
+from sqlalchemy import func, tuple_
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import SessionLocal
+from .lab_trend_service import analyte_unit, analyte_value
+
+COMPARISONS = {
+    "lt": lambda value, bound: value < bound,
+    "le": lambda value, bound: value <= bound,
+    "gt": lambda value, bound: value > bound,
+    "ge": lambda value, bound: value >= bound,
+    "eq": lambda value, bound: value == bound,
+}
+EXPORT_FETCH_SIZE = 2000
+CSV_COLUMNS = (
+    "result_id", "reported_at", "patient_id", "mrn", "first_name", "last_name",
+    "lab_test", "doctor_id", "analyte", "value", "unit", "flag"
+)
+
+
+def encode_cursor(reported_at: datetime, result_id) -> str:
+    return base64.urlsafe_b64encode(f"{reported_at.isoformat()}|{result_id}".encode()).decode()
+
+def decode_cursor(cursor: str):
+    try:
+        reported_at, result_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(reported_at), uuid.UUID(result_id)
+    except ValueError:
+        raise ValueError("Invalid cursor.")
+
+
+def validate_comparison(op: str | None, value: float | None, value_max: float | None):
+    if op is None:
+        return
+    if op != "between" and op not in COMPARISONS:
+        raise ValueError("op must be one of: lt, le, gt, ge, eq, between.")
+    if value is None:
+        raise ValueError("A value is required when filtering by a comparison.")
+    if op == "between" and value_max is None:
+        raise ValueError("value_max is required for 'between'.")
+
+
+def _search_query(db: Session, clinic_id: str, analyte: str, op: str | None = None, value: float | None = None,
+                  value_max: float | None = None, lab_test_id: int | None = None, doctor_id: str | None = None,
+                  start: datetime | None = None, end: datetime | None = None, days: int | None = None):
+    """
+    Results in the clinic that carry `analyte`, optionally compared against a
+    value ('between' uses value..value_max). The key test (result_data ? key)
+    is served by the GIN index and the window by (clinic_id, reported_at).
+    """
+    numeric_value = analyte_value(analyte)
+    query = (
+        db.query(
+            models.OrderResult.id, models.OrderResult.reported_at, models.OrderResult.patient_id,
+            models.Patient.mrn, models.Patient.first_name, models.Patient.last_name,
+            models.LabTest.name.label("lab_test"), models.LabOrder.doctor_id,
+            numeric_value.label("value"), analyte_unit(analyte).label("unit"),
+            models.OrderResult.result_data["flags"][analyte].astext.label("flag")
+        )
+        .join(models.Patient, models.OrderResult.patient_id == models.Patient.id)
+        .outerjoin(models.LabOrder, models.OrderResult.lab_order_id == models.LabOrder.id)
+        .outerjoin(models.LabTest, models.LabOrder.lab_test_id == models.LabTest.id)
+        .filter(
+            models.OrderResult.clinic_id == clinic_id,
+            models.OrderResult.result_data.has_key(analyte)
+        )
+    )
+    validate_comparison(op, value, value_max)
+    if op == "between":
+        query = query.filter(numeric_value.between(value, value_max))
+    elif op is not None:
+        query = query.filter(COMPARISONS[op](numeric_value, value))
+    if lab_test_id is not None:
+        query = query.filter(models.LabOrder.lab_test_id == lab_test_id)
+    if doctor_id is not None:
+        query = query.filter(models.LabOrder.doctor_id == doctor_id)
+    if days is not None:
+        query = query.filter(models.OrderResult.reported_at >= func.now() - timedelta(days=days))
+    if start is not None:
+        query = query.filter(models.OrderResult.reported_at >= start)
+    if end is not None:
+        query = query.filter(models.OrderResult.reported_at < end)
+    return query.order_by(models.OrderResult.reported_at.desc(), models.OrderResult.id.desc())
+
+def _row_dict(row, analyte: str) -> dict:
+    return {
+        "result_id": row.id, "reported_at": row.reported_at, "patient_id": row.patient_id,
+        "mrn": row.mrn, "first_name": row.first_name, "last_name": row.last_name,
+        "lab_test": row.lab_test, "doctor_id": row.doctor_id, "analyte": analyte,
+        "value": row.value, "unit": row.unit, "flag": row.flag
+    }
+
+def search_results(db: Session, clinic_id: str, analyte: str, cursor: str | None = None, limit: int = 100, **filters) -> dict:
+    """One page of matching results, newest first, with an opaque keyset cursor for the next page."""
+    query = _search_query(db, clinic_id, analyte, **filters)
+    if cursor:
+        reported_at, result_id = decode_cursor(cursor)
+        query = query.filter(
+            tuple_(models.OrderResult.reported_at, models.OrderResult.id) < tuple_(reported_at, result_id)
+        )
+    rows = query.limit(limit + 1).all()
+    next_cursor = encode_cursor(rows[limit - 1].reported_at, rows[limit - 1].id) if len(rows) > limit else None
+    return {"items": [_row_dict(row, analyte) for row in rows[:limit]], "next_cursor": next_cursor}
+
+def export_results_csv(clinic_id: str, analyte: str, **filters) -> Iterator[str]:
+    """
+    Yields the full result set as CSV text chunks. Uses its own session and a
+    server-side cursor, so memory stays flat however many rows match.
+    """
+    db = SessionLocal()
+    try:
+        query = _search_query(db, clinic_id, analyte, **filters).execution_options(stream_results=True, yield_per=EXPORT_FETCH_SIZE)
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(CSV_COLUMNS)
+        for count, row in enumerate(query, start=1):
+            record = _row_dict(row, analyte)
+            writer.writerow([record[column] for column in CSV_COLUMNS])
+            if count % EXPORT_FETCH_SIZE == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+    finally:
+        db.close()
+
+
+# --- Benchmark: python -m backend.lab_result_search_service --clinic-id <uuid> --analyte Hb --op lt --value 7 ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time result search and export against the configured database.")
+    parser.add_argument("--clinic-id", required=True)
+    parser.add_argument("--analyte", required=True)
+    parser.add_argument("--op", choices=(*COMPARISONS, "between"))
+    parser.add_argument("--value", type=float)
+    parser.add_argument("--value-max", type=float)
+    parser.add_argument("--days", type=int)
+    parser.add_argument("--pages", type=int, default=10)
+    args = parser.parse_args()
+    filters = {"op": args.op, "value": args.value, "value_max": args.value_max, "days": args.days}
+
+    session = SessionLocal()
+    try:
+        total = session.query(func.count(models.OrderResult.id)).filter(models.OrderResult.clinic_id == args.clinic_id).scalar()
+        print(f"{total:,} results in clinic")
+        next_cursor, timings = None, []
+        for _ in range(args.pages):
+            started = time.perf_counter()
+            page = search_results(session, args.clinic_id, args.analyte, cursor=next_cursor, limit=100, **filters)
+            timings.append((time.perf_counter() - started) * 1000)
+            next_cursor = page["next_cursor"]
+            if not next_cursor:
+                break
+        print(f"{len(timings)} pages: first {timings[0]:.1f} ms, median {sorted(timings)[len(timings) // 2]:.1f} ms")
+    finally:
+        session.close()
+
+    started = time.perf_counter()
+    exported = sum(chunk.count("\n") for chunk in export_results_csv(args.clinic_id, args.analyte, **filters)) - 1
+    elapsed = time.perf_counter() - started
+    print(f"exported {exported:,} rows in {elapsed:.2f} s ({exported / elapsed if elapsed else 0:,.0f} rows/s)")
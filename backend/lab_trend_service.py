@@ -0,0 +1,112 @@
+# backend/lab_trend_service.py
+
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import Float, case, func
+from sqlalchemy.orm import Session
+
+from . import models, reference_ranges
+
+DEFAULT_MAX_POINTS = 500
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets downsampling. Returns the indices of the
+    points to keep (always including the first and last). Each bucket's
+    triangle areas are computed as one NumPy expression.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_start, next_end = end, edges[bucket + 2] if bucket + 2 < len(edges) else n
+        next_x, next_y = x[next_start:next_end].mean(), y[next_start:next_end].mean()
+        areas = np.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+    return selected
+
+def _bands(intervals):
+    return [
+        {"low": None if np.isinf(low) else low, "high": None if np.isinf(high) else high}
+        for low, high, _, _ in intervals
+    ]
+
+
+def analyte_value(analyte: str):
+    """SQL expression for result_data[analyte] as a float, or NULL when it is not numeric."""
+    value_json = models.OrderResult.result_data[analyte]
+    return case(
+        (func.jsonb_typeof(value_json) == 'number', value_json.astext.cast(Float)),
+        (value_json.astext.op("~")(reference_ranges.NUMERIC_TEXT), value_json.astext.cast(Float)),
+        else_=None
+    )
+
+def analyte_unit(analyte: str):
+    return func.coalesce(
+        models.OrderResult.result_data["units"][analyte].astext,
+        models.OrderResult.result_data["unit"].astext
+    )
+
+
+def get_analyte_trend(db: Session, patient_id: str, clinic_id: str, analyte: str, start: datetime | None = None,
+                      end: datetime | None = None, max_points: int = DEFAULT_MAX_POINTS) -> dict:
+    """
+    Numeric time series of one analyte (a result_data key, e.g. "HbA1c") for a
+    patient, extracted in a single query and downsampled with LTTB, plus the
+    reference bands of the test that produced the latest value.
+    """
+    query = (
+        db.query(
+            models.OrderResult.reported_at,
+            analyte_value(analyte).label("value"),
+            analyte_unit(analyte).label("unit"),
+            models.LabOrder.lab_test_id
+        )
+        .outerjoin(models.LabOrder, models.OrderResult.lab_order_id == models.LabOrder.id)
+        .filter(
+            models.OrderResult.clinic_id == clinic_id,
+            models.OrderResult.patient_id == patient_id,
+            models.OrderResult.result_data.has_key(analyte)
+        )
+    )
+    if start is not None:
+        query = query.filter(models.OrderResult.reported_at >= start)
+    if end is not None:
+        query = query.filter(models.OrderResult.reported_at < end)
+    rows = [row for row in query.order_by(models.OrderResult.reported_at.asc()).all() if row.value is not None]
+
+    trend = {"analyte": analyte, "unit": None, "total_points": len(rows), "points": [], "reference": None}
+    if not rows:
+        return trend
+
+    times = np.fromiter((row.reported_at.timestamp() for row in rows), dtype=np.float64, count=len(rows))
+    values = np.fromiter((row.value for row in rows), dtype=np.float64, count=len(rows))
+    keep = lttb(times, values, max_points)
+
+    latest = rows[-1]
+    reference = reference_ranges.get_clinic_references(db, clinic_id).get(latest.lab_test_id)
+    flags = reference.evaluate(values[keep]).tolist() if reference else [reference_ranges.UNFLAGGED] * len(keep)
+
+    trend["unit"] = latest.unit
+    trend["points"] = [
+        {"reported_at": rows[i].reported_at, "value": float(values[i]), "flag": reference_ranges.FLAG_NAMES[flag]}
+        for i, flag in zip(keep.tolist(), flags)
+    ]
+    if reference:
+        trend["reference"] = {
+            "normal": _bands(reference.normal),
+            "critical": _bands(reference.critical),
+            "critical_is_safe_band": reference.critical_is_safe_band
+        }
+    return trend
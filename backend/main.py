@@ -4,11 +4,11 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from .database import engine
-from . import models
+from . import models, icd10_index
 from .routers import (
     auth, patients, admin, billing, appointments, laboratory, 
     radiology, doctor, reception, nursing, accounting, 
-    clinical_records, users, claims, medical_coding, directory, pharmacy, dashboards, staff
+    clinical_records, users, claims, medical_coding, directory, pharmacy, dashboards, staff, files
 )
 
 app = FastAPI(
@@ -27,6 +27,11 @@ def on_startup():
     models.Base.metadata.create_all(bind=engine)
 # --- END OF TEMPORARY CODE BLOCK ---
 
+@app.on_event("startup")
+def load_icd10_index():
+    """Builds (or maps, when another worker already built it) the ICD-10 search index."""
+    icd10_index.warm_up()
+
 
 origins = [
     "http://localhost:5173",
@@ -62,6 +67,7 @@ app.include_router(medical_coding.router)
 app.include_router(directory.router)
 app.include_router(dashboards.router)
 app.include_router(staff.router)
+app.include_router(files.router)
 
 
 @app.get("/api/health", tags=["Health Check"])
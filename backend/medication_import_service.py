@@ -0,0 +1,125 @@
+# backend/medication_import_service.py
+
+import csv
+import io
+import time
+from typing import IO, Iterator, List, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from . import schemas, inventory_service
+from .bulk_copy import copy_rows
+
+BATCH_SIZE = 5000
+
+STAGING_TABLE = "medication_import_staging"
+STAGING_COLUMNS = ("row_number", "name", "manufacturer", "stock_quantity", "unit_price", "category")
+
+
+def _iter_csv_rows(stream: IO[bytes]) -> Iterator[Tuple[int, dict]]:
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding="utf-8-sig", newline=""))
+    for row_number, row in enumerate(reader, start=1):
+        # Blank cells mean "not provided"; extra cells (key None) are ignored.
+        yield row_number, {key.strip(): (value.strip() or None) for key, value in row.items() if key and isinstance(value, str)}
+
+
+def _format_validation_error(exc: ValidationError) -> List[str]:
+    return [f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in exc.errors()]
+
+
+def import_medications(db: Session, stream: IO[bytes], clinic_id: str, user_id: str, batch_size: int = BATCH_SIZE) -> dict:
+    """
+    Streams a medication catalog CSV (name, manufacturer, stock_quantity,
+    unit_price[, category]) into the clinic's formulary in one transaction.
+
+    Rows are validated one by one; valid rows are COPYed into a staging table
+    per batch and merged on (name, manufacturer): existing medications get the
+    file's price and category, and their stock is brought to the file's
+    quantity with inventory adjustments; new ones are inserted with an opening
+    receipt. Re-uploading the same file therefore changes nothing. Every
+    rejected row is reported.
+    """
+    started = time.perf_counter()
+    report = {"total_rows": 0, "inserted": 0, "updated": 0, "duplicates": 0, "invalid": 0, "errors": []}
+    seen_keys = set()
+
+    # Imports into one clinic's formulary are serialised so the merge cannot race itself
+    db.execute(text("SELECT pg_advisory_xact_lock(hashtext(:lock_key))"), {"lock_key": f"medication-import:{clinic_id}"})
+    db.execute(text(
+        f"CREATE TEMP TABLE IF NOT EXISTS {STAGING_TABLE} ("
+        "row_number integer, name text, manufacturer text, stock_quantity integer, "
+        "unit_price numeric(10, 3), category text"
+        ") ON COMMIT DROP"
+    ))
+
+    def reject(row_number: int, name: str | None, errors: List[str], duplicate: bool = False):
+        report["duplicates" if duplicate else "invalid"] += 1
+        report["errors"].append({"row": row_number, "name": name, "errors": errors})
+
+    def flush(batch: List[Tuple[int, schemas.MedicationImportRow]]):
+        db.execute(text(f"TRUNCATE {STAGING_TABLE}"))
+        copy_rows(db, STAGING_TABLE, STAGING_COLUMNS, (
+            (row_number, row.name, row.manufacturer, row.stock_quantity, row.unit_price, row.category)
+            for row_number, row in batch
+        ))
+        # Existing medications: price and category here, stock through the inventory ledger
+        updated = db.execute(text(
+            "UPDATE medications m "
+            "SET unit_price = s.unit_price, category = coalesce(s.category, m.category) "
+            f"FROM {STAGING_TABLE} s "
+            "WHERE m.clinic_id = :clinic_id AND m.name = s.name "
+            "AND m.manufacturer IS NOT DISTINCT FROM s.manufacturer "
+            "RETURNING m.id, s.stock_quantity"
+        ), {"clinic_id": clinic_id}).all()
+        report["updated"] += len(updated)
+        inventory_service.set_stock_levels(db, clinic_id, dict(updated), user_id=user_id, note="Catalog import")
+
+        inserted = db.execute(text(
+            "INSERT INTO medications (name, manufacturer, stock_quantity, unit_price, category, clinic_id) "
+            "SELECT s.name, s.manufacturer, s.stock_quantity, s.unit_price, coalesce(s.category, 'Pharmacy'), :clinic_id "
+            f"FROM {STAGING_TABLE} s "
+            "WHERE NOT EXISTS ("
+            "    SELECT 1 FROM medications m WHERE m.clinic_id = :clinic_id AND m.name = s.name "
+            "    AND m.manufacturer IS NOT DISTINCT FROM s.manufacturer"
+            ") ORDER BY s.row_number "
+            "RETURNING id, stock_quantity"
+        ), {"clinic_id": clinic_id}).all()
+        report["inserted"] += len(inserted)
+        opening = [(medication_id, quantity) for medication_id, quantity in inserted if quantity]
+        lot_ids = inventory_service.ensure_lots(db, clinic_id, ((medication_id, inventory_service.UNLOTTED, None) for medication_id, _ in opening))
+        inventory_service.post_movements(db, clinic_id, [
+            {
+                "medication_id": medication_id, "lot_id": lot_ids[(medication_id, inventory_service.UNLOTTED)],
+                "movement_type": "Receipt", "quantity": quantity, "note": "Catalog import", "created_by_user_id": user_id
+            }
+            for medication_id, quantity in opening
+        ], update_totals=False)
+
+    batch: List[Tuple[int, schemas.MedicationImportRow]] = []
+    for row_number, record in _iter_csv_rows(stream):
+        report["total_rows"] += 1
+        try:
+            row = schemas.MedicationImportRow(**record)
+        except ValidationError as exc:
+            reject(row_number, record.get("name"), _format_validation_error(exc))
+            continue
+        key = (row.name, row.manufacturer)
+        if key in seen_keys:
+            reject(row_number, row.name, ["name: duplicated earlier in this file (same manufacturer)"], duplicate=True)
+            continue
+        seen_keys.add(key)
+        batch.append((row_number, row))
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+
+    db.commit()
+
+    elapsed = time.perf_counter() - started
+    report["elapsed_seconds"] = round(elapsed, 3)
+    report["rows_per_second"] = round(report["total_rows"] / elapsed, 1) if elapsed > 0 else 0.0
+    return report
@@ -2,7 +2,8 @@
 
 import uuid
 from sqlalchemy import (
-    Column, String, ForeignKey, TIMESTAMP, Text, Boolean, Date, Integer, BigInteger, Numeric
+    Column, String, ForeignKey, TIMESTAMP, Text, Boolean, Date, Time, Integer, BigInteger, Numeric, Float,
+    Index, UniqueConstraint, PrimaryKeyConstraint, text
 )
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.orm import relationship
@@ -73,7 +74,7 @@ class User(Base):
 class Patient(Base):
     __tablename__ = "patients"
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    mrn = Column(Text, unique=True, index=True)
+    mrn = Column(Text, index=True)
     first_name = Column(String, nullable=False)
     last_name = Column(String, nullable=False)
     date_of_birth = Column(Date, nullable=False)
@@ -86,6 +87,47 @@ class Patient(Base):
     updated_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), onupdate=func.now())
     clinic = relationship("Clinic", back_populates="patients")
     invoices = relationship("Invoice", back_populates="patient")
+    __table_args__ = (
+        # MRNs are numbered per clinic (see PatientMRNCounter), so they are unique per clinic
+        UniqueConstraint("clinic_id", "mrn", name="uq_patients_clinic_mrn"),
+        Index("ix_patients_clinic_updated_at", "clinic_id", "updated_at"),
+    )
+
+class PatientMRNCounter(Base):
+    __tablename__ = "patient_mrn_counters"
+    clinic_id = Column(UUID(as_uuid=True), ForeignKey("clinics.id"), primary_key=True)
+    last_value = Column(BigInteger, nullable=False, default=0)
+
+# --- Duplicate Patient Detection Models ---
+class PatientMatchKey(Base):
+    __tablename__ = "patient_match_keys"
+    patient_id = Column(UUID(as_uuid=True), ForeignKey("patients.id"), primary_key=True)
+    key = Column(Text, primary_key=True) # e.g., "dob:1980-01-31:S530", "tel:9123456"
+    clinic_id = Column(UUID(as_uuid=True), ForeignKey("clinics.id"), nullable=False)
+    __table_args__ = (Index("ix_patient_match_keys_clinic_key", "clinic_id", "key"),)
+
+class PatientDuplicateCandidate(Base):
+    __tablename__ = "patient_duplicate_candidates"
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    patient_id_a = Column(UUID(as_uuid=True), ForeignKey("patients.id"), nullable=False)
+    patient_id_b = Column(UUID(as_uuid=True), ForeignKey("patients.id"), nullable=False)
+    score = Column(Numeric(5, 4), nullable=False)
+    matched_keys = Column(JSONB)
+    status = Column(String, nullable=False, default='Open') # Open, Confirmed, Dismissed
+    clinic_id = Column(UUID(as_uuid=True), ForeignKey("clinics.id"), nullable=False)
+    created_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
+    updated_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), onupdate=func.now())
+    patient_a = relationship("Patient", foreign_keys=[patient_id_a])
+    patient_b = relationship("Patient", foreign_keys=[patient_id_b])
+    __table_args__ = (
+        UniqueConstraint("patient_id_a", "patient_id_b", name="uq_patient_duplicate_pair"),
+        Index("ix_patient_duplicate_candidates_clinic_status", "clinic_id", "status"),
+    )
+
+class DuplicateScanState(Base):
+    __tablename__ = "duplicate_scan_state"
+    clinic_id = Column(UUID(as_uuid=True), ForeignKey("clinics.id"), primary_key=True)
+    last_scanned_at = Column(TIMESTAMP(timezone=True), nullable=False)
 
 
 # --- Billing Models ---
@@ -155,6 +197,21 @@ class Appointment(Base):
     patient = relationship("Patient")
     doctor = relationship("User", foreign_keys=[doctor_id])
     invoice = relationship("Invoice")
+    __table_args__ = (
+        Index("ix_appointments_clinic_doctor_time", "clinic_id", "doctor_id", "appointment_time"),
+        Index("ix_appointments_clinic_status_time", "clinic_id", "status", "appointment_time"),
+    )
+
+class DoctorSchedule(Base):
+    __tablename__ = "doctor_schedules"
+    id = Column(Integer, primary_key=True)
+    doctor_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
+    weekday = Column(Integer, nullable=False) # 0 = Monday ... 6 = Sunday
+    start_time = Column(Time, nullable=False) # Clinic-local wall clock time
+    end_time = Column(Time, nullable=False)
+    slot_minutes = Column(Integer, nullable=False, default=15)
+    clinic_id = Column(UUID(as_uuid=True), ForeignKey("clinics.id"), nullable=False)
+    __table_args__ = (Index("ix_doctor_schedules_doctor_weekday", "doctor_id", "weekday"),)
 
 # --- Nursing Module Models ---
 class TriageRecord(Base):
@@ -233,9 +290,18 @@ class LabOrder(Base):
     clinic_id = Column(UUID(as_uuid=True), ForeignKey("clinics.id"), nullable=False)
     created_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
     updated_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), onupdate=func.now())
+    # Worklist claim: the technician currently working the order, until the lease expires
+    claimed_by_user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=True)
+    claimed_at = Column(TIMESTAMP(timezone=True), nullable=True)
+    claim_expires_at = Column(TIMESTAMP(timezone=True), nullable=True)
     patient = relationship("Patient")
     doctor = relationship("User", foreign_keys=[doctor_id])
     lab_test = relationship("LabTest")
+    __table_args__ = (
+        Index("ix_lab_orders_clinic_status", "clinic_id", "status"),
+        Index("ix_lab_orders_clinic_created_at", "clinic_id", "created_at"),
+        Index("ix_lab_orders_clinic_updated_at", "clinic_id", "updated_at"),
+    )
 
 class RadiologyOrder(Base):
     __tablename__ = "radiology_orders"
@@ -255,7 +321,7 @@ class RadiologyOrder(Base):
 class LabSample(Base):
     __tablename__ = "lab_samples"
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    lab_order_id = Column(UUID(as_uuid=True), ForeignKey("lab_orders.id"), nullable=False)
+    lab_order_id = Column(UUID(as_uuid=True), ForeignKey("lab_orders.id"), nullable=False, index=True)
     sample_barcode = Column(Text, unique=True)
     collected_by_user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
     collection_time = Column(TIMESTAMP(timezone=True), server_default=func.now())
@@ -264,12 +330,16 @@ class LabSample(Base):
     rejection_reason = Column(Text) # e.g., Hemolyzed, Insufficient volume
 
     clinic_id = Column(UUID(as_uuid=True), ForeignKey("clinics.id"), nullable=False)
+    __table_args__ = (
+        Index("ix_lab_samples_clinic_collection_time", "clinic_id", "collection_time"),
+        Index("ix_lab_samples_clinic_received_at", "clinic_id", "received_at"),
+    )
 
 class OrderResult(Base):
     __tablename__ = "order_results"
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     patient_id = Column(UUID(as_uuid=True), ForeignKey("patients.id"), nullable=False)
-    lab_order_id = Column(UUID(as_uuid=True), ForeignKey("lab_orders.id"), nullable=True)
+    lab_order_id = Column(UUID(as_uuid=True), ForeignKey("lab_orders.id"), nullable=True, index=True)
     radiology_order_id = Column(UUID(as_uuid=True), ForeignKey("radiology_orders.id"), nullable=True)
     result_data = Column(JSONB) # e.g., {"Hb": 8.5, "unit": "g/dL", "is_critical": true}
     report_notes = Column(Text)
@@ -280,6 +350,51 @@ class OrderResult(Base):
     validated_at = Column(TIMESTAMP(timezone=True))
     interpretation_notes = Column(Text) # AI/Rule-based interpretation
     clinic_id = Column(UUID(as_uuid=True), ForeignKey("clinics.id"), nullable=False)
+    reported_by = relationship("User", foreign_keys=[reported_by_user_id])
+    __table_args__ = (
+        Index("ix_order_results_patient_reported_at", "patient_id", "reported_at"),
+        Index("ix_order_results_result_data_gin", "result_data", postgresql_using="gin"),
+        Index("ix_order_results_clinic_reported_at", "clinic_id", "reported_at", "id"),
+        Index("ix_order_results_clinic_validated_at", "clinic_id", "validated_at"),
+    )
+
+class LabTatDailyBucket(Base):
+    """Per-day turnaround-time histogram: one row per (test, priority, stage, bucket)."""
+    __tablename__ = "lab_tat_daily_buckets"
+    clinic_id = Column(UUID(as_uuid=True), ForeignKey("clinics.id"), primary_key=True)
+    day = Column(Date, primary_key=True) # Clinic-local day the order was placed
+    lab_test_id = Column(Integer, ForeignKey("lab_tests.id"), primary_key=True)
+    priority = Column(String, primary_key=True)
+    stage = Column(String, primary_key=True) # order_to_collection, collection_to_result, result_to_validation
+    bucket = Column(Integer, primary_key=True) # Index into lab_analytics_service.BUCKET_EDGES_MINUTES
+    sample_count = Column(Integer, nullable=False)
+    total_seconds = Column(Float, nullable=False)
+
+class LabTatRefreshState(Base):
+    __tablename__ = "lab_tat_refresh_state"
+    clinic_id = Column(UUID(as_uuid=True), ForeignKey("clinics.id"), primary_key=True)
+    last_refreshed_at = Column(TIMESTAMP(timezone=True), nullable=False)
+
+class StoredFile(Base):
+    __tablename__ = "stored_files"
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    sha256 = Column(String(64), nullable=False) # Content address of the blob in file storage
+    size_bytes = Column(BigInteger, nullable=False)
+    content_type = Column(String, nullable=False, default="application/octet-stream")
+    original_filename = Column(Text)
+    uploaded_by_user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
+    clinic_id = Column(UUID(as_uuid=True), ForeignKey("clinics.id"), nullable=False)
+    source_file_id = Column(UUID(as_uuid=True), ForeignKey("stored_files.id"), nullable=True) # Set on derivatives (thumbnails, previews)
+    variant = Column(String(32))
+    width = Column(Integer)
+    height = Column(Integer)
+    created_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
+    __table_args__ = (
+        # Uploads are de-duplicated by content per clinic; derivatives are keyed by
+        # (source, variant) and may share a blob (a small image's preview and thumbnail)
+        Index("uq_stored_files_clinic_sha256", "clinic_id", "sha256", unique=True, postgresql_where=text("source_file_id IS NULL")),
+        Index("uq_stored_files_source_variant", "source_file_id", "variant", unique=True),
+    )
 
 class MedicationAdministration(Base):
     __tablename__ = "medication_administrations"
@@ -341,9 +456,93 @@ class Medication(Base):
     name = Column(String, nullable=False)
     manufacturer = Column(Text)
     stock_quantity = Column(Integer, nullable=False, default=0)
+    reserved_quantity = Column(Integer, nullable=False, default=0, server_default="0") # Held by active StockReservations
+    reorder_lead_time_days = Column(Integer) # Supplier lead time; NULL uses REORDER_LEAD_TIME_DAYS
     unit_price = Column(Numeric(10, 3), nullable=False)
     category = Column(String, default='Pharmacy')
     clinic_id = Column(UUID(as_uuid=True), ForeignKey("clinics.id"), nullable=False)
+    __table_args__ = (Index("ix_medications_clinic_name", "clinic_id", "name"),)
+
+    @property
+    def available_quantity(self):
+        """Available-to-promise: stock not held for open prescriptions."""
+        return self.stock_quantity - self.reserved_quantity
+
+class MedicationLot(Base):
+    """Stock of one medication lot; quantity_on_hand is maintained by InventoryMovement postings."""
+    __tablename__ = "medication_lots"
+    id = Column(Integer, primary_key=True)
+    medication_id = Column(Integer, ForeignKey("medications.id"), nullable=False)
+    lot_number = Column(String, nullable=False) # 'UNLOTTED' for stock received without a lot
+    expiry_date = Column(Date)
+    quantity_on_hand = Column(Integer, nullable=False, default=0)
+    clinic_id = Column(UUID(as_uuid=True), ForeignKey("clinics.id"), nullable=False)
+    created_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
+    medication = relationship("Medication")
+    __table_args__ = (
+        UniqueConstraint("medication_id", "lot_number", name="uq_medication_lots_medication_lot"),
+        # FEFO picking: earliest expiry first among lots that still have stock
+        Index("ix_medication_lots_fefo", "medication_id", "expiry_date", "id", postgresql_where=text("quantity_on_hand > 0")),
+    )
+
+class InventoryMovement(Base):
+    """Append-only stock ledger: one signed quantity per lot per event."""
+    __tablename__ = "inventory_movements"
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    medication_id = Column(Integer, ForeignKey("medications.id"), nullable=False)
+    lot_id = Column(Integer, ForeignKey("medication_lots.id"), nullable=False)
+    movement_type = Column(String, nullable=False) # Receipt, Dispensation, Adjustment, Expiry
+    quantity = Column(Integer, nullable=False)
+    note = Column(Text)
+    pharmacy_sale_id = Column(UUID(as_uuid=True), ForeignKey("pharmacy_sales.id"), nullable=True)
+    created_by_user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=True) # NULL for scheduled jobs
+    clinic_id = Column(UUID(as_uuid=True), ForeignKey("clinics.id"), nullable=False)
+    occurred_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=func.now())
+    __table_args__ = (
+        Index("ix_inventory_movements_lot_occurred_at", "lot_id", "occurred_at"),
+        Index("ix_inventory_movements_clinic_occurred_at", "clinic_id", "occurred_at"),
+    )
+
+class InventorySnapshot(Base):
+    """Quantity of each lot at the end of a day (clinic time), for point-in-time stock reports."""
+    __tablename__ = "inventory_snapshots"
+    lot_id = Column(Integer, ForeignKey("medication_lots.id"), nullable=False)
+    snapshot_date = Column(Date, nullable=False)
+    medication_id = Column(Integer, ForeignKey("medications.id"), nullable=False)
+    quantity = Column(Integer, nullable=False)
+    clinic_id = Column(UUID(as_uuid=True), ForeignKey("clinics.id"), nullable=False)
+    __table_args__ = (
+        PrimaryKeyConstraint("lot_id", "snapshot_date"),
+        Index("ix_inventory_snapshots_clinic_date", "clinic_id", "snapshot_date"),
+    )
+
+class MedicationConsumptionStats(Base):
+    """Running consumption rate of a medication, updated on every dispensation."""
+    __tablename__ = "medication_consumption_stats"
+    medication_id = Column(Integer, ForeignKey("medications.id"), primary_key=True)
+    clinic_id = Column(UUID(as_uuid=True), ForeignKey("clinics.id"), nullable=False, index=True)
+    ewma_daily = Column(Float, nullable=False, default=0.0) # EWMA of closed days, before bias correction
+    first_day = Column(Date, nullable=False)
+    last_day = Column(Date, nullable=False) # Day whose quantity is still accumulating in day_quantity
+    day_quantity = Column(Integer, nullable=False, default=0)
+    updated_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
+
+class StockReservation(Base):
+    """Stock held for a prescription item between prescribing and dispensing."""
+    __tablename__ = "stock_reservations"
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    medication_id = Column(Integer, ForeignKey("medications.id"), nullable=False)
+    prescription_id = Column(UUID(as_uuid=True), ForeignKey("prescriptions.id"), nullable=False)
+    prescription_item_id = Column(Integer, ForeignKey("prescription_items.id"), nullable=False, index=True)
+    quantity = Column(Integer, nullable=False)
+    status = Column(String, nullable=False, default='Active') # Active, Converted, Expired
+    expires_at = Column(TIMESTAMP(timezone=True), nullable=False)
+    resolved_at = Column(TIMESTAMP(timezone=True))
+    clinic_id = Column(UUID(as_uuid=True), ForeignKey("clinics.id"), nullable=False)
+    created_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
+    __table_args__ = (
+        Index("ix_stock_reservations_active_expires_at", "expires_at", postgresql_where=text("status = 'Active'")),
+    )
 
 class Prescription(Base):
     __tablename__ = "prescriptions"
@@ -356,11 +555,12 @@ class Prescription(Base):
     items = relationship("PrescriptionItem", back_populates="prescription")
     patient = relationship("Patient")
     doctor = relationship("User", foreign_keys=[doctor_id])
+    __table_args__ = (Index("ix_prescriptions_clinic_status_created_at", "clinic_id", "status", "created_at"),)
 
 class PrescriptionItem(Base):
     __tablename__ = "prescription_items"
     id = Column(Integer, primary_key=True)
-    prescription_id = Column(UUID(as_uuid=True), ForeignKey("prescriptions.id"), nullable=False)
+    prescription_id = Column(UUID(as_uuid=True), ForeignKey("prescriptions.id"), nullable=False, index=True)
     medication_id = Column(Integer, ForeignKey("medications.id"), nullable=False)
     dosage = Column(Text, nullable=False)
     quantity_prescribed = Column(Integer, nullable=False)
@@ -379,6 +579,8 @@ class PharmacySale(Base):
     sale_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
     clinic_id = Column(UUID(as_uuid=True), ForeignKey("clinics.id"), nullable=False)
     dispensations = relationship("Dispensation", back_populates="pharmacy_sale")
+    patient = relationship("Patient")
+    pharmacist = relationship("User", foreign_keys=[pharmacist_id])
 
 class Dispensation(Base):
     __tablename__ = "dispensations"
@@ -389,6 +591,7 @@ class Dispensation(Base):
     dispensed_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
     clinic_id = Column(UUID(as_uuid=True), ForeignKey("clinics.id"), nullable=False)
     pharmacy_sale = relationship("PharmacySale", back_populates="dispensations")
+    prescription_item = relationship("PrescriptionItem")
 
 
 
@@ -398,6 +601,17 @@ class ICD10Code(Base):
     id = Column(Integer, primary_key=True)
     code = Column(Text, nullable=False, unique=True)
     description = Column(Text, nullable=False)
+    # ClaML hierarchy: chapter/block/category, the direct parent and the enclosing chapter and block
+    kind = Column(String, nullable=True)
+    parent_code = Column(Text, nullable=True)
+    chapter = Column(Text, nullable=True)
+    block = Column(Text, nullable=True)
+    inclusions = Column(JSONB, nullable=True)
+    exclusions = Column(JSONB, nullable=True)
+    # Codes dropped by a later release are deactivated, never deleted (diagnoses reference them)
+    is_active = Column(Boolean, nullable=False, server_default=text("true"))
+    version = Column(Text, nullable=True) # Release that last added or changed the code
+    updated_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
 
 class AppointmentDiagnosis(Base):
     __tablename__ = "appointment_diagnoses"
@@ -424,6 +638,25 @@ class CPTCode(Base):
     id = Column(Integer, primary_key=True)
     code = Column(Text, nullable=False, unique=True)
     description = Column(Text, nullable=False)
+    is_active = Column(Boolean, nullable=False, server_default=text("true"))
+    version = Column(Text, nullable=True)
+    updated_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
+
+class CodeSetRelease(Base):
+    """One load of an ICD-10 or CPT release file, with what it changed."""
+    __tablename__ = "code_set_releases"
+
+    id = Column(Integer, primary_key=True)
+    code_set = Column(String, nullable=False) # 'icd10' or 'cpt'
+    version = Column(Text, nullable=False)
+    source_file = Column(Text, nullable=True)
+    sha256 = Column(String(64), nullable=False)
+    total_rows = Column(Integer, nullable=False)
+    inserted = Column(Integer, nullable=False)
+    updated = Column(Integer, nullable=False)
+    deactivated = Column(Integer, nullable=False)
+    loaded_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
+    __table_args__ = (UniqueConstraint("code_set", "version", name="uq_code_set_releases_code_set_version"),)
 
 class AppointmentProcedure(Base):
     __tablename__ = "appointment_procedures"
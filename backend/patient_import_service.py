@@ -0,0 +1,156 @@
+# backend/patient_import_service.py
+
+import csv
+import io
+import json
+import time
+import uuid
+from typing import IO, Iterator, List, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from . import crud, models, schemas
+from .bulk_copy import copy_rows
+
+BATCH_SIZE = 5000
+
+STAGING_TABLE = "patient_import_staging"
+STAGING_COLUMNS = (
+    "row_number", "id", "mrn", "first_name", "last_name", "date_of_birth",
+    "gender", "national_id", "contact_number", "address"
+)
+
+
+def _iter_csv_rows(stream: IO[bytes]) -> Iterator[Tuple[int, dict]]:
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding="utf-8-sig", newline=""))
+    for row_number, row in enumerate(reader, start=1):
+        # Blank cells mean "not provided"; extra cells (key None) are ignored.
+        yield row_number, {key.strip(): (value.strip() or None) for key, value in row.items() if key and isinstance(value, str)}
+
+def _iter_ndjson_rows(stream: IO[bytes]) -> Iterator[Tuple[int, dict | None]]:
+    row_number = 0
+    for line in io.TextIOWrapper(stream, encoding="utf-8-sig"):
+        if not line.strip():
+            continue
+        row_number += 1
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            record = None
+        yield row_number, record if isinstance(record, dict) else None
+
+def _format_validation_error(exc: ValidationError) -> List[str]:
+    return [f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in exc.errors()]
+
+
+def import_patients(db: Session, stream: IO[bytes], file_format: str, clinic_id: str, batch_size: int = BATCH_SIZE) -> dict:
+    """
+    Streams a CSV or NDJSON file of patients into the clinic in a single transaction.
+
+    Rows are validated against PatientCreate, de-duplicated on national_id
+    (within the file and against existing patients, one query per batch),
+    given MRNs from a block reservation and loaded with COPY into a staging
+    table that is merged into `patients`. Every rejected row is reported.
+    """
+    if file_format == "csv":
+        rows = _iter_csv_rows(stream)
+    elif file_format == "ndjson":
+        rows = _iter_ndjson_rows(stream)
+    else:
+        raise ValueError("Unsupported import format. Use 'csv' or 'ndjson'.")
+
+    started = time.perf_counter()
+    report = {"total_rows": 0, "imported": 0, "duplicates": 0, "invalid": 0, "errors": []}
+    seen_national_ids = set()
+
+    db.execute(text(
+        f"CREATE TEMP TABLE IF NOT EXISTS {STAGING_TABLE} ("
+        "row_number integer, id uuid, mrn text, first_name text, last_name text, "
+        "date_of_birth date, gender text, national_id text, contact_number text, address text"
+        ") ON COMMIT DROP"
+    ))
+
+    def reject(row_number: int, national_id: str | None, errors: List[str], duplicate: bool = False):
+        report["duplicates" if duplicate else "invalid"] += 1
+        report["errors"].append({"row": row_number, "national_id": national_id, "errors": errors})
+
+    def flush(batch: List[Tuple[int, schemas.PatientCreate]]):
+        # 1. Drop rows whose national_id is already registered (one set-based query)
+        national_ids = [patient.national_id for _, patient in batch if patient.national_id]
+        existing = set()
+        if national_ids:
+            existing = {
+                national_id for national_id, in db.query(models.Patient.national_id)
+                .filter(models.Patient.national_id.in_(national_ids))
+            }
+        accepted = []
+        for row_number, patient in batch:
+            if patient.national_id in existing:
+                reject(row_number, patient.national_id, ["national_id: a patient with this national ID already exists"], duplicate=True)
+            else:
+                accepted.append((row_number, patient))
+        if not accepted:
+            return
+
+        # 2. Reserve one block of MRNs for the whole batch
+        first_mrn = crud.allocate_mrn_block(db, clinic_id=clinic_id, size=len(accepted))
+
+        # 3. COPY into staging and merge; ON CONFLICT catches national IDs registered
+        # concurrently. Any other violation (an MRN clash) raises instead of dropping rows.
+        patient_ids = [uuid.uuid4() for _ in accepted]
+        db.execute(text(f"TRUNCATE {STAGING_TABLE}"))
+        copy_rows(db, STAGING_TABLE, STAGING_COLUMNS, (
+            (
+                row_number, patient_id, crud.format_mrn(first_mrn + offset),
+                patient.first_name, patient.last_name, patient.date_of_birth, patient.gender,
+                patient.national_id, patient.contact_number, patient.address
+            )
+            for offset, ((row_number, patient), patient_id) in enumerate(zip(accepted, patient_ids))
+        ))
+        inserted_rows = db.execute(text(
+            "INSERT INTO patients (id, mrn, first_name, last_name, date_of_birth, gender, "
+            "national_id, contact_number, address, clinic_id) "
+            "SELECT id, mrn, first_name, last_name, date_of_birth, gender, "
+            "national_id, contact_number, address, :clinic_id "
+            f"FROM {STAGING_TABLE} ORDER BY row_number "
+            "ON CONFLICT (national_id) DO NOTHING RETURNING id"
+        ), {"clinic_id": clinic_id}).scalars().all()
+        inserted = {str(patient_id) for patient_id in inserted_rows}
+        report["imported"] += len(inserted)
+        for (row_number, patient), patient_id in zip(accepted, patient_ids):
+            if str(patient_id) not in inserted:
+                reject(row_number, patient.national_id, ["national_id: conflicts with a patient registered during the import"], duplicate=True)
+
+    batch: List[Tuple[int, schemas.PatientCreate]] = []
+    for row_number, record in rows:
+        report["total_rows"] += 1
+        if record is None:
+            reject(row_number, None, ["row: not a valid JSON object"])
+            continue
+        try:
+            patient = schemas.PatientCreate(**record)
+        except ValidationError as exc:
+            national_id = record.get("national_id")
+            reject(row_number, str(national_id) if national_id is not None else None, _format_validation_error(exc))
+            continue
+        if patient.national_id:
+            if patient.national_id in seen_national_ids:
+                reject(row_number, patient.national_id, ["national_id: duplicated earlier in this file"], duplicate=True)
+                continue
+            seen_national_ids.add(patient.national_id)
+        batch.append((row_number, patient))
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+
+    db.commit()
+
+    elapsed = time.perf_counter() - started
+    report["errors"].sort(key=lambda error: error["row"])
+    report["elapsed_seconds"] = round(elapsed, 3)
+    report["rows_per_second"] = round(report["total_rows"] / elapsed, 1) if elapsed > 0 else 0.0
+    return report
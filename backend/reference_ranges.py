@@ -0,0 +1,233 @@
+# backend/reference_ranges.py
+
+import re
+import threading
+import time
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from . import models
+
+# Flag codes used by the vectorised evaluator
+UNFLAGGED, NORMAL, ABNORMAL, CRITICAL = -1, 0, 1, 2
+FLAG_NAMES = {UNFLAGGED: None, NORMAL: "normal", ABNORMAL: "abnormal", CRITICAL: "critical"}
+
+# Keys in OrderResult.result_data that describe a result rather than hold an analyte value
+RESULT_META_KEYS = {"unit", "units", "is_critical", "flags", "analyzer_flags", "notes"}
+
+# Compiled per-clinic ranges are reused for this long before being re-read
+CACHE_TTL_SECONDS = 300
+
+# Accepts numbers stored as JSON strings, e.g. "8.5" (also used in SQL by lab_trend_service)
+NUMERIC_TEXT = r"^\s*[-+]?[0-9]+(\.[0-9]+)?\s*$"
+_NUMERIC_TEXT = re.compile(NUMERIC_TEXT)
+
+# Plain numbers or numbers with thousands separators ("1,000.5")
+_NUMBER = r"[-+]?(?:\d{1,3}(?:,\d{3})+|\d+)(?:\.\d+)?"
+_BETWEEN = re.compile(rf"^({_NUMBER})\s*(?:-|–|to)\s*({_NUMBER})$")
+_COMPARISON = re.compile(rf"^(<=|>=|≤|≥|<|>)\s*({_NUMBER})$")
+_UNIT_SUFFIX = re.compile(r"\s*[a-zA-Zµμ%/][\w/%µμ^.*]*\s*$")
+# Clause separators; a comma followed by three digits is a thousands separator, not a separator
+_CLAUSE_SEPARATOR = re.compile(r"\s*(?:\bor\b|,(?!\d{3}\b)|;|\|)\s*", re.IGNORECASE)
+# Text starting with a number or a comparison is meant as a numeric range;
+# anything else ("Negative", "Positive (>1:80)") is a qualitative reference
+_LOOKS_NUMERIC = re.compile(r"^\s*(?:<=|>=|≤|≥|<|>|[-+]?\d)")
+
+
+class Interval(NamedTuple):
+    low: float
+    high: float
+    low_inclusive: bool
+    high_inclusive: bool
+
+
+def _number(text: str) -> float:
+    return float(text.replace(",", ""))
+
+def _parse_clause(clause: str, text: str) -> Interval:
+    clause = _UNIT_SUFFIX.sub("", clause.strip())
+    match = _BETWEEN.match(clause)
+    if match:
+        low, high = _number(match.group(1)), _number(match.group(2))
+        if low > high:
+            raise ValueError(f"Reference range '{text}' has its bounds reversed.")
+        return Interval(low, high, True, True)
+    match = _COMPARISON.match(clause)
+    if match:
+        op, bound = match.group(1), _number(match.group(2))
+        if op in ("<", "<=", "≤"):
+            return Interval(-np.inf, bound, False, op != "<")
+        return Interval(bound, np.inf, op != ">", False)
+    raise ValueError(f"Cannot parse reference range '{text}'.")
+
+@lru_cache(maxsize=4096)
+def compile_range(text: str | None) -> Tuple[Interval, ...]:
+    """
+    Compiles a free-text range such as "12.0-15.5 g/dL", ">= 40",
+    "1,000-2,000" or "<7.0 or >21.0 g/dL" into the union of numeric
+    intervals it describes. Blank and qualitative text ("Negative") compile
+    to an empty tuple (no predicate: results are left unflagged). Raises
+    ValueError for text that looks numeric but cannot be parsed.
+    """
+    if not is_numeric_range(text):
+        return ()
+    clauses = _CLAUSE_SEPARATOR.split(text.strip())
+    return tuple(_parse_clause(clause, text) for clause in clauses if clause)
+
+def is_numeric_range(text: str | None) -> bool:
+    """Whether the text is meant as a numeric range (as opposed to blank or qualitative text)."""
+    return bool(text and _LOOKS_NUMERIC.match(text))
+
+def validate_range(text: str | None) -> None:
+    """Raises ValueError for a numeric-looking range that cannot be parsed; qualitative text is accepted."""
+    compile_range(text)
+
+def _inside(intervals: Tuple[Interval, ...], values: np.ndarray) -> np.ndarray:
+    inside = np.zeros(values.shape, dtype=bool)
+    for low, high, low_inclusive, high_inclusive in intervals:
+        above = values >= low if low_inclusive else values > low
+        below = values <= high if high_inclusive else values < high
+        inside |= above & below
+    return inside
+
+
+class CompiledReference(NamedTuple):
+    normal: Tuple[Interval, ...]
+    critical: Tuple[Interval, ...]
+    # A critical text that is a single closed band ("7.0-21.0") gives the
+    # non-critical span; open comparisons ("<7.0 or >21.0") give the critical zone.
+    critical_is_safe_band: bool
+
+    def evaluate(self, values: np.ndarray) -> np.ndarray:
+        """Flags a float array (NaN = non-numeric) in one vectorised pass."""
+        flags = np.full(values.shape, UNFLAGGED, dtype=np.int8)
+        numeric = ~np.isnan(values)
+        if self.normal:
+            flags[numeric] = NORMAL
+            flags[numeric & ~_inside(self.normal, values)] = ABNORMAL
+        if self.critical:
+            in_critical = _inside(self.critical, values)
+            critical = numeric & (~in_critical if self.critical_is_safe_band else in_critical)
+            flags[critical] = CRITICAL
+        return flags
+
+def compile_reference(normal_text: str | None, critical_text: str | None) -> CompiledReference:
+    critical = compile_range(critical_text)
+    safe_band = len(critical) == 1 and np.isfinite(critical[0].low) and np.isfinite(critical[0].high)
+    return CompiledReference(compile_range(normal_text), critical, safe_band)
+
+
+# --- Per-clinic cache ---
+
+_cache: Dict[str, Tuple[float, Dict[int, CompiledReference]]] = {}
+_cache_lock = threading.Lock()
+
+def get_clinic_references(db: Session, clinic_id) -> Dict[int, CompiledReference]:
+    """Compiled reference ranges for every lab test in the clinic, keyed by lab_test_id."""
+    key = str(clinic_id)
+    with _cache_lock:
+        cached = _cache.get(key)
+    if cached and time.monotonic() - cached[0] < CACHE_TTL_SECONDS:
+        return cached[1]
+
+    references = {}
+    for test_id, normal_text, critical_text in db.query(
+        models.LabTest.id, models.LabTest.reference_range_normal, models.LabTest.reference_range_critical
+    ).filter(models.LabTest.clinic_id == clinic_id):
+        try:
+            references[test_id] = compile_reference(normal_text, critical_text)
+        except ValueError:
+            continue  # Legacy free text that is not a numeric range is simply not evaluated
+    with _cache_lock:
+        _cache[key] = (time.monotonic(), references)
+    return references
+
+def invalidate_clinic_references(clinic_id) -> None:
+    with _cache_lock:
+        _cache.pop(str(clinic_id), None)
+
+
+# --- Result annotation ---
+
+def analyte_number(value) -> float | None:
+    """A result_data value as a float: JSON numbers and numeric strings ("13"); None for anything else."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str) and _NUMERIC_TEXT.match(value):
+        return float(value)
+    return None
+
+def _evaluated_analytes(result_data: dict, test_name: str | None) -> List[str]:
+    """
+    A test carries one reference range, so it is applied to the result's
+    only numeric analyte, or to the analyte named like the test.
+    """
+    numeric = [
+        key for key, value in result_data.items()
+        if key not in RESULT_META_KEYS and analyte_number(value) is not None
+    ]
+    if len(numeric) == 1:
+        return numeric
+    if test_name:
+        return [key for key in numeric if key.lower() == test_name.lower()]
+    return []
+
+def annotate_results(references: Dict[int, CompiledReference], items: List[Tuple[int, str | None, dict]]) -> None:
+    """
+    Adds `flags` ({analyte: normal/abnormal/critical}) and `is_critical` to
+    each item's result_data in place. Items are (lab_test_id, test_name,
+    result_data); values of the same test are evaluated together as one array.
+    """
+    by_test: Dict[int, List[Tuple[dict, str]]] = {}
+    for lab_test_id, test_name, result_data in items:
+        if not result_data or lab_test_id not in references:
+            continue
+        for analyte in _evaluated_analytes(result_data, test_name):
+            by_test.setdefault(lab_test_id, []).append((result_data, analyte))
+
+    for lab_test_id, entries in by_test.items():
+        values = np.fromiter((analyte_number(data[analyte]) for data, analyte in entries), dtype=np.float64, count=len(entries))
+        flags = references[lab_test_id].evaluate(values)
+        for (data, analyte), flag in zip(entries, flags.tolist()):
+            if flag == UNFLAGGED:
+                continue
+            data.setdefault("flags", {})[analyte] = FLAG_NAMES[flag]
+            if flag == CRITICAL:
+                data["is_critical"] = True
+    for _, _, result_data in items:
+        if result_data and "flags" in result_data:
+            result_data.setdefault("is_critical", False)
+
+
+# --- Benchmark: python -m backend.reference_ranges ---
+if __name__ == "__main__":
+    rng = np.random.default_rng(42)
+    test_count, value_count = 50, 1_000_000
+    texts = [(f"{10 + i}.0-{20 + i}.5 g/dL", f"<{5 + i}.0 or >{30 + i}.0") for i in range(test_count)]
+
+    started = time.perf_counter()
+    compiled = [compile_reference(normal, critical) for normal, critical in texts]
+    compile_seconds = time.perf_counter() - started
+
+    test_ids = rng.integers(0, test_count, value_count)
+    values = rng.normal(20.0, 8.0, value_count)
+    values[rng.random(value_count) < 0.01] = np.nan
+
+    started = time.perf_counter()
+    flags = np.empty(value_count, dtype=np.int8)
+    order = np.argsort(test_ids, kind="stable")
+    bounds = np.searchsorted(test_ids[order], np.arange(test_count + 1))
+    for test_id in range(test_count):
+        idx = order[bounds[test_id]:bounds[test_id + 1]]
+        flags[idx] = compiled[test_id].evaluate(values[idx])
+    evaluate_seconds = time.perf_counter() - started
+
+    counts = {FLAG_NAMES[code] or "unflagged": int((flags == code).sum()) for code in FLAG_NAMES}
+    print(f"compiled {test_count} ranges in {compile_seconds * 1000:.2f} ms")
+    print(f"flagged {value_count:,} values in {evaluate_seconds * 1000:.1f} ms "
+          f"({value_count / evaluate_seconds / 1e6:.1f}M values/s): {counts}")
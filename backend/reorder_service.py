@@ -0,0 +1,204 @@
+# backend/reorder_service.py
+
+import argparse
+import csv
+import math
+import os
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, List
+
+from dotenv import load_dotenv
+from sqlalchemy import case, func, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import SessionLocal
+from .scheduling_service import CLINIC_TIMEZONE
+
+# Load environment variables from the .env file
+load_dotenv()
+
+# EWMA of daily consumption with a ~30-day span: alpha = 2 / (span + 1)
+CONSUMPTION_SPAN_DAYS = 30
+ALPHA = 2.0 / (CONSUMPTION_SPAN_DAYS + 1)
+DEFAULT_LEAD_TIME_DAYS = int(os.getenv("REORDER_LEAD_TIME_DAYS", "7"))
+SAFETY_STOCK_DAYS = int(os.getenv("REORDER_SAFETY_STOCK_DAYS", "3"))
+# Orders should cover this many days beyond the reorder point
+REVIEW_PERIOD_DAYS = int(os.getenv("REORDER_REVIEW_PERIOD_DAYS", "14"))
+REPORT_DIR = os.getenv("REORDER_REPORT_DIR", "reports")
+
+
+def _today() -> date:
+    return datetime.now(CLINIC_TIMEZONE).date()
+
+def record_consumption(db: Session, clinic_id: str, quantity_by_medication: Dict[int, int], day: date | None = None):
+    """
+    Folds dispensed quantities into each medication's running consumption
+    rate with one upsert. Quantities accumulate in the current day's bucket;
+    when a later day arrives the bucket is folded into the EWMA and the
+    average decays once for every day without dispensing in between.
+    The caller commits.
+    """
+    if not quantity_by_medication:
+        return
+    day = day or _today()
+    stats = models.MedicationConsumptionStats.__table__.c
+    stmt = pg_insert(models.MedicationConsumptionStats).values([
+        {
+            "medication_id": medication_id, "clinic_id": clinic_id, "ewma_daily": 0.0,
+            "first_day": day, "last_day": day, "day_quantity": quantity
+        }
+        for medication_id, quantity in quantity_by_medication.items()
+    ])
+    same_day = stats.last_day >= stmt.excluded.last_day
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[stats.medication_id],
+        set_={
+            "ewma_daily": case(
+                (same_day, stats.ewma_daily),
+                else_=(ALPHA * stats.day_quantity + (1 - ALPHA) * stats.ewma_daily)
+                * func.power(1 - ALPHA, stmt.excluded.last_day - stats.last_day - 1)
+            ),
+            "day_quantity": case(
+                (same_day, stats.day_quantity + stmt.excluded.day_quantity),
+                else_=stmt.excluded.day_quantity
+            ),
+            "last_day": func.greatest(stats.last_day, stmt.excluded.last_day),
+            "updated_at": func.now()
+        }
+    ))
+
+
+# Daily rate as of :today: fold the pending bucket, decay for idle days, and
+# divide by the EWMA weight so young series are not biased towards zero.
+_RATE_SQL = """
+    CASE
+        WHEN s.last_day < CAST(:today AS date) THEN
+            (:alpha * s.day_quantity + (1 - :alpha) * s.ewma_daily) * power(1 - :alpha, CAST(:today AS date) - s.last_day - 1)
+            / (1 - power(1 - :alpha, CAST(:today AS date) - s.first_day))
+        WHEN s.last_day > s.first_day THEN
+            s.ewma_daily / (1 - power(1 - :alpha, s.last_day - s.first_day))
+        ELSE s.day_quantity
+    END
+"""
+
+_REORDER_SQL = f"""
+    WITH rates AS (
+        SELECT m.id AS medication_id, m.name, m.manufacturer, m.stock_quantity,
+               m.stock_quantity - m.reserved_quantity AS available_quantity,
+               coalesce(m.reorder_lead_time_days, :default_lead_time) AS lead_time_days,
+               coalesce({_RATE_SQL}, 0) AS daily_rate
+        FROM medications m
+        LEFT JOIN medication_consumption_stats s ON s.medication_id = m.id
+        WHERE m.clinic_id = :clinic_id
+    )
+    SELECT *,
+           daily_rate * (lead_time_days + :safety_days) AS reorder_point,
+           CASE WHEN daily_rate > 0 THEN available_quantity / daily_rate END AS days_of_cover
+    FROM rates
+    WHERE available_quantity <= 0 OR (daily_rate > 0 AND available_quantity <= daily_rate * (lead_time_days + :safety_days))
+    ORDER BY days_of_cover ASC NULLS FIRST, name
+    LIMIT :limit
+"""
+
+def get_low_stock(db: Session, clinic_id: str, limit: int = 500) -> List[dict]:
+    """
+    Medications at or below their reorder point (rate x (lead time + safety
+    days)) or out of stock, least cover first, with a suggested order quantity
+    that lasts REVIEW_PERIOD_DAYS beyond the reorder point.
+    """
+    rows = db.execute(text(_REORDER_SQL), {
+        "clinic_id": clinic_id, "today": _today(), "alpha": ALPHA, "limit": limit,
+        "default_lead_time": DEFAULT_LEAD_TIME_DAYS, "safety_days": SAFETY_STOCK_DAYS
+    }).mappings().all()
+    return [
+        {
+            "medication_id": row["medication_id"], "name": row["name"], "manufacturer": row["manufacturer"],
+            "stock_quantity": row["stock_quantity"], "available_quantity": row["available_quantity"],
+            "daily_rate": round(row["daily_rate"], 2), "lead_time_days": row["lead_time_days"],
+            "reorder_point": math.ceil(row["reorder_point"]),
+            "days_of_cover": round(row["days_of_cover"], 1) if row["days_of_cover"] is not None else None,
+            "suggested_order_quantity": max(
+                math.ceil(row["reorder_point"] + row["daily_rate"] * REVIEW_PERIOD_DAYS) - row["available_quantity"], 0
+            )
+        }
+        for row in rows
+    ]
+
+
+def rebuild_consumption_stats(db: Session, clinic_id: str, days: int = 90) -> int:
+    """
+    Recomputes the running rates from the last `days` of Dispensation
+    movements, e.g. after enabling the engine on an existing clinic.
+    One grouped query; the EWMA is replayed in Python per medication.
+    """
+    today = _today()
+    start = today - timedelta(days=days)
+    daily = db.execute(text("""
+        SELECT medication_id, (occurred_at AT TIME ZONE :tz)::date AS day, -sum(quantity) AS quantity
+        FROM inventory_movements
+        WHERE clinic_id = :clinic_id AND movement_type = 'Dispensation'
+          AND occurred_at >= CAST(:start AS timestamp) AT TIME ZONE :tz
+        GROUP BY 1, 2
+        ORDER BY 1, 2
+    """), {"clinic_id": clinic_id, "tz": CLINIC_TIMEZONE.key, "start": start}).all()
+    series = defaultdict(list)
+    for medication_id, day, quantity in daily:
+        series[medication_id].append((day, int(quantity)))
+
+    rows = []
+    for medication_id, days_and_quantities in series.items():
+        first_day, day_quantity = days_and_quantities[0]
+        ewma, last_day = 0.0, first_day
+        for day, quantity in days_and_quantities[1:]:
+            ewma = (ALPHA * day_quantity + (1 - ALPHA) * ewma) * (1 - ALPHA) ** ((day - last_day).days - 1)
+            last_day, day_quantity = day, quantity
+        rows.append({
+            "medication_id": medication_id, "clinic_id": clinic_id, "ewma_daily": ewma,
+            "first_day": first_day, "last_day": last_day, "day_quantity": day_quantity
+        })
+
+    db.query(models.MedicationConsumptionStats).filter(
+        models.MedicationConsumptionStats.clinic_id == clinic_id
+    ).delete(synchronize_session=False)
+    for offset in range(0, len(rows), 5000):
+        db.execute(pg_insert(models.MedicationConsumptionStats).values(rows[offset:offset + 5000]))
+    db.commit()
+    return len(series)
+
+def write_reorder_report(db: Session, clinic_id: str, report_dir: str = REPORT_DIR) -> tuple:
+    rows = get_low_stock(db, clinic_id, limit=1_000_000)
+    os.makedirs(report_dir, exist_ok=True)
+    path = os.path.join(report_dir, f"reorder-{clinic_id}-{_today().isoformat()}.csv")
+    with open(path, "w", newline="") as report:
+        writer = csv.DictWriter(report, fieldnames=[
+            "medication_id", "name", "manufacturer", "stock_quantity", "available_quantity", "daily_rate",
+            "lead_time_days", "reorder_point", "days_of_cover", "suggested_order_quantity"
+        ])
+        writer.writeheader()
+        writer.writerows(rows)
+    return path, len(rows)
+
+
+# --- How to use this script (e.g., from a nightly cron job) ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write the nightly reorder report for every active clinic.")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute consumption rates from the ledger first")
+    args = parser.parse_args()
+
+    session = SessionLocal()
+    try:
+        clinic_ids = [clinic_id for clinic_id, in session.query(models.Clinic.id).filter(models.Clinic.status == 'Active')]
+    finally:
+        session.close()
+    for active_clinic_id in clinic_ids:
+        db = SessionLocal()
+        try:
+            if args.rebuild:
+                rebuild_consumption_stats(db, clinic_id=str(active_clinic_id))
+            report_path, count = write_reorder_report(db, clinic_id=str(active_clinic_id))
+            print(f"Clinic {active_clinic_id}: {count} medications to reorder -> {report_path}")
+        finally:
+            db.close()
@@ -0,0 +1,133 @@
+# backend/reservation_service.py
+
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+
+from sqlalchemy import Integer, column, func, text, update, values
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import SessionLocal
+
+RESERVATION_TTL = timedelta(hours=int(os.getenv("RESERVATION_TTL_HOURS", "24")))
+RELEASE_BATCH_SIZE = 1000
+
+
+def reserve_for_prescription(db: Session, clinic_id: str, prescription_id, items: List[models.PrescriptionItem]) -> Dict[int, bool]:
+    """
+    Holds stock for a new prescription's items until RESERVATION_TTL passes.
+    Each medication is reserved all-or-nothing with one guarded UPDATE on its
+    available-to-promise (stock_quantity - reserved_quantity); medications
+    without enough ATP are simply not reserved, since prescribing must not
+    depend on stock. Returns {prescription_item_id: reserved}. The caller commits.
+    """
+    wanted_by_medication = defaultdict(int)
+    for item in items:
+        if item.quantity_prescribed > 0:
+            wanted_by_medication[item.medication_id] += item.quantity_prescribed
+    if not wanted_by_medication:
+        return {item.id: False for item in items}
+
+    wanted = values(
+        column("medication_id", Integer), column("quantity", Integer), name="wanted"
+    ).data(list(wanted_by_medication.items()))
+    reserved = set(db.execute(
+        update(models.Medication)
+        .where(
+            models.Medication.id == wanted.c.medication_id,
+            models.Medication.clinic_id == clinic_id,
+            models.Medication.stock_quantity - models.Medication.reserved_quantity >= wanted.c.quantity
+        )
+        .values(reserved_quantity=models.Medication.reserved_quantity + wanted.c.quantity)
+        .returning(models.Medication.id)
+        .execution_options(synchronize_session=False)
+    ).scalars())
+
+    expires_at = datetime.now(timezone.utc) + RESERVATION_TTL
+    rows = [
+        {
+            "medication_id": item.medication_id, "prescription_id": prescription_id, "prescription_item_id": item.id,
+            "quantity": item.quantity_prescribed, "status": "Active", "expires_at": expires_at, "clinic_id": clinic_id
+        }
+        for item in items if item.medication_id in reserved and item.quantity_prescribed > 0
+    ]
+    if rows:
+        db.execute(pg_insert(models.StockReservation).values(rows))
+    return {item.id: item.medication_id in reserved and item.quantity_prescribed > 0 for item in items}
+
+def convert_for_items(db: Session, clinic_id: str, prescription_item_ids) -> Dict[int, int]:
+    """
+    Marks the active reservations of the given prescription items as
+    converted (dispensed) and returns the quantity they held per medication,
+    for the caller to remove from reserved_quantity together with the stock.
+    Reservations past their expiry but not yet released are converted too,
+    since they still count in reserved_quantity.
+    """
+    rows = db.execute(
+        update(models.StockReservation)
+        .where(
+            models.StockReservation.clinic_id == clinic_id,
+            models.StockReservation.prescription_item_id.in_(list(prescription_item_ids)),
+            models.StockReservation.status == 'Active'
+        )
+        .values(status='Converted', resolved_at=func.now())
+        .returning(models.StockReservation.medication_id, models.StockReservation.quantity)
+        .execution_options(synchronize_session=False)
+    ).all()
+    held = defaultdict(int)
+    for medication_id, quantity in rows:
+        held[medication_id] += quantity
+    return dict(held)
+
+
+_RELEASE_SQL = """
+    WITH expired AS (
+        SELECT id FROM stock_reservations
+        WHERE status = 'Active' AND expires_at < now() {clinic_filter}
+        ORDER BY expires_at
+        LIMIT :batch_size
+        FOR UPDATE SKIP LOCKED
+    ),
+    released AS (
+        UPDATE stock_reservations r SET status = 'Expired', resolved_at = now()
+        FROM expired WHERE r.id = expired.id
+        RETURNING r.medication_id, r.quantity
+    ),
+    totals AS (
+        SELECT medication_id, sum(quantity) AS quantity FROM released GROUP BY medication_id
+    ),
+    updated AS (
+        UPDATE medications m SET reserved_quantity = m.reserved_quantity - totals.quantity
+        FROM totals WHERE m.id = totals.medication_id
+        RETURNING m.id
+    )
+    SELECT (SELECT count(*) FROM released) AS released, (SELECT count(*) FROM updated) AS medications
+"""
+
+def release_expired(db: Session, clinic_id: str | None = None, batch_size: int = RELEASE_BATCH_SIZE) -> int:
+    """
+    Releases expired reservations in batches of `batch_size`, one short
+    transaction per batch (SKIP LOCKED lets it run alongside dispensing).
+    Returns the number of reservations released.
+    """
+    sql = text(_RELEASE_SQL.format(clinic_filter="AND clinic_id = :clinic_id" if clinic_id else ""))
+    params = {"batch_size": batch_size, "clinic_id": clinic_id}
+    total = 0
+    while True:
+        released = db.execute(sql, params).one().released
+        db.commit()
+        total += released
+        if released < batch_size:
+            return total
+
+
+# --- How to use this script (e.g., from a cron job every few minutes) ---
+if __name__ == "__main__":
+    db = SessionLocal()
+    try:
+        print(f"Released {release_expired(db)} expired stock reservations")
+    finally:
+        db.close()
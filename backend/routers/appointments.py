@@ -1,13 +1,14 @@
 # backend/routers/appointments.py
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from typing import List
 import uuid
-from datetime import datetime
+from datetime import date, datetime
 
 from .. import crud, schemas, security, database, models
 from ..audit_service import log_action
+from ..scheduling_service import SlotUnavailableError, get_available_slots, get_doctor_schedule as get_working_hours, replace_doctor_schedule
 
 router = APIRouter(
     prefix="/api/appointments",
@@ -43,6 +44,9 @@ def book_new_appointment_and_create_invoice(
         log_action(db, "APPOINTMENT_BOOKED_WITH_INVOICE", user_id=current_user.id, clinic_id=current_user.clinic_id, details={"appointment_id": str(new_appointment.id), "invoice_id": str(new_appointment.invoice_id)})
 
         return new_appointment
+    except SlotUnavailableError as e:
+        db.rollback()
+        raise HTTPException(status_code=409, detail=str(e))
     except ValueError as e:
         db.rollback()
         raise HTTPException(status_code=400, detail=str(e))
@@ -51,12 +55,94 @@ def book_new_appointment_and_create_invoice(
         raise HTTPException(status_code=500, detail="An unexpected error occurred during booking.")
 
 
+@router.post("/book-series", response_model=List[schemas.Appointment])
+def book_appointment_series(
+    series: schemas.AppointmentSeriesCreate,
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(security.get_current_active_user)
+):
+    """
+    Books a series of consultations from explicit times or a weekly
+    recurrence. All appointments (and their invoices) are created, or none.
+    """
+    try:
+        appointments = crud.book_appointment_series(
+            db=db, series=series, clinic_id=current_user.clinic_id, user_id=str(current_user.id)
+        )
+    except SlotUnavailableError as e:
+        db.rollback()
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+
+    log_action(db, "APPOINTMENT_SERIES_BOOKED", user_id=current_user.id, clinic_id=current_user.clinic_id, details={
+        "patient_id": str(series.patient_id), "doctor_id": str(series.doctor_id),
+        "appointment_ids": [str(appointment.id) for appointment in appointments]
+    })
+    return appointments
+
 @router.get("/my-schedule", response_model=List[schemas.Appointment])
 def get_doctor_schedule(
+    day: date | None = None,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    upcoming: bool = False,
+    skip: int = 0,
+    limit: int = Query(100, le=500),
     db: Session = Depends(database.get_db),
     current_user: models.User = Depends(security.get_current_active_user)
 ):
-    """Retrieves the appointment schedule for the currently logged-in doctor."""
+    """
+    Retrieves the appointment schedule for the currently logged-in doctor.
+    Pass `day`, a `start`/`end` range or `upcoming=true` to limit the window.
+    """
     return crud.get_appointments_by_doctor(
-        db, clinic_id=current_user.clinic_id, doctor_id=str(current_user.id)
+        db, clinic_id=current_user.clinic_id, doctor_id=str(current_user.id),
+        skip=skip, limit=limit, day=day, start=start, end=end, upcoming=upcoming
     )
+
+
+@router.get("/availability", response_model=List[schemas.DayAvailability])
+def get_doctor_availability(
+    doctor_id: uuid.UUID,
+    start_date: date,
+    end_date: date,
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(security.get_current_active_user)
+):
+    """Lists a doctor's free slots per day within the given date range (inclusive)."""
+    try:
+        return get_available_slots(
+            db, doctor_id=str(doctor_id), clinic_id=current_user.clinic_id,
+            start_date=start_date, end_date=end_date
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/doctors/{doctor_id}/schedule", response_model=List[schemas.DoctorSchedule])
+def get_doctor_working_hours(
+    doctor_id: uuid.UUID,
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(security.get_current_active_user)
+):
+    """Retrieves a doctor's weekly working hours."""
+    return get_working_hours(db, doctor_id=str(doctor_id), clinic_id=current_user.clinic_id)
+
+
+@router.put("/doctors/{doctor_id}/schedule", response_model=List[schemas.DoctorSchedule])
+def set_doctor_working_hours(
+    doctor_id: uuid.UUID,
+    entries: List[schemas.DoctorScheduleCreate],
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(security.get_current_admin_user)
+):
+    """(Admin Only) Replaces a doctor's weekly working hours."""
+    try:
+        schedule = replace_doctor_schedule(db, doctor_id=str(doctor_id), clinic_id=current_user.clinic_id, entries=entries)
+    except ValueError as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+    log_action(db, "DOCTOR_SCHEDULE_UPDATED", user_id=current_user.id, clinic_id=current_user.clinic_id, details={"doctor_id": str(doctor_id), "windows": len(entries)})
+    return schedule
@@ -1,10 +1,12 @@
 # backend/routers/clinical_records.py
 
-from fastapi import APIRouter, Depends, HTTPException
+from datetime import datetime
+from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 import uuid
 
-from .. import crud, schemas, security, database, models
+from .. import crud, schemas, security, database, models, lab_trend_service
 
 router = APIRouter(
     prefix="/api/clinical-records",
@@ -46,3 +48,34 @@ def get_patient_complete_history(
     )
     
     return patient_history
+
+
+@router.get("/patient/{patient_id}/results", response_model=List[schemas.OrderResult])
+def get_patient_results_page(
+    patient_id: uuid.UUID,
+    skip: int = 0,
+    limit: int = Query(50, le=200),
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(security.get_current_active_user)
+):
+    """Retrieves a patient's results, newest first, one page at a time."""
+    return crud.get_patient_results(db, patient_id=str(patient_id), clinic_id=current_user.clinic_id, skip=skip, limit=limit)
+
+@router.get("/patient/{patient_id}/trend", response_model=schemas.AnalyteTrend)
+def get_analyte_trend(
+    patient_id: uuid.UUID,
+    analyte: str,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    max_points: int = Query(lab_trend_service.DEFAULT_MAX_POINTS, ge=3, le=5000),
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(security.get_current_active_user)
+):
+    """
+    Time series of one analyte (e.g. HbA1c, creatinine) for charting,
+    downsampled to at most `max_points`, with the test's reference bands.
+    """
+    return lab_trend_service.get_analyte_trend(
+        db, patient_id=str(patient_id), clinic_id=current_user.clinic_id, analyte=analyte,
+        start=start, end=end, max_points=max_points
+    )
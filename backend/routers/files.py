@@ -0,0 +1,181 @@
+# backend/routers/files.py
+
+import os
+import re
+import uuid
+from urllib.parse import quote
+
+import anyio
+from fastapi import APIRouter, BackgroundTasks, Depends, File, HTTPException, Request, UploadFile
+from fastapi.responses import Response
+from sqlalchemy.orm import Session
+
+from .. import schemas, security, database, models, file_storage, image_pipeline
+from ..audit_service import log_action
+
+router = APIRouter(
+    prefix="/api/files",
+    tags=["Files"]
+)
+
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def parse_range(header: str | None, size: int):
+    """
+    Parses a single-range `Range` header into an inclusive (start, end).
+    Returns None to serve the whole file (no header, or multiple ranges),
+    and raises ValueError for a range that cannot be satisfied.
+    """
+    if not header or "," in header:
+        return None
+    match = _RANGE.match(header.strip())
+    if not match or match.groups() == ("", ""):
+        raise ValueError("Malformed Range header.")
+    first, last = match.groups()
+    if first == "":
+        # Suffix range: the last N bytes
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start > end or start >= size:
+        raise ValueError("Range not satisfiable.")
+    return start, end
+
+
+class FileRangeResponse(Response):
+    """
+    Streams bytes [start, end] of a file. Servers that advertise the ASGI
+    `http.response.zerocopysend` extension get the file descriptor and do a
+    sendfile(); otherwise the range is read and sent in chunks.
+    """
+
+    def __init__(self, path: str, start: int, end: int, status_code: int, headers: dict, media_type: str):
+        super().__init__(status_code=status_code, headers=headers, media_type=media_type)
+        self.path = path
+        self.start = start
+        self.count = end - start + 1
+        self.headers["content-length"] = str(self.count)
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope.get("method") == "HEAD" or self.count == 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        if "http.response.zerocopysend" in scope.get("extensions", {}):
+            with open(self.path, "rb") as blob:
+                await send({
+                    "type": "http.response.zerocopysend", "file": blob.fileno(),
+                    "offset": self.start, "count": self.count, "more_body": False
+                })
+            return
+
+        remaining = self.count
+        async with await anyio.open_file(self.path, "rb") as blob:
+            await blob.seek(self.start)
+            while remaining > 0:
+                chunk = await blob.read(min(file_storage.CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+        if remaining > 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+@router.post("", response_model=schemas.StoredFile)
+def upload_file(
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(security.get_current_active_user)
+):
+    """
+    Uploads a file into the clinic's file store (streamed to disk, de-duplicated
+    by content). Images get preview and thumbnail derivatives in the background.
+    """
+    try:
+        stored = file_storage.store_file(
+            db, stream=file.file, filename=file.filename, content_type=file.content_type,
+            clinic_id=current_user.clinic_id, user_id=current_user.id
+        )
+        db.commit()
+    except ValueError as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+    if stored.content_type in image_pipeline.IMAGE_CONTENT_TYPES and stored.source_file_id is None:
+        background_tasks.add_task(image_pipeline.generate_derivatives_in_background, stored.id, current_user.clinic_id)
+    log_action(db, "FILE_UPLOADED", user_id=current_user.id, clinic_id=current_user.clinic_id, details={"file_id": str(stored.id), "sha256": stored.sha256})
+    return stored
+
+
+@router.api_route("/{file_id}", methods=["GET", "HEAD"])
+def download_file(
+    file_id: uuid.UUID,
+    request: Request,
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(security.get_current_active_user)
+):
+    """
+    Downloads a file belonging to the user's clinic. Supports single-range
+    requests (206 Partial Content) and ETag revalidation.
+    """
+    stored = file_storage.get_stored_file(db, file_id=str(file_id), clinic_id=current_user.clinic_id)
+    if not stored:
+        raise HTTPException(status_code=404, detail="File not found.")
+    return _serve_stored_file(stored, request)
+
+
+@router.api_route("/{file_id}/variants/{variant}", methods=["GET", "HEAD"])
+def download_file_variant(
+    file_id: uuid.UUID,
+    variant: str,
+    request: Request,
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(security.get_current_active_user)
+):
+    """
+    Downloads an image derivative ("preview" or "thumbnail"). When none was
+    stored, because it is still being generated or would not have been
+    smaller than the original, the original image is served instead.
+    """
+    if variant not in dict(image_pipeline.DERIVATIVES):
+        raise HTTPException(status_code=404, detail="Unknown variant.")
+    stored = file_storage.get_derivative(db, file_id=str(file_id), clinic_id=current_user.clinic_id, variant=variant)
+    if stored:
+        return _serve_stored_file(stored, request)
+    stored = file_storage.get_stored_file(db, file_id=str(file_id), clinic_id=current_user.clinic_id)
+    if not stored or stored.content_type not in image_pipeline.IMAGE_CONTENT_TYPES:
+        raise HTTPException(status_code=404, detail="File not found.")
+    # The derivative may still appear, so this URL must not be cached as immutable
+    return _serve_stored_file(stored, request, immutable=False)
+
+
+def _serve_stored_file(stored: models.StoredFile, request: Request, immutable: bool = True):
+    path = file_storage.get_storage().path_for(stored.sha256)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="File content is missing from storage.")
+
+    etag = f'"{stored.sha256}"'
+    headers = {
+        "accept-ranges": "bytes",
+        "etag": etag,
+        # Content-addressed, so a given file ID never changes
+        "cache-control": "private, max-age=31536000, immutable" if immutable else "private, no-cache",
+        "content-disposition": f"inline; filename*=UTF-8''{quote(stored.original_filename or str(stored.id))}",
+    }
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    size = stored.size_bytes
+    try:
+        byte_range = parse_range(request.headers.get("range"), size)
+    except ValueError:
+        return Response(status_code=416, headers={"content-range": f"bytes */{size}"})
+    if byte_range is None:
+        return FileRangeResponse(path, 0, size - 1, status_code=200, headers=headers, media_type=stored.content_type)
+    start, end = byte_range
+    headers["content-range"] = f"bytes {start}-{end}/{size}"
+    return FileRangeResponse(path, start, end, status_code=206, headers=headers, media_type=stored.content_type)
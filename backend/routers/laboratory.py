@@ -1,11 +1,16 @@
 # backend/routers/laboratory.py
 
+import re
+import uuid
+from datetime import date, datetime
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
 from .. import crud, schemas, security, database, models
 from ..audit_service import log_action
+from .. import lab_result_import_service, lab_analytics_service, lab_result_search_service, file_storage
 
 router = APIRouter(
     prefix="/api/lab",
@@ -29,6 +34,37 @@ def get_lab_dashboard(
     return crud.get_lab_dashboard_data(db, clinic_id=current_user.clinic_id)
 
 
+@router.get("/analytics/tat", response_model=schemas.LabTatReport)
+def get_turnaround_times(
+    start_date: date,
+    end_date: date,
+    group_by: str = "test",
+    source: str = "auto",
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(security.get_current_active_user)
+):
+    """
+    Turnaround-time percentiles (order -> collection -> result -> validation)
+    per test, department or priority. Windows up to a month are computed
+    exactly; longer ones are read from the daily histogram table.
+    """
+    try:
+        return lab_analytics_service.get_turnaround_times(
+            db, clinic_id=current_user.clinic_id, start_date=start_date, end_date=end_date,
+            group_by=group_by, source=source
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/analytics/tat/refresh")
+def refresh_turnaround_histograms(
+    db: Session = Depends(database.get_db),
+    current_admin: models.User = Depends(security.get_current_admin_user)
+):
+    """(Admin Only) Brings the daily TAT histograms up to date for days changed since the last refresh."""
+    return lab_analytics_service.refresh_daily_histograms(db, clinic_id=current_admin.clinic_id)
+
+
 @router.post("/tests", response_model=schemas.LabTest, dependencies=[Depends(security.get_current_admin_user)])
 def create_new_lab_test(
     lab_test: schemas.LabTestCreate,
@@ -36,7 +72,10 @@ def create_new_lab_test(
     current_admin: models.User = Depends(security.get_current_admin_user)
 ):
     """Creates a new lab test that can be ordered."""
-    new_lab_test = crud.create_lab_test(db=db, lab_test=lab_test, clinic_id=current_admin.clinic_id)
+    try:
+        new_lab_test = crud.create_lab_test(db=db, lab_test=lab_test, clinic_id=current_admin.clinic_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     log_action(db, "LAB_TEST_CREATED", user_id=current_admin.id, clinic_id=current_admin.clinic_id, details={"test_id": new_lab_test.id, "test_name": new_lab_test.name})
     return new_lab_test
 
@@ -50,14 +89,63 @@ def list_lab_tests(
 
 # === Lab Technician Workflow ===
 
-@router.get("/worklist", response_model=List[schemas.LabOrder])
+@router.get("/worklist", response_model=List[schemas.LabWorklistItem])
 def get_lab_worklist(
+    status: List[str] = Query(['Pending']),
+    department: Optional[str] = None,
+    priority: Optional[str] = None,
+    skip: int = 0,
+    limit: int = Query(100, le=500),
     db: Session = Depends(database.get_db),
     current_user: models.User = Depends(security.get_current_active_user)
 ):
-    """Retrieves pending lab orders for the lab technician's clinic."""
+    """
+    Retrieves lab orders (pending by default) for the lab technician's clinic,
+    most urgent first. Orders another technician has claimed are not listed.
+    """
     clinic_id = current_user.clinic_id
-    return crud.get_pending_lab_orders(db, clinic_id=clinic_id)
+    return crud.get_lab_worklist(
+        db, clinic_id=clinic_id, statuses=status, department=department,
+        priority=priority, skip=skip, limit=limit, user_id=current_user.id
+    )
+
+@router.post("/worklist/claim", response_model=List[schemas.LabOrder])
+def claim_worklist_orders(
+    claim: schemas.LabOrderClaimRequest,
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(security.get_current_active_user)
+):
+    """
+    Claims the next orders for the current technician (optionally for one
+    department or priority). Claimed orders are hidden from other benches
+    until released or until the lease expires.
+    """
+    orders = crud.claim_lab_orders(
+        db, clinic_id=current_user.clinic_id, user_id=current_user.id, count=claim.count,
+        department=claim.department, priority=claim.priority, lease_minutes=claim.lease_minutes
+    )
+    if orders:
+        log_action(db, "LAB_ORDERS_CLAIMED", user_id=current_user.id, clinic_id=current_user.clinic_id, details={"order_ids": [str(o.id) for o in orders]})
+    return orders
+
+@router.get("/worklist/mine", response_model=List[schemas.LabOrder])
+def get_my_claimed_orders(
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(security.get_current_active_user)
+):
+    """Retrieves the orders currently claimed by the logged-in technician."""
+    return crud.get_claimed_lab_orders(db, clinic_id=current_user.clinic_id, user_id=current_user.id)
+
+@router.post("/worklist/release")
+def release_worklist_orders(
+    release: schemas.LabOrderIdList,
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(security.get_current_active_user)
+):
+    """Returns claimed orders to the shared worklist."""
+    released = crud.release_lab_orders(db, clinic_id=current_user.clinic_id, user_id=current_user.id, order_ids=release.order_ids)
+    log_action(db, "LAB_ORDERS_RELEASED", user_id=current_user.id, clinic_id=current_user.clinic_id, details={"order_ids": [str(i) for i in release.order_ids], "released": released})
+    return {"status": "success", "released": released}
 
 @router.post("/collect-sample", response_model=schemas.LabSample)
 def collect_sample(
@@ -66,13 +154,45 @@ def collect_sample(
     current_user: models.User = Depends(security.get_current_active_user)
 ):
     """Records the collection of a sample for a lab order."""
-    sample = crud.collect_lab_sample(db, sample_data=sample_data, clinic_id=current_user.clinic_id, user_id=current_user.id)
+    try:
+        sample = crud.collect_lab_sample(db, sample_data=sample_data, clinic_id=current_user.clinic_id, user_id=current_user.id)
+    except crud.LabOrderClaimedError as e:
+        db.rollback()
+        raise HTTPException(status_code=409, detail=str(e))
     # You would also update the LabOrder status here in a real app
     log_action(db, "SAMPLE_COLLECTED", user_id=current_user.id, clinic_id=current_user.clinic_id, details={"sample_id": str(sample.id)})
     return sample
 
+@router.post("/collect-samples", response_model=schemas.LabBatchResult)
+def collect_samples_batch(
+    batch: schemas.LabSampleBatchCreate,
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(security.get_current_active_user)
+):
+    """Records many collected samples at once (e.g., a phlebotomy round) and reports per-item outcomes."""
+    result = crud.collect_lab_samples_batch(db, samples=batch.samples, clinic_id=current_user.clinic_id, user_id=current_user.id)
+    log_action(db, "SAMPLES_COLLECTED_BATCH", user_id=current_user.id, clinic_id=current_user.clinic_id, details={"succeeded": result["succeeded"], "failed": result["failed"]})
+    return result
+
+@router.post("/orders/transition", response_model=schemas.LabBatchResult)
+def transition_orders(
+    transition: schemas.LabOrderStatusTransition,
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(security.get_current_active_user)
+):
+    """Moves many lab orders to a new workflow status, reporting orders that could not move."""
+    try:
+        result = crud.transition_lab_orders(
+            db, order_ids=transition.order_ids, to_status=transition.to_status,
+            clinic_id=current_user.clinic_id, user_id=current_user.id, rejection_reason=transition.rejection_reason
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    log_action(db, "LAB_ORDERS_TRANSITIONED", user_id=current_user.id, clinic_id=current_user.clinic_id, details={"to_status": transition.to_status, "succeeded": result["succeeded"], "failed": result["failed"]})
+    return result
+
 @router.post("/upload-result", response_model=schemas.OrderResult)
-async def upload_lab_result(
+def upload_lab_result(
     # We now accept data as form fields instead of a single JSON body
     result_data_json: str = Form(...),
     report_file: Optional[UploadFile] = File(None),
@@ -95,21 +215,116 @@ async def upload_lab_result(
     if not result_data.lab_order_id:
         raise HTTPException(status_code=400, detail="A lab_order_id is required.")
 
-    # --- File Upload Logic ---
-    file_url = None
+    # Refuse before anything is written to file storage; the order stays locked until commit
+    try:
+        crud.ensure_lab_order_not_claimed_by_other(db, result_data.lab_order_id, clinic_id=clinic_id, user_id=user_id)
+    except crud.LabOrderClaimedError as e:
+        db.rollback()
+        raise HTTPException(status_code=409, detail=str(e))
+
     if report_file:
-        # In a real system, this would call a function to upload the file to Azure Blob Storage
-        # and return the secure URL.
-        # file_url = await file_storage_service.upload_file(report_file, clinic_id)
-        # For now, we'll just use the filename as a placeholder.
-        file_url = f"https://your-storage-account.blob.core.windows.net/reports/{report_file.filename}"
-        result_data.report_file_url = file_url
-    # --- End File Upload Logic ---
-
-    result = crud.create_order_result(db, result_data=result_data, clinic_id=clinic_id, user_id=user_id)
+        try:
+            stored = file_storage.store_file(
+                db, stream=report_file.file, filename=report_file.filename, content_type=report_file.content_type,
+                clinic_id=clinic_id, user_id=user_id
+            )
+        except ValueError as e:
+            db.rollback()
+            raise HTTPException(status_code=400, detail=str(e))
+        result_data.report_file_url = file_storage.file_url(stored)
+
+    try:
+        result = crud.create_order_result(db, result_data=result_data, clinic_id=clinic_id, user_id=user_id)
+    except crud.LabOrderClaimedError as e:
+        db.rollback()
+        raise HTTPException(status_code=409, detail=str(e))
     log_action(db, "LAB_RESULT_UPLOADED", user_id=user_id, clinic_id=clinic_id, details={"result_id": str(result.id)})
     return result
 
+@router.post("/results/import", response_model=schemas.LabResultImportReport)
+def import_analyzer_results(
+    file: UploadFile = File(...),
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(security.get_current_active_user)
+):
+    """
+    Imports an analyzer result export (.csv, or an ASTM-style .astm/.txt file)
+    and returns a reconciliation report of records that could not be matched.
+    """
+    filename = (file.filename or "").lower()
+    file_format = "csv" if filename.endswith(".csv") else "astm"
+    try:
+        report = lab_result_import_service.import_results(
+            db, stream=file.file, file_format=file_format,
+            clinic_id=current_user.clinic_id, user_id=current_user.id
+        )
+    except (ValueError, UnicodeDecodeError) as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+
+    log_action(db, "LAB_RESULTS_IMPORTED", user_id=current_user.id, clinic_id=current_user.clinic_id, details={
+        "filename": file.filename, "results_created": report["results_created"],
+        "unmatched": len(report["unmatched"]), "ambiguous": len(report["ambiguous"]),
+        "not_ready": len(report["not_ready"]), "invalid": len(report["invalid"])
+    })
+    return report
+
+def _result_search_filters(
+    op: Optional[str] = Query(None, description="lt, le, gt, ge, eq or between"),
+    value: Optional[float] = None,
+    value_max: Optional[float] = None,
+    lab_test_id: Optional[int] = None,
+    doctor_id: Optional[uuid.UUID] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    days: Optional[int] = Query(None, ge=1, le=3650)
+) -> dict:
+    try:
+        lab_result_search_service.validate_comparison(op, value, value_max)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "op": op, "value": value, "value_max": value_max, "lab_test_id": lab_test_id,
+        "doctor_id": doctor_id, "start": start, "end": end, "days": days
+    }
+
+@router.get("/results/search", response_model=schemas.LabResultSearchPage)
+def search_lab_results(
+    analyte: str,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    filters: dict = Depends(_result_search_filters),
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(security.get_current_active_user)
+):
+    """
+    Searches the clinic's results by analyte value, e.g. `analyte=Hb&op=lt&value=7&days=30`,
+    newest first. Pass `next_cursor` back as `cursor` for the following page.
+    """
+    try:
+        return lab_result_search_service.search_results(
+            db, clinic_id=current_user.clinic_id, analyte=analyte, cursor=cursor, limit=limit, **filters
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/results/search/export")
+def export_lab_results(
+    analyte: str,
+    filters: dict = Depends(_result_search_filters),
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(security.get_current_active_user)
+):
+    """Streams every result matching the search as CSV."""
+    log_action(db, "LAB_RESULTS_EXPORTED", user_id=current_user.id, clinic_id=current_user.clinic_id, details={
+        "analyte": analyte, **{key: str(value) for key, value in filters.items() if value is not None}
+    })
+    return StreamingResponse(
+        lab_result_search_service.export_results_csv(clinic_id=str(current_user.clinic_id), analyte=analyte, **filters),
+        media_type="text/csv",
+        headers={"content-disposition": f'attachment; filename="lab-results-{re.sub(r"[^A-Za-z0-9_-]", "_", analyte)}.csv"'}
+    )
+
 @router.get("/radiology-tests", response_model=List[schemas.RadiologyTest])
 def list_radiology_tests(
     db: Session = Depends(database.get_db),
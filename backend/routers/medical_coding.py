@@ -1,10 +1,11 @@
 # backend/routers/medical_coding.py
 
+import uuid
 from typing import List
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 
-from .. import crud, schemas, security, database, models
+from .. import crud, schemas, security, database, models, coding_service
 from ..audit_service import log_action
 
 router = APIRouter(
@@ -18,20 +19,21 @@ router = APIRouter(
 @router.get("/search-icd10/{search_term}", response_model=List[schemas.ICD10Code])
 def search_for_icd10_code(
     search_term: str,
+    limit: int = Query(20, ge=1, le=100),
     db: Session = Depends(database.get_db)
 ):
-    """Searches for ICD-10 diagnosis codes."""
-    return crud.search_icd10_codes(db, search_term=search_term)
+    """Searches for ICD-10 diagnosis codes by code prefix or description, best matches first."""
+    return crud.search_icd10_codes(db, search_term=search_term, limit=limit)
 
 @router.post("/diagnoses", response_model=schemas.AppointmentDiagnosis)
 def add_diagnosis(
     diagnosis_data: schemas.AppointmentDiagnosisCreate,
     db: Session = Depends(database.get_db),
-    current_user_data: dict = Depends(security.get_current_active_user)
+    current_user: models.User = Depends(security.get_current_active_user)
 ):
     """Adds a diagnosis to a patient's appointment record."""
-    clinic_id = current_user_data['clinic_id']
-    doctor_id = current_user_data['user_id']
+    clinic_id = current_user.clinic_id
+    doctor_id = current_user.id
     diagnosis = crud.add_diagnosis_to_appointment(
         db, diagnosis_data=diagnosis_data, clinic_id=clinic_id, doctor_id=doctor_id
     )
@@ -55,11 +57,11 @@ def search_for_cpt_code(
 def add_procedure(
     procedure_data: schemas.AppointmentProcedureCreate,
     db: Session = Depends(database.get_db),
-    current_user_data: dict = Depends(security.get_current_active_user)
+    current_user: models.User = Depends(security.get_current_active_user)
 ):
     """Adds a procedure to a patient's appointment record for billing."""
-    clinic_id = current_user_data['clinic_id']
-    doctor_id = current_user_data['user_id']
+    clinic_id = current_user.clinic_id
+    doctor_id = current_user.id
     procedure = crud.add_procedure_to_appointment(
         db, procedure_data=procedure_data, clinic_id=clinic_id, doctor_id=doctor_id
     )
@@ -68,3 +70,42 @@ def add_procedure(
         details={"procedure_id": str(procedure.id), "appointment_id": str(procedure.appointment_id)}
     )
     return procedure
+
+# === Batch Coding Endpoints ===
+
+@router.post("/validate", response_model=schemas.CodeValidationResponse)
+def validate_codes(
+    request: schemas.CodeValidationRequest,
+    db: Session = Depends(database.get_db)
+):
+    """Validates up to 500 ICD-10 and 500 CPT codes at once, e.g. while preparing a claim."""
+    return coding_service.validate_codes(db, icd10=request.icd10, cpt=request.cpt)
+
+@router.post("/appointments/{appointment_id}/codes", response_model=schemas.AppointmentCodesResult)
+def attach_appointment_codes(
+    appointment_id: uuid.UUID,
+    codes: schemas.AppointmentCodesCreate,
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(security.get_current_active_user)
+):
+    """Adds several diagnoses and procedures to an appointment in one call; already attached codes are skipped."""
+    try:
+        result = coding_service.attach_codes_to_appointment(
+            db, appointment_id=str(appointment_id), clinic_id=current_user.clinic_id, doctor_id=current_user.id,
+            diagnoses=codes.diagnoses, procedures=codes.procedures
+        )
+    except ValueError as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+    if result is None:
+        db.rollback()
+        raise HTTPException(status_code=404, detail="Appointment not found.")
+    log_action(
+        db, "APPOINTMENT_CODES_ADDED", user_id=current_user.id, clinic_id=current_user.clinic_id,
+        details={
+            "appointment_id": str(appointment_id),
+            "diagnoses": [code["code"] for code in result["diagnoses"]],
+            "procedures": [code["code"] for code in result["procedures"]]
+        }
+    )
+    return result
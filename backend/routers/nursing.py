@@ -1,8 +1,9 @@
 # backend/routers/nursing.py
 
 import uuid
+from datetime import date, datetime
 from typing import List
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
 from sqlalchemy.orm import Session
 
 from .. import crud, schemas, security, database, models
@@ -15,14 +16,24 @@ router = APIRouter(
 
 @router.get("/queue", response_model=List[schemas.Appointment])
 def get_nursing_queue(
+    day: date | None = None,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    upcoming: bool = False,
+    skip: int = 0,
+    limit: int = Query(200, le=500),
     db: Session = Depends(database.get_db),
     current_user: models.User = Depends(security.get_current_active_user)
 ):
     """
     Retrieves the patient queue for the nursing station.
+    Pass `day`, a `start`/`end` range or `upcoming=true` to limit the window.
     """
     clinic_id = current_user.clinic_id
-    return crud.get_scheduled_appointments(db, clinic_id=clinic_id)
+    return crud.get_scheduled_appointments(
+        db, clinic_id=clinic_id, day=day, start=start, end=end,
+        upcoming=upcoming, skip=skip, limit=limit
+    )
 
 @router.post("/triage", response_model=schemas.TriageRecord)
 def record_triage(
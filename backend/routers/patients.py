@@ -1,11 +1,13 @@
 # backend/routers/patients.py
 # backend/routers/patients.py
 
+import uuid
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, UploadFile, File
 from sqlalchemy.orm import Session
 
-from .. import crud, schemas, security, database, models
+from .. import crud, schemas, security, database, models, patient_import_service, duplicate_patient_service
+from ..audit_service import log_action
 
 router = APIRouter(
     prefix="/api/patients",
@@ -31,12 +33,15 @@ def search_for_patients(
 @router.post("/", response_model=schemas.Patient)
 def create_new_patient(
     patient: schemas.PatientCreate,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(database.get_db),
     current_user: models.User = Depends(security.get_current_active_user)
 ):
     """Creates a new patient record for the logged-in user's clinic."""
     clinic_id = current_user.clinic_id
-    return crud.create_patient(db=db, patient=patient, clinic_id=clinic_id)
+    new_patient = crud.create_patient(db=db, patient=patient, clinic_id=clinic_id)
+    background_tasks.add_task(duplicate_patient_service.scan_clinic_in_background, clinic_id)
+    return new_patient
 
 @router.get("/", response_model=List[schemas.Patient])
 def read_patients_for_clinic(
@@ -47,3 +52,80 @@ def read_patients_for_clinic(
     """Retrieves a list of all patients for the logged-in user's clinic."""
     clinic_id = current_user.clinic_id
     return crud.get_patients_by_clinic(db, clinic_id=clinic_id, skip=skip, limit=limit)
+
+@router.post("/import", response_model=schemas.PatientImportReport)
+def import_patients_file(
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    db: Session = Depends(database.get_db),
+    current_admin: models.User = Depends(security.get_current_admin_user)
+):
+    """
+    Bulk-imports patients from a CSV or NDJSON (.ndjson/.jsonl) file.
+    Returns a per-row report of rejected rows. Requires Clinic Admin privileges.
+    """
+    filename = (file.filename or "").lower()
+    if filename.endswith(".csv"):
+        file_format = "csv"
+    elif filename.endswith((".ndjson", ".jsonl")):
+        file_format = "ndjson"
+    else:
+        raise HTTPException(status_code=400, detail="Invalid file type. Please upload a CSV or NDJSON file.")
+
+    try:
+        report = patient_import_service.import_patients(
+            db, stream=file.file, file_format=file_format, clinic_id=current_admin.clinic_id
+        )
+    except (ValueError, UnicodeDecodeError) as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+
+    log_action(db, "PATIENT_BULK_IMPORT", user_id=current_admin.id, clinic_id=current_admin.clinic_id, details={
+        "filename": file.filename, "imported": report["imported"],
+        "duplicates": report["duplicates"], "invalid": report["invalid"]
+    })
+    background_tasks.add_task(duplicate_patient_service.scan_clinic_in_background, current_admin.clinic_id)
+    return report
+
+# === Duplicate Patient Review (for Clinic Admins) ===
+
+@router.get("/duplicates", response_model=List[schemas.PatientDuplicateCandidate])
+def list_duplicate_candidates(
+    status: str = "Open",
+    skip: int = 0, limit: int = 50,
+    db: Session = Depends(database.get_db),
+    current_admin: models.User = Depends(security.get_current_admin_user)
+):
+    """Lists scored pairs of possibly-duplicate patients, best matches first."""
+    return duplicate_patient_service.get_duplicate_candidates(
+        db, clinic_id=current_admin.clinic_id, status=status, skip=skip, limit=limit
+    )
+
+@router.post("/duplicates/scan")
+def trigger_duplicate_scan(
+    background_tasks: BackgroundTasks,
+    current_admin: models.User = Depends(security.get_current_admin_user)
+):
+    """Queues an incremental duplicate scan over recently created or updated patients."""
+    background_tasks.add_task(duplicate_patient_service.scan_clinic_in_background, current_admin.clinic_id)
+    return {"status": "queued"}
+
+@router.patch("/duplicates/{candidate_id}", response_model=schemas.PatientDuplicateCandidate)
+def review_duplicate_candidate(
+    candidate_id: uuid.UUID,
+    payload: schemas.UpdateDuplicateCandidateStatus,
+    db: Session = Depends(database.get_db),
+    current_admin: models.User = Depends(security.get_current_admin_user)
+):
+    """Marks a candidate pair as a confirmed duplicate or dismisses it."""
+    candidate = db.query(models.PatientDuplicateCandidate).filter(
+        models.PatientDuplicateCandidate.id == candidate_id,
+        models.PatientDuplicateCandidate.clinic_id == current_admin.clinic_id
+    ).first()
+    if not candidate:
+        raise HTTPException(status_code=404, detail="Duplicate candidate not found.")
+    candidate.status = payload.status
+    db.commit()
+    db.refresh(candidate)
+    log_action(db, "DUPLICATE_CANDIDATE_REVIEWED", user_id=current_admin.id, clinic_id=current_admin.clinic_id, details={"candidate_id": str(candidate_id), "status": payload.status})
+    return candidate
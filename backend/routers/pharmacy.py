@@ -1,12 +1,12 @@
 # backend/routers/pharmacy.py
 
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+import uuid
+from datetime import date
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query
 from sqlalchemy.orm import Session
-import csv
-import io
 
-from .. import crud, schemas, security, database, models
+from .. import crud, schemas, security, database, models, medication_import_service, inventory_service, reorder_service
 from ..audit_service import log_action
 
 router = APIRouter(
@@ -36,51 +36,118 @@ def list_medications(
     clinic_id = current_user.clinic_id
     return crud.get_medications_by_clinic(db, clinic_id=clinic_id)
 
-@router.post("/medications/upload-csv")
-async def upload_medications_csv(
+@router.post("/medications/upload-csv", response_model=schemas.MedicationImportReport)
+def upload_medications_csv(
     file: UploadFile = File(...),
     db: Session = Depends(database.get_db),
     current_admin: models.User = Depends(security.get_current_admin_user)
 ):
     """
-    Uploads a CSV file to bulk-add medications to the inventory.
-    Requires Clinic Admin privileges.
+    Uploads a medication catalog CSV into the inventory, updating medications
+    that already exist (same name and manufacturer) and adding the rest.
+    Returns a per-row report of rejected rows. Requires Clinic Admin privileges.
     """
     clinic_id = current_admin.clinic_id
     if not file.filename or not file.filename.endswith('.csv'):
         raise HTTPException(status_code=400, detail="Invalid file type. Please upload a CSV.")
 
-    contents = await file.read()
-    buffer = io.StringIO(contents.decode('utf-8'))
-    csv_reader = csv.DictReader(buffer)
-    
-    medications_to_add = []
-    for row in csv_reader:
-        medications_to_add.append(
-            models.Medication(
-                name=row['name'],
-                manufacturer=row.get('manufacturer'),
-                stock_quantity=int(row['stock_quantity']),
-                unit_price=float(row['unit_price']),
-                clinic_id=clinic_id
-            )
+    try:
+        report = medication_import_service.import_medications(db, stream=file.file, clinic_id=clinic_id, user_id=current_admin.id)
+    except (ValueError, UnicodeDecodeError) as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+
+    log_action(db, "INVENTORY_BULK_UPLOAD", user_id=current_admin.id, clinic_id=clinic_id, details={
+        "filename": file.filename, "inserted": report["inserted"], "updated": report["updated"],
+        "duplicates": report["duplicates"], "invalid": report["invalid"]
+    })
+    return report
+
+# === Lots & Stock Ledger ===
+@router.get("/inventory/lots", response_model=List[schemas.MedicationLot])
+def list_medication_lots(
+    medication_id: Optional[int] = None,
+    include_empty: bool = False,
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(security.get_current_active_user)
+):
+    """Current stock per lot, earliest expiry first."""
+    return inventory_service.get_on_hand(db, clinic_id=current_user.clinic_id, medication_id=medication_id, include_empty=include_empty)
+
+@router.post("/inventory/receipts")
+def receive_medication_stock(
+    receipt: schemas.StockReceiptCreate,
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(security.get_current_active_user)
+):
+    """Books a delivery of one or more medication lots into stock."""
+    try:
+        count = inventory_service.receive_stock(
+            db, clinic_id=current_user.clinic_id, user_id=current_user.id, receipts=[item.dict() for item in receipt.items]
         )
-    
-    db.add_all(medications_to_add)
-    db.commit()
-    
-    log_action(db, "INVENTORY_BULK_UPLOAD", user_id=current_admin.id, clinic_id=clinic_id, details={"count": len(medications_to_add)})
-    return {"message": f"Successfully added {len(medications_to_add)} medications."}
+        db.commit()
+    except ValueError as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+    log_action(db, "INVENTORY_RECEIVED", user_id=current_user.id, clinic_id=current_user.clinic_id, details={"lines": count})
+    return {"message": f"Received {count} lot line(s)."}
+
+@router.post("/inventory/lots/{lot_id}/adjust")
+def adjust_medication_lot(
+    lot_id: int,
+    adjustment: schemas.LotAdjustmentCreate,
+    db: Session = Depends(database.get_db),
+    current_admin: models.User = Depends(security.get_current_admin_user)
+):
+    """(Admin Only) Corrects a lot's stock by a signed quantity, e.g. after a count."""
+    try:
+        inventory_service.adjust_lot(
+            db, clinic_id=current_admin.clinic_id, user_id=current_admin.id,
+            lot_id=lot_id, quantity=adjustment.quantity, reason=adjustment.reason
+        )
+        db.commit()
+    except ValueError as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+    log_action(db, "INVENTORY_ADJUSTED", user_id=current_admin.id, clinic_id=current_admin.clinic_id, details={"lot_id": lot_id, "quantity": adjustment.quantity, "reason": adjustment.reason})
+    return {"message": "Lot adjusted."}
+
+@router.get("/inventory/low-stock", response_model=List[schemas.LowStockItem])
+def get_low_stock_medications(
+    limit: int = Query(500, ge=1, le=5000),
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(security.get_current_active_user)
+):
+    """
+    Medications at or below their reorder point, least days of cover first,
+    based on each medication's running consumption rate.
+    """
+    return reorder_service.get_low_stock(db, clinic_id=current_user.clinic_id, limit=limit)
+
+@router.get("/inventory/stock-at", response_model=List[schemas.StockAtRow])
+def get_stock_on_date(
+    as_of: date,
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(security.get_current_active_user)
+):
+    """Stock per lot as it stood at the end of `as_of`, from the nearest snapshot plus later movements."""
+    return inventory_service.get_stock_at(db, clinic_id=current_user.clinic_id, as_of=as_of)
 
 # === Pharmacist Workflow ===
 @router.get("/prescriptions/proposed", response_model=List[schemas.Prescription])
 def get_proposed_prescriptions_queue(
+    patient_id: Optional[uuid.UUID] = None,
+    doctor_id: Optional[uuid.UUID] = None,
+    skip: int = 0,
+    limit: int = Query(100, ge=1, le=500),
     db: Session = Depends(database.get_db),
     current_user: models.User = Depends(security.get_current_active_user)
 ):
-    """Retrieves the queue of all 'Proposed' prescriptions for the clinic."""
+    """Retrieves a page of the clinic's 'Proposed' prescriptions, optionally for one patient or doctor."""
     clinic_id = current_user.clinic_id
-    return crud.get_proposed_prescriptions(db, clinic_id=clinic_id)
+    return crud.get_proposed_prescriptions(
+        db, clinic_id=clinic_id, patient_id=patient_id, doctor_id=doctor_id, skip=skip, limit=limit
+    )
 
 @router.post("/process-sale", response_model=schemas.PharmacySale)
 def process_a_pharmacy_sale(
@@ -97,4 +164,5 @@ def process_a_pharmacy_sale(
         log_action(db, "PHARMACY_SALE_PROCESSED", user_id=pharmacist_id, clinic_id=clinic_id, details={"sale_id": str(sale.id), "invoice_id": str(sale.invoice_id)})
         return sale
     except ValueError as e:
+        db.rollback()
         raise HTTPException(status_code=400, detail=str(e))
@@ -1,10 +1,10 @@
 # backend/routers/radiology.py
 
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException
+from typing import List, Optional
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, UploadFile, File, Form
 from sqlalchemy.orm import Session
 
-from .. import crud, schemas, security, database, models
+from .. import crud, schemas, security, database, models, file_storage, image_pipeline
 from ..audit_service import log_action
 
 router = APIRouter(
@@ -51,19 +51,41 @@ def get_radiology_worklist(
 
 @router.post("/upload-report", response_model=schemas.OrderResult)
 def upload_radiology_report(
-    result_data: schemas.OrderResultCreate,
+    background_tasks: BackgroundTasks,
+    result_data_json: str = Form(...),
+    report_file: Optional[UploadFile] = File(None),
     db: Session = Depends(database.get_db),
     current_user: models.User = Depends(security.get_current_active_user)
 ):
     """
-    Uploads the result/report for a completed radiology order.
+    Uploads the result/report for a completed radiology order, with an
+    optional report file (PDF, image) kept in the clinic's file store.
+    Preview and thumbnail derivatives of images are generated after the response.
     """
     clinic_id = current_user.clinic_id
     user_id = current_user.id
-    
+
+    try:
+        result_data = schemas.OrderResultCreate.parse_raw(result_data_json)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid result data format.")
+
     if not result_data.radiology_order_id:
         raise HTTPException(status_code=400, detail="A radiology_order_id is required.")
 
+    if report_file:
+        try:
+            stored = file_storage.store_file(
+                db, stream=report_file.file, filename=report_file.filename, content_type=report_file.content_type,
+                clinic_id=clinic_id, user_id=user_id
+            )
+        except ValueError as e:
+            db.rollback()
+            raise HTTPException(status_code=400, detail=str(e))
+        result_data.report_file_url = file_storage.file_url(stored)
+        if stored.content_type in image_pipeline.IMAGE_CONTENT_TYPES:
+            background_tasks.add_task(image_pipeline.generate_derivatives_in_background, stored.id, clinic_id)
+
     result = crud.create_order_result(db, result_data=result_data, clinic_id=clinic_id, user_id=user_id)
     log_action(db, "RADIOLOGY_REPORT_UPLOADED", user_id=user_id, clinic_id=clinic_id, details={"result_id": str(result.id), "order_id": str(result.radiology_order_id)})
     return result
@@ -0,0 +1,241 @@
+# backend/scheduling_service.py
+
+import bisect
+import os
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Tuple
+from zoneinfo import ZoneInfo
+
+from dotenv import load_dotenv
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from . import models, schemas
+
+# Load environment variables from the .env file
+load_dotenv()
+
+# Working hours are stored as clinic-local wall clock times.
+CLINIC_TIMEZONE = ZoneInfo(os.getenv("CLINIC_TIMEZONE", "UTC"))
+DEFAULT_SLOT_MINUTES = 15
+MAX_AVAILABILITY_DAYS = 31
+MAX_SERIES_APPOINTMENTS = 104
+INACTIVE_APPOINTMENT_STATUSES = ('Cancelled', 'Rejected')
+
+
+class SlotUnavailableError(ValueError):
+    """Raised when a requested time is outside working hours or already booked."""
+
+
+# --- Working Hours ---
+
+def get_doctor_schedule(db: Session, doctor_id: str, clinic_id: str):
+    return (
+        db.query(models.DoctorSchedule)
+        .filter(
+            models.DoctorSchedule.doctor_id == doctor_id,
+            models.DoctorSchedule.clinic_id == clinic_id
+        )
+        .order_by(models.DoctorSchedule.weekday, models.DoctorSchedule.start_time)
+        .all()
+    )
+
+def replace_doctor_schedule(db: Session, doctor_id: str, clinic_id: str, entries: List[schemas.DoctorScheduleCreate]):
+    """Replaces a doctor's weekly working hours after checking windows do not overlap."""
+    doctor = db.query(models.User).filter(models.User.id == doctor_id, models.User.clinic_id == clinic_id).first()
+    if not doctor:
+        raise ValueError("Doctor not found in this clinic.")
+
+    by_weekday: Dict[int, list] = {}
+    for entry in entries:
+        if entry.start_time >= entry.end_time:
+            raise ValueError(f"Working hours on weekday {entry.weekday} must end after they start.")
+        by_weekday.setdefault(entry.weekday, []).append(entry)
+    for weekday, windows in by_weekday.items():
+        windows.sort(key=lambda w: w.start_time)
+        for earlier, later in zip(windows, windows[1:]):
+            if later.start_time < earlier.end_time:
+                raise ValueError(f"Working hours overlap on weekday {weekday}.")
+
+    db.query(models.DoctorSchedule).filter(
+        models.DoctorSchedule.doctor_id == doctor_id,
+        models.DoctorSchedule.clinic_id == clinic_id
+    ).delete(synchronize_session=False)
+    db.add_all([
+        models.DoctorSchedule(**entry.dict(), doctor_id=doctor_id, clinic_id=clinic_id)
+        for entry in entries
+    ])
+    db.commit()
+    return get_doctor_schedule(db, doctor_id=doctor_id, clinic_id=clinic_id)
+
+
+# --- Slot Computation ---
+
+def _to_local(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value.replace(tzinfo=CLINIC_TIMEZONE)
+    return value.astimezone(CLINIC_TIMEZONE)
+
+def _day_slots(day: date, schedules) -> List[Tuple[datetime, timedelta]]:
+    """Slot start times (clinic-local) and lengths for one calendar day, in order."""
+    slots = []
+    for schedule in schedules:
+        if schedule.weekday != day.weekday():
+            continue
+        length = timedelta(minutes=schedule.slot_minutes or DEFAULT_SLOT_MINUTES)
+        cursor = datetime.combine(day, schedule.start_time, CLINIC_TIMEZONE)
+        window_end = datetime.combine(day, schedule.end_time, CLINIC_TIMEZONE)
+        while cursor + length <= window_end:
+            slots.append((cursor, length))
+            cursor += length
+    slots.sort(key=lambda slot: slot[0])
+    return slots
+
+def _slot_window_at(moment: datetime, schedules) -> Tuple[datetime, timedelta] | None:
+    """
+    (Working-hours window start, slot length) for the window containing
+    `moment`, or None outside working hours. Slots start at the window start
+    and every slot length after it.
+    """
+    local = _to_local(moment)
+    for schedule in schedules:
+        if schedule.weekday != local.weekday():
+            continue
+        length = timedelta(minutes=schedule.slot_minutes or DEFAULT_SLOT_MINUTES)
+        window_start = datetime.combine(local.date(), schedule.start_time, CLINIC_TIMEZONE)
+        window_end = datetime.combine(local.date(), schedule.end_time, CLINIC_TIMEZONE)
+        if window_start <= local and local + length <= window_end:
+            return window_start, length
+    return None
+
+def _booked_times(db: Session, doctor_id: str, clinic_id: str, start: datetime, end: datetime) -> List[datetime]:
+    rows = db.query(models.Appointment.appointment_time).filter(
+        models.Appointment.clinic_id == clinic_id,
+        models.Appointment.doctor_id == doctor_id,
+        models.Appointment.appointment_time >= start,
+        models.Appointment.appointment_time < end,
+        models.Appointment.status.notin_(INACTIVE_APPOINTMENT_STATUSES)
+    ).order_by(models.Appointment.appointment_time).all()
+    return [_to_local(appointment_time) for appointment_time, in rows]
+
+def get_available_slots(db: Session, doctor_id: str, clinic_id: str, start_date: date, end_date: date) -> List[dict]:
+    """
+    Returns the free slots per day for a doctor between two dates (inclusive).
+    Each day's slots are tracked as an occupancy bitmap (bit i = slot i taken),
+    filled from a single query of the doctor's bookings in the range.
+    """
+    if end_date < start_date:
+        raise ValueError("end_date must not be before start_date.")
+    if (end_date - start_date).days >= MAX_AVAILABILITY_DAYS:
+        raise ValueError(f"Availability can be requested for at most {MAX_AVAILABILITY_DAYS} days at a time.")
+
+    schedules = get_doctor_schedule(db, doctor_id=doctor_id, clinic_id=clinic_id)
+    if not schedules:
+        return []
+    longest_slot = timedelta(minutes=max(s.slot_minutes or DEFAULT_SLOT_MINUTES for s in schedules))
+    range_start = datetime.combine(start_date, time.min, CLINIC_TIMEZONE)
+    range_end = datetime.combine(end_date + timedelta(days=1), time.min, CLINIC_TIMEZONE)
+    booked = _booked_times(db, doctor_id, clinic_id, range_start - longest_slot, range_end)
+    now = datetime.now(CLINIC_TIMEZONE)
+
+    availability = []
+    day = start_date
+    while day <= end_date:
+        slots = _day_slots(day, schedules)
+        if slots:
+            starts = [slot_start for slot_start, _ in slots]
+            occupied = 0
+            first = bisect.bisect_left(booked, starts[0] - longest_slot)
+            last = bisect.bisect_left(booked, starts[-1] + slots[-1][1])
+            for booked_start in booked[first:last]:
+                # Mark every slot this booking overlaps
+                i = max(bisect.bisect_right(starts, booked_start) - 1, 0)
+                booked_end = booked_start + slots[i][1]
+                while i < len(slots) and slots[i][0] < booked_end:
+                    if booked_start < slots[i][0] + slots[i][1]:
+                        occupied |= 1 << i
+                    i += 1
+            free = [
+                slot_start for i, (slot_start, _) in enumerate(slots)
+                if not occupied >> i & 1 and slot_start > now
+            ]
+            availability.append({"date": day, "slots": free})
+        day += timedelta(days=1)
+    return availability
+
+
+def expand_recurrence(rule: schemas.RecurrenceRule) -> List[datetime]:
+    """
+    Expands a weekly recurrence into concrete clinic-local appointment times,
+    e.g. every Monday/Wednesday/Friday at 09:00 for 12 sessions.
+    """
+    if rule.count is None and rule.until is None:
+        raise ValueError("A recurrence needs either a count or an until date.")
+    first = _to_local(rule.start)
+    weekdays = sorted(set(rule.weekdays or [first.weekday()]))
+    week_start = first.date() - timedelta(days=first.weekday())
+    # Generate one past the cap so an oversized series is rejected, not truncated
+    limit = min(rule.count or MAX_SERIES_APPOINTMENTS + 1, MAX_SERIES_APPOINTMENTS + 1)
+
+    occurrences = []
+    while len(occurrences) < limit:
+        for weekday in weekdays:
+            day = week_start + timedelta(days=weekday)
+            if day < first.date():
+                continue
+            if (rule.until is not None and day > rule.until) or len(occurrences) == limit:
+                break
+            occurrences.append(datetime.combine(day, first.time(), CLINIC_TIMEZONE))
+        else:
+            week_start += timedelta(weeks=rule.interval_weeks)
+            continue
+        break
+    if len(occurrences) > MAX_SERIES_APPOINTMENTS:
+        raise ValueError(f"A series can contain at most {MAX_SERIES_APPOINTMENTS} appointments.")
+    return occurrences
+
+
+# --- Booking Guard ---
+
+def ensure_slots_available(db: Session, doctor_id: str, clinic_id: str, appointment_times: List[datetime]):
+    """
+    Verifies that all requested times are slot starts within the doctor's
+    working hours (when configured) and overlap neither existing bookings
+    nor each other. An off-grid time is rejected: it would straddle two slots.
+
+    Takes a per-doctor transaction-scoped advisory lock first, so concurrent
+    bookings for the same doctor are checked one after another and the
+    loser sees the winner's committed appointment.
+    """
+    if not appointment_times:
+        return
+    db.execute(text("SELECT pg_advisory_xact_lock(hashtext(:lock_key))"), {"lock_key": f"appointment-slot:{doctor_id}"})
+
+    schedules = get_doctor_schedule(db, doctor_id=doctor_id, clinic_id=clinic_id)
+    requested = []
+    for appointment_time in appointment_times:
+        if schedules:
+            window = _slot_window_at(appointment_time, schedules)
+            if window is None:
+                raise SlotUnavailableError(f"{_to_local(appointment_time).isoformat()} is outside the doctor's working hours.")
+            window_start, length = window
+            if (_to_local(appointment_time) - window_start) % length:
+                raise SlotUnavailableError(
+                    f"{_to_local(appointment_time).isoformat()} is not the start of one of the doctor's "
+                    f"{int(length.total_seconds() // 60)}-minute slots."
+                )
+        else:
+            length = timedelta(minutes=DEFAULT_SLOT_MINUTES)
+        requested.append((_to_local(appointment_time), length))
+    requested.sort(key=lambda slot: slot[0])
+
+    for (earlier, earlier_length), (later, _) in zip(requested, requested[1:]):
+        if later < earlier + earlier_length:
+            raise SlotUnavailableError(f"Requested times {earlier.isoformat()} and {later.isoformat()} overlap.")
+
+    longest = max(length for _, length in requested)
+    booked = _booked_times(db, doctor_id, clinic_id, requested[0][0] - longest, requested[-1][0] + longest)
+    for appointment_time, length in requested:
+        i = bisect.bisect_right(booked, appointment_time - length)
+        if i < len(booked) and booked[i] < appointment_time + length:
+            raise SlotUnavailableError(f"The doctor is already booked at {appointment_time.isoformat()}.")
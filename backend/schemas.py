@@ -2,7 +2,7 @@
 
 import uuid
 from pydantic import BaseModel, EmailStr, Field, conint, constr
-from datetime import datetime, date
+from datetime import datetime, date, time
 from decimal import Decimal
 from typing import List, Any, Optional
 
@@ -127,6 +127,33 @@ class Patient(PatientBase):
     updated_at: datetime
     class Config: from_attributes = True
 
+class PatientImportRowError(BaseModel):
+    row: int
+    national_id: str | None = None
+    errors: List[str]
+
+class PatientImportReport(BaseModel):
+    total_rows: int
+    imported: int
+    duplicates: int
+    invalid: int
+    elapsed_seconds: float
+    rows_per_second: float
+    errors: List[PatientImportRowError]
+
+class PatientDuplicateCandidate(BaseModel):
+    id: uuid.UUID
+    patient_a: Patient
+    patient_b: Patient
+    score: Decimal
+    matched_keys: List[str] | None = None
+    status: str
+    created_at: datetime
+    class Config: from_attributes = True
+
+class UpdateDuplicateCandidateStatus(BaseModel):
+    status: constr(pattern='^(Open|Confirmed|Dismissed)$')
+
 # --- Billing & Service Schemas ---
 class ServiceBase(BaseModel):
     name: str
@@ -200,10 +227,42 @@ class Appointment(BaseModel):
     reason_for_visit: str | None = None
     class Config: from_attributes = True
 
+class DoctorScheduleCreate(BaseModel):
+    weekday: conint(ge=0, le=6) # 0 = Monday ... 6 = Sunday
+    start_time: time
+    end_time: time
+    slot_minutes: conint(ge=5, le=240) = 15
+
+class DoctorSchedule(DoctorScheduleCreate):
+    id: int
+    doctor_id: uuid.UUID
+    class Config: from_attributes = True
+
+class RecurrenceRule(BaseModel):
+    start: datetime # First occurrence; its time of day is reused for every session
+    weekdays: List[conint(ge=0, le=6)] | None = None # Defaults to the weekday of `start`
+    interval_weeks: conint(ge=1, le=52) = 1
+    count: conint(ge=1) | None = None
+    until: date | None = None
+
+class AppointmentSeriesCreate(BaseModel):
+    patient_id: uuid.UUID
+    doctor_id: uuid.UUID
+    appointment_times: List[datetime] | None = None
+    recurrence: RecurrenceRule | None = None
+
+class DayAvailability(BaseModel):
+    date: date
+    slots: List[datetime]
+
 # --- Lab & Radiology Definitions ---
 class LabTestBase(BaseModel):
     name: str
     price: Decimal = Field(..., max_digits=10, decimal_places=3)
+    department: str | None = None
+    specimen_type: str | None = None
+    reference_range_normal: str | None = None # e.g., "12.0-15.5 g/dL"
+    reference_range_critical: str | None = None # e.g., "<7.0 or >21.0 g/dL"
 class LabTestCreate(LabTestBase): pass
 class LabTest(LabTestBase):
     id: int
@@ -243,6 +302,45 @@ class LabSample(LabSampleCreate):
     class Config:
         from_attributes = True
 
+class LabSampleBatchCreate(BaseModel):
+    samples: List[LabSampleCreate] = Field(..., min_length=1, max_length=500)
+
+class LabOrderStatusTransition(BaseModel):
+    order_ids: List[uuid.UUID] = Field(..., min_length=1, max_length=500)
+    to_status: constr(pattern='^(SampleCollected|InProgress|ResultEntered|Completed|SampleRejected)$')
+    rejection_reason: str | None = None
+
+class LabBatchItemResult(BaseModel):
+    lab_order_id: uuid.UUID
+    sample_barcode: str | None = None
+    ok: bool
+    detail: str | None = None
+
+class LabBatchResult(BaseModel):
+    succeeded: int
+    failed: int
+    items: List[LabBatchItemResult]
+
+class LabResultImportIssue(BaseModel):
+    specimen_id: str | None = None
+    test: str | None = None
+    lines: List[int] = []
+    line: int | None = None
+    status: str | None = None
+    order_ids: List[str] | None = None
+    error: str | None = None
+
+class LabResultImportReport(BaseModel):
+    total_records: int
+    specimens: int
+    results_created: int
+    unmatched: List[LabResultImportIssue]
+    ambiguous: List[LabResultImportIssue]
+    not_ready: List[LabResultImportIssue]
+    invalid: List[LabResultImportIssue]
+    elapsed_seconds: float
+    records_per_second: float
+
 class OrderResultCreate(BaseModel):
     patient_id: uuid.UUID
     lab_order_id: uuid.UUID | None = None
@@ -258,9 +356,43 @@ class LabOrder(BaseModel):
     lab_test: LabTest
     invoice_id: uuid.UUID | None = None
     status: str
+    priority: str | None = None
+    claimed_by_user_id: uuid.UUID | None = None
+    claim_expires_at: datetime | None = None
     created_at: datetime
     class Config: from_attributes = True
 
+class WorklistPatient(BaseModel):
+    id: uuid.UUID
+    mrn: str | None = None
+    first_name: str
+    last_name: str
+
+class WorklistLabTest(BaseModel):
+    id: int
+    name: str
+    department: str | None = None
+    specimen_type: str | None = None
+
+class LabWorklistItem(BaseModel):
+    id: uuid.UUID
+    status: str
+    priority: str
+    specimen_id: str | None = None
+    created_at: datetime
+    claimed_by_user_id: uuid.UUID | None = None
+    patient: WorklistPatient
+    lab_test: WorklistLabTest
+
+class LabOrderClaimRequest(BaseModel):
+    count: conint(ge=1, le=50) = 10
+    department: str | None = None
+    priority: str | None = None
+    lease_minutes: conint(ge=5, le=480) = 30
+
+class LabOrderIdList(BaseModel):
+    order_ids: List[uuid.UUID]
+
 class RadiologyOrder(BaseModel):
     id: uuid.UUID
     patient: Patient
@@ -271,15 +403,68 @@ class RadiologyOrder(BaseModel):
     created_at: datetime
     class Config: from_attributes = True
 
+class StoredFile(BaseModel):
+    id: uuid.UUID
+    sha256: str
+    size_bytes: int
+    content_type: str
+    original_filename: str | None = None
+    source_file_id: uuid.UUID | None = None
+    variant: str | None = None
+    width: int | None = None
+    height: int | None = None
+    created_at: datetime
+    class Config: from_attributes = True
+
 class OrderResult(BaseModel):
     id: uuid.UUID
     patient_id: uuid.UUID
     result_data: dict | None = None
     report_notes: str | None = None
+    report_file_url: str | None = None
     reported_by: User
     reported_at: datetime
     class Config: from_attributes = True
 
+class ReferenceBand(BaseModel):
+    low: float | None = None
+    high: float | None = None
+
+class AnalyteReference(BaseModel):
+    normal: List[ReferenceBand]
+    critical: List[ReferenceBand]
+    critical_is_safe_band: bool
+
+class AnalytePoint(BaseModel):
+    reported_at: datetime
+    value: float
+    flag: str | None = None
+
+class AnalyteTrend(BaseModel):
+    analyte: str
+    unit: str | None = None
+    total_points: int
+    points: List[AnalytePoint]
+    reference: AnalyteReference | None = None
+
+class LabResultSearchRow(BaseModel):
+    result_id: uuid.UUID
+    reported_at: datetime
+    patient_id: uuid.UUID
+    mrn: str | None = None
+    first_name: str
+    last_name: str
+    lab_test: str | None = None
+    doctor_id: uuid.UUID | None = None
+    analyte: str
+    value: float | None = None
+    unit: str | None = None
+    flag: str | None = None
+
+class LabResultSearchPage(BaseModel):
+    items: List[LabResultSearchRow]
+    next_cursor: str | None = None
+
 # --- Nursing Schemas ---
 class TriageRecordCreate(BaseModel):
     patient_id: uuid.UUID
@@ -376,13 +561,81 @@ class MedicationBase(BaseModel):
 
 class MedicationCreate(MedicationBase):
     stock_quantity: int = 0
+    reorder_lead_time_days: conint(ge=0) | None = None
 
 class Medication(MedicationBase):
     id: int
     stock_quantity: int
+    reserved_quantity: int = 0
+    available_quantity: int # Available-to-promise: stock minus active reservations
+    reorder_lead_time_days: int | None = None
     clinic_id: uuid.UUID
     class Config: from_attributes = True
 
+class MedicationLot(BaseModel):
+    id: int
+    medication_id: int
+    lot_number: str
+    expiry_date: date | None = None
+    quantity_on_hand: int
+    class Config: from_attributes = True
+
+class StockReceiptItem(BaseModel):
+    medication_id: int
+    lot_number: constr(min_length=1)
+    expiry_date: date | None = None
+    quantity: conint(gt=0)
+    note: str | None = None
+
+class StockReceiptCreate(BaseModel):
+    items: List[StockReceiptItem] = Field(..., min_length=1)
+
+class LotAdjustmentCreate(BaseModel):
+    quantity: int
+    reason: constr(min_length=1)
+
+class StockAtRow(BaseModel):
+    lot_id: int
+    medication_id: int
+    medication_name: str
+    lot_number: str
+    expiry_date: date | None = None
+    quantity: int
+
+class LowStockItem(BaseModel):
+    medication_id: int
+    name: str
+    manufacturer: str | None = None
+    stock_quantity: int
+    available_quantity: int
+    daily_rate: float
+    lead_time_days: int
+    reorder_point: int
+    days_of_cover: float | None = None
+    suggested_order_quantity: int
+
+class MedicationImportRow(BaseModel):
+    name: constr(min_length=1)
+    manufacturer: str | None = None
+    stock_quantity: conint(ge=0)
+    unit_price: Decimal = Field(..., ge=0, max_digits=10, decimal_places=3)
+    category: str | None = None
+
+class MedicationImportRowError(BaseModel):
+    row: int
+    name: str | None = None
+    errors: List[str]
+
+class MedicationImportReport(BaseModel):
+    total_rows: int
+    inserted: int
+    updated: int
+    duplicates: int
+    invalid: int
+    elapsed_seconds: float
+    rows_per_second: float
+    errors: List[MedicationImportRowError]
+
 class PrescriptionItemCreate(BaseModel):
     medication_id: int
     dosage: str
@@ -476,6 +729,36 @@ class AppointmentProcedure(BaseModel):
     procedure_at: datetime
     class Config: from_attributes = True
 
+class CodeValidationRequest(BaseModel):
+    icd10: List[constr(strip_whitespace=True, min_length=1, max_length=20)] = Field(default_factory=list, max_length=500)
+    cpt: List[constr(strip_whitespace=True, min_length=1, max_length=20)] = Field(default_factory=list, max_length=500)
+
+class CodeValidationResult(BaseModel):
+    code: str # As submitted
+    status: str # valid, incomplete (has subdivisions), not_assignable (block/chapter) or unknown
+    id: int | None = None
+    canonical_code: str | None = None
+    category: str | None = None # Three-character ICD-10 category, for rollups
+
+class CodeValidationResponse(BaseModel):
+    icd10: List[CodeValidationResult]
+    cpt: List[CodeValidationResult]
+
+class AppointmentCodesCreate(BaseModel):
+    diagnoses: List[constr(strip_whitespace=True, min_length=1, max_length=20)] = Field(default_factory=list, max_length=100)
+    procedures: List[constr(strip_whitespace=True, min_length=1, max_length=20)] = Field(default_factory=list, max_length=100)
+
+class AttachedCode(BaseModel):
+    id: uuid.UUID
+    code_id: int
+    code: str
+
+class AppointmentCodesResult(BaseModel):
+    appointment_id: uuid.UUID
+    diagnoses: List[AttachedCode]
+    procedures: List[AttachedCode]
+    already_attached: List[str]
+
 # --- Dhaman / Claims & Eligibility Schemas ---
 class ClaimCreate(BaseModel):
     invoice_id: uuid.UUID
@@ -536,11 +819,27 @@ class LabDashboardKpis(BaseModel):
 
 class LabDashboardData(BaseModel):
     kpi_cards: LabDashboardKpis
-    worklist_by_department: dict[str, List[LabOrder]] # This now expects the new structure
+    worklist_by_department: dict[str, List[LabWorklistItem]]
 
     class Config:
         from_attributes = True
 
+class LabTatRow(BaseModel):
+    group: str | None = None
+    stage: str
+    count: int
+    mean_minutes: float | None = None
+    p50_minutes: float | None = None
+    p90_minutes: float | None = None
+    p95_minutes: float | None = None
+
+class LabTatReport(BaseModel):
+    source: str
+    group_by: str
+    start_date: date
+    end_date: date
+    rows: List[LabTatRow]
+
 class SOAPNoteBase(BaseModel):
     subjective: str | None = None
     objective: str | None = None
@@ -0,0 +1,91 @@
+# backend/tests/test_appointment_booking.py
+
+import threading
+from datetime import timedelta
+
+import pytest
+
+from backend import crud, models, schemas
+from backend.scheduling_service import SlotUnavailableError
+
+
+def _book(session_factory, clinic, appointment_time):
+    db = session_factory()
+    try:
+        crud.book_appointment_with_invoice(
+            db, patient_id=clinic["patient_id"], doctor_id=clinic["doctor_id"], appointment_time=appointment_time,
+            clinic_id=clinic["clinic_id"], user_id=clinic["doctor_id"]
+        )
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def test_concurrent_bookings_of_one_slot_admit_exactly_one(session_factory, db, clinic, slot_time):
+    attempts = 2
+    barrier = threading.Barrier(attempts)
+    outcomes = []
+
+    def attempt():
+        barrier.wait()
+        try:
+            _book(session_factory, clinic, slot_time)
+            outcomes.append("booked")
+        except SlotUnavailableError:
+            outcomes.append("rejected")
+        except Exception as e:
+            outcomes.append(repr(e))
+
+    threads = [threading.Thread(target=attempt) for _ in range(attempts)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=30)
+
+    assert sorted(outcomes) == ["booked", "rejected"]
+    booked = db.query(models.Appointment).filter(
+        models.Appointment.doctor_id == clinic["doctor_id"],
+        models.Appointment.appointment_time == slot_time
+    ).count()
+    assert booked == 1
+
+
+def test_off_grid_time_is_rejected(session_factory, clinic, slot_time):
+    with pytest.raises(SlotUnavailableError, match="not the start"):
+        _book(session_factory, clinic, slot_time + timedelta(minutes=7))
+
+
+def test_off_grid_time_cannot_straddle_booked_slots(session_factory, clinic, slot_time):
+    _book(session_factory, clinic, slot_time)
+    # 09:22 would overlap both the 09:15 and the 09:30 slots; the 09:15 slot itself stays bookable
+    with pytest.raises(SlotUnavailableError):
+        _book(session_factory, clinic, slot_time + timedelta(minutes=22))
+    _book(session_factory, clinic, slot_time + timedelta(minutes=15))
+
+
+def test_single_and_series_bookings_post_one_receivable_per_invoice(session_factory, db, clinic, slot_time):
+    db.add_all([
+        models.Account(name=name, type=kind, normal_balance=balance, clinic_id=clinic["clinic_id"])
+        for name, kind, balance in (("Accounts Receivable", "Asset", "Debit"), ("Service Revenue", "Revenue", "Credit"))
+    ])
+    db.commit()
+    _book(session_factory, clinic, slot_time)
+    crud.book_appointment_series(
+        db, schemas.AppointmentSeriesCreate(
+            patient_id=clinic["patient_id"], doctor_id=clinic["doctor_id"],
+            appointment_times=[slot_time + timedelta(days=day) for day in range(1, 4)]
+        ),
+        clinic_id=clinic["clinic_id"], user_id=clinic["doctor_id"]
+    )
+
+    invoice_ids = {
+        invoice_id for invoice_id, in
+        db.query(models.Appointment.invoice_id).filter(models.Appointment.doctor_id == clinic["doctor_id"])
+    }
+    entries = db.query(models.LedgerEntry).filter(models.LedgerEntry.clinic_id == clinic["clinic_id"]).all()
+    assert len(invoice_ids) == 4
+    assert sorted(entry.invoice_id for entry in entries) == sorted(invoice_ids)
+    assert all(entry.amount == 10 for entry in entries)
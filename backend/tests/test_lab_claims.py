@@ -0,0 +1,89 @@
+# backend/tests/test_lab_claims.py
+
+import io
+import os
+import uuid
+
+import pytest
+from fastapi import HTTPException, UploadFile
+
+from backend import crud, file_storage, models, schemas
+from backend.routers import laboratory
+
+
+@pytest.fixture
+def claimed_order(db, clinic):
+    """A pending lab order claimed by one technician, plus a second technician."""
+    doctor = db.get(models.User, clinic["doctor_id"])
+    technicians = [
+        models.User(email=f"tech-{uuid.uuid4().hex[:8]}@example.com", hashed_password="x", role_id=doctor.role_id, clinic_id=clinic["clinic_id"])
+        for _ in range(2)
+    ]
+    lab_test = models.LabTest(name="Hemoglobin", clinic_id=clinic["clinic_id"])
+    db.add_all([*technicians, lab_test])
+    db.flush()
+    order = models.LabOrder(
+        patient_id=clinic["patient_id"], doctor_id=clinic["doctor_id"], lab_test_id=lab_test.id,
+        status="Pending", clinic_id=clinic["clinic_id"]
+    )
+    db.add(order)
+    db.commit()
+    crud.claim_lab_orders(db, clinic_id=clinic["clinic_id"], user_id=technicians[0].id, count=1)
+    return {**clinic, "order_id": order.id, "holder_id": technicians[0].id, "other_id": technicians[1].id}
+
+
+def test_worklist_hides_orders_claimed_by_others(db, claimed_order):
+    def listed(user_id):
+        return [row["id"] for row in crud.get_lab_worklist(db, clinic_id=claimed_order["clinic_id"], user_id=user_id)]
+
+    assert claimed_order["order_id"] in listed(claimed_order["holder_id"])
+    assert claimed_order["order_id"] not in listed(claimed_order["other_id"])
+
+
+def test_transitions_refuse_orders_claimed_by_others(db, claimed_order):
+    sample = schemas.LabSampleCreate(lab_order_id=claimed_order["order_id"], sample_barcode=f"S-{uuid.uuid4().hex[:8]}")
+    result = crud.collect_lab_samples_batch(db, samples=[sample], clinic_id=claimed_order["clinic_id"], user_id=claimed_order["other_id"])
+    assert result["failed"] == 1 and "claimed" in result["items"][0]["detail"]
+
+    with pytest.raises(crud.LabOrderClaimedError):
+        crud.collect_lab_sample(db, sample_data=sample, clinic_id=claimed_order["clinic_id"], user_id=claimed_order["other_id"])
+    db.rollback()
+
+    with pytest.raises(crud.LabOrderClaimedError):
+        crud.create_order_result(
+            db, result_data=schemas.OrderResultCreate(patient_id=claimed_order["patient_id"], lab_order_id=claimed_order["order_id"]),
+            clinic_id=claimed_order["clinic_id"], user_id=claimed_order["other_id"]
+        )
+    db.rollback()
+
+    result = crud.collect_lab_samples_batch(db, samples=[sample], clinic_id=claimed_order["clinic_id"], user_id=claimed_order["holder_id"])
+    assert result["succeeded"] == 1
+    result = crud.transition_lab_orders(
+        db, order_ids=[claimed_order["order_id"]], to_status="InProgress",
+        clinic_id=claimed_order["clinic_id"], user_id=claimed_order["other_id"]
+    )
+    assert result["failed"] == 1 and "claimed" in result["items"][0]["detail"]
+    result = crud.transition_lab_orders(
+        db, order_ids=[claimed_order["order_id"]], to_status="InProgress",
+        clinic_id=claimed_order["clinic_id"], user_id=claimed_order["holder_id"]
+    )
+    assert result["succeeded"] == 1
+
+
+def test_result_upload_for_an_order_claimed_by_another_stores_no_file(db, claimed_order, tmp_path, monkeypatch):
+    monkeypatch.setenv("FILE_STORAGE_ROOT", str(tmp_path))
+    file_storage.get_storage.cache_clear()
+    try:
+        with pytest.raises(HTTPException) as exc_info:
+            laboratory.upload_lab_result(
+                result_data_json=schemas.OrderResultCreate(
+                    patient_id=claimed_order["patient_id"], lab_order_id=claimed_order["order_id"]
+                ).json(),
+                report_file=UploadFile(file=io.BytesIO(b"%PDF-1.4 report"), filename="report.pdf"),
+                db=db, current_user=db.get(models.User, claimed_order["other_id"])
+            )
+    finally:
+        file_storage.get_storage.cache_clear()
+    assert exc_info.value.status_code == 409
+    stored = [name for _, _, names in os.walk(tmp_path) for name in names]
+    assert stored == []
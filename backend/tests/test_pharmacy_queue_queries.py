@@ -0,0 +1,62 @@
+# backend/tests/test_pharmacy_queue_queries.py
+
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import event
+
+from backend import crud, models, schemas
+
+QUEUE_LENGTH = 6
+
+
+@pytest.fixture
+def proposed_prescriptions(db, clinic):
+    medications = [
+        models.Medication(name=f"Medication {i}", unit_price=Decimal("1.500"), clinic_id=clinic["clinic_id"])
+        for i in range(2)
+    ]
+    db.add_all(medications)
+    db.flush()
+    for _ in range(QUEUE_LENGTH):
+        prescription = models.Prescription(
+            patient_id=clinic["patient_id"], doctor_id=clinic["doctor_id"], status="Proposed", clinic_id=clinic["clinic_id"]
+        )
+        db.add(prescription)
+        db.flush()
+        db.add_all([
+            models.PrescriptionItem(
+                prescription_id=prescription.id, medication_id=medication.id, dosage="1 tablet",
+                quantity_prescribed=10, clinic_id=clinic["clinic_id"]
+            )
+            for medication in medications
+        ])
+    db.commit()
+    return clinic
+
+
+def _count_statements(engine, session_factory, clinic_id, limit):
+    """Statements issued to fetch a queue page and serialize it as the endpoint does."""
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    db = session_factory()
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        page = crud.get_proposed_prescriptions(db, clinic_id=clinic_id, limit=limit)
+        serialized = [schemas.Prescription.model_validate(prescription) for prescription in page]
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+        db.close()
+    assert len(serialized) == limit
+    assert all(len(prescription.items) == 2 for prescription in serialized)
+    return len(statements)
+
+
+def test_queue_page_costs_two_statements_whatever_its_length(engine, session_factory, proposed_prescriptions):
+    clinic_id = proposed_prescriptions["clinic_id"]
+    single = _count_statements(engine, session_factory, clinic_id, limit=1)
+    full = _count_statements(engine, session_factory, clinic_id, limit=QUEUE_LENGTH)
+    assert single == full == 2
@@ -0,0 +1,35 @@
+# backend/tests/test_reference_ranges.py
+
+import pytest
+
+from backend import lab_result_import_service, reference_ranges
+
+
+@pytest.mark.parametrize("text", [None, "", "Negative", "Non-reactive", "Positive (>1:80)"])
+def test_blank_and_qualitative_ranges_are_accepted_without_predicate(text):
+    reference_ranges.validate_range(text)
+    assert reference_ranges.compile_range(text) == ()
+
+
+def test_thousands_separators():
+    (interval,) = reference_ranges.compile_range("1,000-2,000 /uL")
+    assert (interval.low, interval.high) == (1000.0, 2000.0)
+    assert len(reference_ranges.compile_range("<7, >21")) == 2
+
+
+@pytest.mark.parametrize("text", ["12-", "1,00-2", "5-3"])
+def test_malformed_numeric_ranges_are_rejected_with_the_whole_text(text):
+    with pytest.raises(ValueError, match=f"'{text}'"):
+        reference_ranges.validate_range(text)
+
+
+def test_numeric_strings_are_flagged():
+    references = {1: reference_ranges.compile_reference("12-16", "<7")}
+    results = [{"Hb": "13"}, {"Hb": "6.5"}, {"Hb": "n/a"}]
+    reference_ranges.annotate_results(references, [(1, "Hb", data) for data in results])
+    assert [data.get("flags") for data in results] == [{"Hb": "normal"}, {"Hb": "critical"}, None]
+
+
+@pytest.mark.parametrize("raw, expected", [("13", 13.0), (" -0.5 ", -0.5), ("NaN", "NaN"), ("inf", "inf"), ("1e3", "1e3"), ("<0.1", "<0.1")])
+def test_imported_values_are_numeric_exactly_when_the_flagger_agrees(raw, expected):
+    assert lab_result_import_service._parse_value(raw) == expected
@@ -1,57 +1,173 @@
 import xml.etree.ElementTree as ET
+import argparse
 import csv
+import json
 import os
+import resource
+import sys
+import time
+
+CSV_COLUMNS = ['code', 'description', 'kind', 'parent_code', 'chapter', 'block', 'inclusions', 'exclusions']
+
+
+def _label_text(rubric):
+    """Full text of a rubric's label, including nested <Reference>/<Fragment> parts."""
+    label = rubric.find('Label')
+    if label is None:
+        return None
+    text = ' '.join(''.join(label.itertext()).split())
+    return text or None
+
+
+def _json_list(values):
+    return json.dumps(values, ensure_ascii=False) if values else '[]'
+
+
+def iter_claml_classes(xml_file_path):
+    """
+    Streams the <Class> entries of an ICD-10 ClaML file with iterparse,
+    yielding one dict per class as soon as its closing tag is read. Each
+    processed element is cleared and detached from the root, so memory
+    stays flat however large the file is.
+    """
+    context = ET.iterparse(xml_file_path, events=('start', 'end'))
+    _, root = next(context)
+    for event, elem in context:
+        if event != 'end' or elem.tag not in ('Class', 'Modifier', 'ModifierClass'):
+            continue
+        if elem.tag == 'Class':
+            superclass = elem.find('SuperClass')
+            entry = {
+                'code': elem.get('code'),
+                'kind': elem.get('kind'),
+                'parent_code': superclass.get('code') if superclass is not None else None,
+                'description': None,
+                'inclusions': [],
+                'exclusions': [],
+            }
+            for rubric in elem.findall('Rubric'):
+                text = _label_text(rubric)
+                kind = rubric.get('kind')
+                if not text:
+                    continue
+                if kind == 'preferred':
+                    entry['description'] = text
+                elif kind == 'inclusion':
+                    entry['inclusions'].append(text)
+                elif kind == 'exclusion':
+                    entry['exclusions'].append(text)
+            yield entry
+        # Classes are direct children of the root: dropping them frees the parsed subtree
+        elem.clear()
+        root.clear()
+
 
 def convert_icd10_xml_to_csv(xml_file_path, csv_file_path):
     """
-    Parses the official ICD-10 ClaML format XML file and converts it to a CSV
-    containing the diagnosis code and its preferred description.
+    Converts the official ICD-10 ClaML XML file to a CSV with each code's
+    preferred description, kind (chapter/block/category), parent code,
+    chapter and block, and its inclusion and exclusion notes (JSON arrays).
+
+    The file is streamed, never loaded whole. Parents precede their children
+    in the WHO file, so chapter and block are resolved from the ancestors
+    seen so far; the rare child that arrives first is held back until the
+    end of the file.
 
     Args:
         xml_file_path (str): The path to the input .xml file.
         csv_file_path (str): The path where the output .csv will be saved.
     """
-    try:
-        tree = ET.parse(xml_file_path)
-        root = tree.getroot()
+    started = time.perf_counter()
+    # code -> (kind, chapter, block) for every class written so far
+    ancestry = {}
+    pending = []
+    count = 0
+
+    def resolve(entry):
+        if entry['parent_code'] is None:
+            parent_kind, chapter, block = None, None, None
+        elif entry['parent_code'] in ancestry:
+            parent_kind, chapter, block = ancestry[entry['parent_code']]
+            if parent_kind == 'chapter':
+                chapter = entry['parent_code']
+            elif parent_kind == 'block':
+                block = entry['parent_code']
+        else:
+            return None
+        if entry['kind'] == 'chapter':
+            chapter = entry['code']
+        ancestry[entry['code']] = (entry['kind'], chapter, block)
+        return [
+            entry['code'], entry['description'], entry['kind'], entry['parent_code'], chapter, block,
+            _json_list(entry['inclusions']), _json_list(entry['exclusions'])
+        ]
 
-        # Open the CSV file for writing
-        with open(csv_file_path, 'w', newline='', encoding='utf-8') as csvfile:
+    # Written beside the target and renamed at the end, so a failed run leaves the old CSV intact
+    temp_path = csv_file_path + '.tmp'
+    try:
+        with open(temp_path, 'w', newline='', encoding='utf-8') as csvfile:
             csv_writer = csv.writer(csvfile)
-            csv_writer.writerow(['code', 'description']) # Write header
-
-            count = 0
-            # Find all 'Class' tags which represent diagnosis entries
-            for class_tag in root.findall('.//Class'):
-                code = class_tag.get('code') # The code is an attribute
-                
-                # The description is usually in a specific 'Rubric' tag
-                rubric_tag = class_tag.find("Rubric[@kind='preferred']")
-                if rubric_tag is not None:
-                    label_tag = rubric_tag.find('Label')
-                    if label_tag is not None and label_tag.text:
-                        description = label_tag.text.strip()
-                        
-                        # Ensure we have both a code and a description
-                        if code and description:
-                            csv_writer.writerow([code, description])
-                            count += 1
-        
+            csv_writer.writerow(CSV_COLUMNS)
+
+            for entry in iter_claml_classes(xml_file_path):
+                # Ensure we have both a code and a description
+                if not entry['code'] or not entry['description']:
+                    continue
+                row = resolve(entry)
+                if row is None:
+                    pending.append(entry)
+                    continue
+                csv_writer.writerow(row)
+                count += 1
+
+            # Children whose parent came later in the file (or is missing altogether)
+            while pending:
+                still_pending = []
+                for entry in pending:
+                    row = resolve(entry)
+                    if row is None:
+                        still_pending.append(entry)
+                    else:
+                        csv_writer.writerow(row)
+                        count += 1
+                if len(still_pending) == len(pending):
+                    for entry in still_pending:
+                        print(f"Warning: parent {entry['parent_code']} of {entry['code']} not found; written without chapter/block.")
+                        entry['parent_code'] = None
+                        csv_writer.writerow(resolve(entry))
+                        count += 1
+                    break
+                pending = still_pending
+        os.replace(temp_path, csv_file_path)
+
+        elapsed = time.perf_counter() - started
         if count > 0:
+            size_mb = os.path.getsize(xml_file_path) / 1e6
+            # ru_maxrss is in kilobytes on Linux and bytes on macOS
+            peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1e6 if sys.platform == 'darwin' else 1e3)
             print(f"Successfully converted {count} records from {xml_file_path} to {csv_file_path}")
+            print(
+                f"{elapsed:.2f} s: {count / elapsed:,.0f} classes/s, {size_mb / elapsed:.1f} MB/s "
+                f"({size_mb:.1f} MB input), peak RSS {peak_mb:.0f} MB"
+            )
         else:
             print("Warning: Conversion finished, but no diagnosis codes were found.")
             print("Please ensure the XML file is the correct ICD-10 ClaML format.")
 
     except FileNotFoundError:
         print(f"Error: The file {xml_file_path} was not found.")
-    except ET.ParseError:
-        print(f"Error: The file {xml_file_path} is not a valid XML file.")
+    except ET.ParseError as e:
+        print(f"Error: The file {xml_file_path} is not a valid XML file ({e}).")
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
 
 # --- How to use this script ---
 if __name__ == "__main__":
-    xml_file = 'icd102019en.xml'
-    csv_file = 'icd10_codes.csv'
-    convert_icd10_xml_to_csv(xml_file, csv_file)
+    parser = argparse.ArgumentParser(description="Convert the WHO ICD-10 ClaML XML file to CSV.")
+    parser.add_argument('xml_file', nargs='?', default='icd102019en.xml')
+    parser.add_argument('csv_file', nargs='?', default='icd10_codes.csv')
+    args = parser.parse_args()
+    convert_icd10_xml_to_csv(args.xml_file, args.csv_file)
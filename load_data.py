@@ -1,9 +1,16 @@
+import argparse
 import csv
+import hashlib
 import os
+import time
+from itertools import islice
+
 from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
 
+from backend.bulk_copy import copy_rows
+
 # Load environment variables from the .env file in the parent directory
 dotenv_path = os.path.join(os.path.dirname(__file__), '.env')
 load_dotenv(dotenv_path=dotenv_path)
@@ -11,59 +18,162 @@ load_dotenv(dotenv_path=dotenv_path)
 # Read the database URL from the environment variables
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-def load_csv_to_db(csv_file_path, table_name):
+BATCH_SIZE = 20000
+STAGING_TABLE = "code_set_staging"
+
+# Code set -> (table, CSV columns loaded besides code/description, their SQL types)
+CODE_SETS = {
+    'icd10': ('icd10_codes', {
+        'kind': 'text', 'parent_code': 'text', 'chapter': 'text', 'block': 'text',
+        'inclusions': 'jsonb', 'exclusions': 'jsonb',
+    }),
+    'cpt': ('cpt_codes', {}),
+}
+
+
+def _file_sha256(csv_file_path):
+    digest = hashlib.sha256()
+    with open(csv_file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _iter_rows(reader, extra_columns):
+    """(row_number, code, description, *extra) per usable CSV row; missing optional columns become NULL."""
+    for row_number, row in enumerate(reader, start=1):
+        code = (row.get('code') or '').strip()
+        description = (row.get('description') or '').strip()
+        if not code or not description:
+            continue
+        yield (row_number, code, description, *((row.get(column) or None) for column in extra_columns))
+
+
+def load_code_set(db, code_set, csv_file_path, version, full_release=True, batch_size=BATCH_SIZE):
     """
-    Reads a CSV file and bulk inserts its data into a specified database table.
-    Includes checks to ensure the CSV file is valid and not empty.
+    Loads an ICD-10 or CPT release CSV (code, description[, ICD-10 hierarchy
+    columns from convert_xml.py]) in one transaction, applying it as a diff:
+
+    1. The file is streamed in batches with COPY into a temporary staging table.
+    2. Codes are upserted: new codes are inserted and existing codes are only
+       rewritten when something actually changed, so re-running the same
+       release changes nothing.
+    3. For a full release, active codes absent from the file are deactivated
+       (kept, since diagnoses and procedures reference them).
+
+    Each load is recorded in code_set_releases. Returns the summary dict.
     """
-    # --- Step 1: Validate the CSV file ---
-    if not os.path.exists(csv_file_path):
-        print(f"Error: The file '{csv_file_path}' was not found.")
-        print("Please make sure you have run the 'convert_xml.py' script successfully first.")
-        return
-
-    with open(csv_file_path, 'r', encoding='utf-8') as f:
-        # Check if the file has more than just a header
-        if len(f.readlines()) <= 1:
-            print(f"Error: The CSV file '{csv_file_path}' is empty or contains only a header.")
-            print("This likely means the XML conversion failed. Please check your 'convert_xml.py' script and the 'icd102019en.xml' file.")
-            return
-    
-    # --- Step 2: Connect to the database ---
+    table, extra_types = CODE_SETS[code_set]
+    extra_columns = list(extra_types)
+    staging_columns = ['row_number', 'code', 'description', *extra_columns]
+    started = time.perf_counter()
+
+    # Loads of the same code set are serialised so two releases cannot interleave
+    db.execute(text("SELECT pg_advisory_xact_lock(hashtext(:lock_key))"), {"lock_key": f"code-set-load:{code_set}"})
+    db.execute(text(
+        f"CREATE TEMP TABLE {STAGING_TABLE} (row_number integer, code text, description text"
+        + ''.join(f", {column} {sql_type}" for column, sql_type in extra_types.items())
+        + ") ON COMMIT DROP"
+    ))
+
+    total = 0
+    with open(csv_file_path, 'r', newline='', encoding='utf-8-sig') as f:
+        rows = _iter_rows(csv.DictReader(f), extra_columns)
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+            total += copy_rows(db, STAGING_TABLE, staging_columns, batch)
+            elapsed = time.perf_counter() - started
+            print(f"  staged {total:,} rows ({total / elapsed:,.0f} rows/s)")
+    if not total:
+        raise ValueError(f"'{csv_file_path}' has no rows with both a code and a description.")
+    db.execute(text(f"CREATE INDEX ON {STAGING_TABLE} (code)"))
+    db.execute(text(f"ANALYZE {STAGING_TABLE}"))
+
+    # Last occurrence wins when a code is repeated in the file
+    columns = ['description', *extra_columns]
+    upserted = db.execute(text(f"""
+        WITH upserted AS (
+            INSERT INTO {table} (code, {', '.join(columns)}, is_active, version, updated_at)
+            SELECT DISTINCT ON (code) code, {', '.join(columns)}, true, :version, now()
+            FROM {STAGING_TABLE}
+            ORDER BY code, row_number DESC
+            ON CONFLICT (code) DO UPDATE SET
+                {', '.join(f'{column} = EXCLUDED.{column}' for column in columns)},
+                is_active = true, version = EXCLUDED.version, updated_at = now()
+            WHERE ({', '.join(f'{table}.{column}' for column in columns)}, {table}.is_active)
+                IS DISTINCT FROM ({', '.join(f'EXCLUDED.{column}' for column in columns)}, true)
+            RETURNING (xmax = 0) AS inserted
+        )
+        SELECT count(*) FILTER (WHERE inserted) AS inserted, count(*) FILTER (WHERE NOT inserted) AS updated
+        FROM upserted
+    """), {"version": version}).one()
+
+    deactivated = 0
+    if full_release:
+        deactivated = db.execute(text(f"""
+            UPDATE {table} c SET is_active = false, version = :version, updated_at = now()
+            WHERE c.is_active AND NOT EXISTS (SELECT 1 FROM {STAGING_TABLE} s WHERE s.code = c.code)
+        """), {"version": version}).rowcount
+
+    summary = {
+        "code_set": code_set, "version": version, "source_file": os.path.basename(csv_file_path),
+        "sha256": _file_sha256(csv_file_path), "total_rows": total,
+        "inserted": upserted.inserted, "updated": upserted.updated, "deactivated": deactivated,
+    }
+    db.execute(text("""
+        INSERT INTO code_set_releases (code_set, version, source_file, sha256, total_rows, inserted, updated, deactivated)
+        VALUES (:code_set, :version, :source_file, :sha256, :total_rows, :inserted, :updated, :deactivated)
+        ON CONFLICT (code_set, version) DO UPDATE SET
+            source_file = EXCLUDED.source_file, sha256 = EXCLUDED.sha256, total_rows = EXCLUDED.total_rows,
+            inserted = EXCLUDED.inserted, updated = EXCLUDED.updated, deactivated = EXCLUDED.deactivated,
+            loaded_at = now()
+    """), summary)
+    db.commit()
+
+    summary["elapsed_seconds"] = round(time.perf_counter() - started, 2)
+    summary["rows_per_second"] = round(total / summary["elapsed_seconds"]) if summary["elapsed_seconds"] else total
+    return summary
+
+
+# --- How to use this script: python load_data.py icd10 icd10_codes.csv --version 2019 ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load an ICD-10 or CPT release CSV into the database.")
+    parser.add_argument('code_set', choices=sorted(CODE_SETS))
+    parser.add_argument('csv_file', nargs='?', help="Defaults to icd10_codes.csv / cpt_codes.csv")
+    parser.add_argument('--version', help="Release label; defaults to the file's checksum")
+    parser.add_argument('--partial', action='store_true', help="Supplement only: do not deactivate codes missing from the file")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    csv_file = args.csv_file or f"{args.code_set}_codes.csv"
+    if not os.path.exists(csv_file):
+        print(f"Error: The file '{csv_file}' was not found.")
+        if args.code_set == 'icd10':
+            print("Please make sure you have run the 'convert_xml.py' script successfully first.")
+        raise SystemExit(1)
     if not DATABASE_URL:
         print("Error: DATABASE_URL not found in .env file. Please ensure it is set correctly.")
-        return
+        raise SystemExit(1)
 
+    engine = create_engine(DATABASE_URL)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    db = SessionLocal()
     try:
-        engine = create_engine(DATABASE_URL)
-        SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-        db = SessionLocal()
-        print("Successfully connected to the database.")
-
-        # --- Step 3: Load data ---
-        with open(csv_file_path, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            data_to_insert = [row for row in reader]
-
-            if not data_to_insert:
-                print("CSV file is empty. Nothing to insert.")
-                return
-
-            # Use text() for the SQL statement to handle parameters correctly
-            insert_statement = text(f"INSERT INTO {table_name} (code, description) VALUES (:code, :description)")
-            
-            db.execute(insert_statement, data_to_insert)
-            db.commit()
-            print(f"Successfully loaded {len(data_to_insert)} records into the '{table_name}' table.")
-
+        print(f"Loading {args.code_set} codes from '{csv_file}'...")
+        result = load_code_set(
+            db, args.code_set, csv_file, version=args.version or f"sha256:{_file_sha256(csv_file)[:12]}",
+            full_release=not args.partial, batch_size=args.batch_size
+        )
+        print(
+            f"Release {result['version']}: {result['total_rows']:,} rows, {result['inserted']:,} inserted, "
+            f"{result['updated']:,} updated, {result['deactivated']:,} deactivated "
+            f"in {result['elapsed_seconds']} s ({result['rows_per_second']:,} rows/s)"
+        )
     except Exception as e:
+        db.rollback()
         print(f"An error occurred during database operation: {e}")
+        raise SystemExit(1)
     finally:
-        if 'db' in locals() and db:
-            db.close()
-
-# --- How to use this script ---
-if __name__ == "__main__":
-    csv_file = 'icd10_codes.csv'  #'cpt_codes.csv'
-    table = 'icd10_codes' #'cpt_codes'
-    load_csv_to_db(csv_file, table)
+        db.close()